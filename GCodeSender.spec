@@ -1,34 +1,64 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
 
+# Builds a onedir app in dist/GCodeSender. Modules load as compiled .pyc
+# files straight from the folder instead of being unpacked from a onefile
+# archive at every launch. GCODE_SENDER_BUILD picks what goes in:
+#   sender  gcode_sender.py, the standalone sender this spec has always
+#           built; no numpy or matplotlib (the default)
+#   engine  send_gcode.py without the visualization: the console, translator
+#           and job queue work as usual and the 3D view reports itself
+#           unavailable
+#   full    send_gcode.py with matplotlib, bundling only the TkAgg backend
+BUILD = os.environ.get('GCODE_SENDER_BUILD', 'sender')
+if BUILD not in ('sender', 'engine', 'full'):
+    raise SystemExit(f"GCODE_SENDER_BUILD must be sender, engine or full, not {BUILD}")
+
+# Never used by the app; most come in through optional imports in numpy,
+# matplotlib and Pillow
+EXCLUDES = [
+    'IPython', 'jupyter_client', 'ipykernel', 'notebook', 'tornado', 'zmq',
+    'PyQt5', 'PyQt6', 'PySide2', 'PySide6', 'wx', 'gi', 'cairo',
+    'scipy', 'pandas', 'sympy', 'numba', 'h5py',
+    'numpy.f2py', 'numpy.distutils', 'numpy.testing',
+    'matplotlib.tests', 'mpl_toolkits.tests', 'PIL.ImageQt',
+    'tkinter.test', 'lib2to3', 'pydoc_data', 'setuptools', 'pkg_resources',
+    'sphinx', 'docutils', 'pytest',
+    # Nothing talks TLS; hashlib falls back to its built-in digests
+    'ssl', '_ssl', '_hashlib',
+]
+
+# The visualization: matplotlib and what only it needs
+VISUALIZATION = [
+    'matplotlib', 'mpl_toolkits', 'PIL', 'kiwisolver', 'contourpy',
+    'fontTools', 'pyparsing', 'cycler', 'dateutil',
+]
 
 a = Analysis(
-    ['gcode_sender.py'],
+    ['gcode_sender.py' if BUILD == 'sender' else 'send_gcode.py'],
     pathex=[],
     binaries=[],
     datas=[],
     hiddenimports=[],
     hookspath=[],
-    hooksconfig={},
+    hooksconfig={'matplotlib': {'backends': ['TkAgg']}},
     runtime_hooks=[],
-    excludes=[],
-    noarchive=False,
-    optimize=0,
+    excludes=EXCLUDES + (VISUALIZATION if BUILD != 'full' else []) + (['numpy'] if BUILD == 'sender' else []),
+    noarchive=True,
+    optimize=1,
 )
 pyz = PYZ(a.pure)
 
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='GCodeSender',
     debug=False,
     bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    strip=True,  # Drops debug symbols from shared libraries (no effect on Windows)
+    upx=False,  # UPX-packed DLLs are unpacked on every load
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -36,3 +66,13 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=True,  # Drops debug symbols from shared libraries (no effect on Windows)
+    upx=False,
+    upx_exclude=[],
+    name='GCodeSender',
+)
@@ -0,0 +1,97 @@
+import math
+import re
+
+from gcode_lexer import lex
+
+POSITION_RE = re.compile(r'\b([XYZ]):\s*(-?\d+(?:\.\d*)?)')
+
+
+def parse_position_report(text):
+    # "X:103.186 Y:274.899 Z:300.300 ..." as printed for M114, or None
+    values = {axis: float(value) for axis, value in POSITION_RE.findall(text)}
+    return values if len(values) == 3 else None
+
+
+# Predicts how long the controller needs to acknowledge each command from the
+# move length, feedrate and the measured link latency, so a lost ack is
+# noticed within seconds instead of after a fixed 60 s / 3600 s wait.
+class AckTimeoutModel:
+    def __init__(self, fallback=60.0, minimum=1.0, margin=1.5, base_height=0.0):
+        self.fallback = fallback  # Used while the position is unknown and for G28
+        self.minimum = minimum
+        self.margin = margin  # Head-room for acceleration the model ignores
+        self.base_height = base_height
+        self.position = None  # (x, y, z) the controller will be at after the last command
+        self.feed = None
+        # Smoothed ack overhead and its deviation, updated like a TCP RTO estimate
+        self.latency = 0.05
+        self.latency_dev = 0.05
+
+    def expect(self, command):
+        # Advances the modal position by command and returns (timeout, predicted motion seconds)
+        block = lex(command)
+        predicted = self.advance(block) if block is not None else None
+        if predicted is None:
+            return self.fallback, None
+        return self.timeout_for(predicted), predicted
+
+    def advance(self, block):
+        # Advances the modal position by a lexed command and returns its
+        # predicted motion seconds, or None if there is no prediction
+        code, words = block
+        if 'F' in words:
+            self.feed = words['F']
+
+        if code == 'G28':
+            self.position = (0.0, 0.0, self.base_height)
+            return None
+        if code in ('G00', 'G01'):
+            if self.position is None:
+                if not set('XYZ') <= set(words):
+                    return None
+                self.position = (words['X'], words['Y'], words['Z'])
+                return None
+            target = tuple(words.get(axis, value) for axis, value in zip('XYZ', self.position))
+            distance = math.dist(self.position, target)
+            self.position = target
+        elif code == 'JA':
+            if not set('ABC') <= set(words):
+                return None
+            theta = math.radians(words['A'])
+            target = (words['C'] * math.cos(theta), words['C'] * math.sin(theta), self.base_height + words['B'])
+            if self.position is None:
+                self.position = target
+                return None
+            distance = math.dist(self.position, target)
+            self.position = target
+        elif code in ('J1', 'J2', 'J3'):
+            # Relative jogs change joints we do not track in Cartesian space
+            self.position = None
+            distance = abs(words.get('D', 0.0))
+        else:
+            distance = 0.0
+
+        if distance and not self.feed:
+            return None
+        return distance / (self.feed / 60.0) if distance else 0.0
+
+    def plan(self, predicted):
+        # (timeout, predicted) for a motion time worked out ahead, such as
+        # Program.predicted holds; NaN there means no prediction
+        if math.isnan(predicted):
+            return self.fallback, None
+        return self.timeout_for(predicted), predicted
+
+    def timeout_for(self, predicted):
+        return self.margin * predicted + self.latency + 4 * self.latency_dev + self.minimum
+
+    def observe(self, predicted, elapsed):
+        # Anything beyond the predicted motion time is link and parsing overhead
+        if predicted is None:
+            return
+        sample = max(elapsed - predicted, 0.0)
+        self.latency_dev += 0.25 * (abs(sample - self.latency) - self.latency_dev)
+        self.latency += 0.125 * (sample - self.latency)
+
+    def resync(self, position):
+        self.position = (position['X'], position['Y'], position['Z'])
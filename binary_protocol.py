@@ -0,0 +1,170 @@
+import binascii
+import struct
+
+from gcode_lexer import lex
+
+# Framed binary link for the RPP firmware. A frame is
+#   SYNC | opcode | seq | count | count x int32 (little endian) | CRC-16
+# with the CRC (CCITT, init 0xFFFF) taken over opcode..payload. Coordinates
+# are fixed point: mm and degrees x 1000, feedrates x 1000. The firmware
+# answers each frame with ACK seq or NAK seq (two bytes).
+SYNC = 0xA5
+ACK = 0x06
+NAK = 0x15
+SCALE = 1000
+
+OP_RAPID = 0x01      # G00 X Y Z
+OP_LINEAR = 0x02     # G01 X Y Z
+OP_FEED = 0x03       # F
+OP_HOME = 0x04       # G28
+OP_ABSOLUTE = 0x05   # G90
+OP_JOG = 0x06        # J<axis> D<distance> F<feed>
+OP_JOINT = 0x07      # JA A<θ1> B<d2> C<d3>, absolute joint targets
+
+# Sent at connect time; firmware that supports frames answers with BIN_REPLY
+NEGOTIATE_COMMAND = "M990 B1"
+BIN_REPLY = "BIN:1"
+
+HEADER = struct.Struct('<BBBB')
+CRC = struct.Struct('<H')
+
+
+def crc16(data):
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def encode_frame(opcode, seq, values=()):
+    body = bytes((opcode, seq & 0xFF, len(values)))
+    body += struct.pack(f'<{len(values)}i', *(round(value * SCALE) for value in values))
+    return bytes((SYNC,)) + body + CRC.pack(crc16(body))
+
+
+def encode_ack(seq, ok=True):
+    return bytes((ACK if ok else NAK, seq & 0xFF))
+
+
+class BinaryEncoder:
+    # Turns translated G-code lines into frames. Moves are sent as full X/Y/Z
+    # targets, so the encoder tracks the modal position; a line it cannot
+    # express returns None and goes out as ASCII instead. The controller still
+    # runs that line, so the modal state is updated from it all the same.
+    def __init__(self):
+        self.seq = 0
+        self.feed = None
+        self.position = {'X': None, 'Y': None, 'Z': None}
+
+    def next_seq(self):
+        self.seq = (self.seq + 1) & 0xFF
+        return self.seq
+
+    def encode_line(self, line):
+        block = lex(line)
+        if block is None:
+            return None
+        frames = self.encode_block(*block)
+        if frames is None:
+            self.follow_ascii(*block)
+        return frames
+
+    def follow_ascii(self, code, words):
+        # Tracks a line sent as ASCII. Its X/Y/Z targets and feed are known;
+        # after anything else that moves the arm the position is not, and the
+        # next move frame waits for a line that gives all three axes.
+        if 'F' in words:
+            self.feed = words['F']
+        if code in ('G00', 'G01'):
+            self.position = {axis: words.get(axis, value) for axis, value in self.position.items()}
+        elif code in ('G28', 'G91', 'G92') or set(words) & set('XYZABCD'):
+            self.position = {'X': None, 'Y': None, 'Z': None}
+
+    def encode_block(self, code, words):
+        if code == 'G28' and not words:
+            self.position = {'X': None, 'Y': None, 'Z': None}
+            return [encode_frame(OP_HOME, self.next_seq())]
+        if code == 'G90' and not words:
+            return [encode_frame(OP_ABSOLUTE, self.next_seq())]
+        if code in ('G00', 'G01'):
+            if set(words) - set('XYZF'):
+                return None
+            target = {axis: words.get(axis, self.position[axis]) for axis in 'XYZ'}
+            if None in target.values():
+                return None
+            frames = []
+            if 'F' in words and words['F'] != self.feed:
+                frames.append(encode_frame(OP_FEED, self.next_seq(), (words['F'],)))
+                self.feed = words['F']
+            opcode = OP_RAPID if code == 'G00' else OP_LINEAR
+            frames.append(encode_frame(opcode, self.next_seq(), (target['X'], target['Y'], target['Z'])))
+            self.position = target
+            return frames
+        if code == 'JA':
+            if set(words) - set('ABCF') or not set('ABC') <= set(words):
+                return None
+            frames = []
+            if 'F' in words and words['F'] != self.feed:
+                frames.append(encode_frame(OP_FEED, self.next_seq(), (words['F'],)))
+                self.feed = words['F']
+            self.position = {'X': None, 'Y': None, 'Z': None}
+            frames.append(encode_frame(OP_JOINT, self.next_seq(), (words['A'], words['B'], words['C'])))
+            return frames
+        if code in ('J1', 'J2', 'J3') and set(words) <= set('DF') and 'D' in words:
+            self.position = {'X': None, 'Y': None, 'Z': None}
+            return [encode_frame(OP_JOG, self.next_seq(), (int(code[1]), words['D'], words.get('F', 0.0)))]
+        return None
+
+
+class FrameDecoder:
+    # Reference decoder for the simulator side of the link. Bytes are fed in
+    # as they arrive; complete frames come back as (opcode, seq, values) and
+    # any ASCII command lines interleaved with them as strings. Frames with a
+    # bad CRC come back as (None, seq, ()) so the caller can NAK them.
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        items = []
+        while self.buffer:
+            if self.buffer[0] != SYNC:
+                end = self.buffer.find(b'\n')
+                if end < 0:
+                    break
+                text = self.buffer[:end].decode('utf-8', errors='replace').strip()
+                del self.buffer[:end + 1]
+                if text:
+                    items.append(text)
+                continue
+            if len(self.buffer) < HEADER.size:
+                break
+            _, opcode, seq, count = HEADER.unpack_from(self.buffer)
+            size = HEADER.size + 4 * count + CRC.size
+            if len(self.buffer) < size:
+                break
+            frame = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            (crc,) = CRC.unpack_from(frame, size - CRC.size)
+            if crc != crc16(frame[1:size - CRC.size]):
+                items.append((None, seq, ()))
+                continue
+            values = tuple(value / SCALE for value in struct.unpack_from(f'<{count}i', frame, HEADER.size))
+            items.append((opcode, seq, values))
+        return items
+
+
+def frame_to_gcode(opcode, values):
+    # ASCII equivalent of a decoded frame, for simulators that reuse the text parser
+    if opcode == OP_RAPID:
+        return "G00 X{:.3f} Y{:.3f} Z{:.3f}".format(*values)
+    if opcode == OP_LINEAR:
+        return "G01 X{:.3f} Y{:.3f} Z{:.3f}".format(*values)
+    if opcode == OP_JOINT:
+        return "JA A{:.3f} B{:.3f} C{:.3f}".format(*values)
+    if opcode == OP_FEED:
+        return f"F{values[0]}"
+    if opcode == OP_HOME:
+        return "G28"
+    if opcode == OP_ABSOLUTE:
+        return "G90"
+    if opcode == OP_JOG:
+        return f"J{int(values[0])} D{values[1]:.3f} F{values[2]}"
+    return None
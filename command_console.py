@@ -0,0 +1,76 @@
+import queue
+import threading
+import serial
+
+# Macros available until settings.json defines its own; run from the console as @name
+DEFAULT_MACROS = {
+    "Home": ["G28"],
+    "Report position": ["M114"],
+}
+
+HISTORY_SIZE = 100
+
+
+# Manual commands leave the Tk thread here. One worker sends them in the
+# order they were submitted, so a long G28 or move no longer freezes the
+# window; replies reach the log through the link as they arrive.
+class CommandWorker:
+    def __init__(self, log):
+        self.log = log
+        self.jobs = queue.Queue()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def submit(self, link, commands, done=None):
+        # done(acknowledged_count) is called from the worker thread
+        self.jobs.put((link, list(commands), done))
+
+    @property
+    def pending(self):
+        return self.jobs.unfinished_tasks
+
+    def run(self):
+        while True:
+            link, commands, done = self.jobs.get()
+            acknowledged = 0
+            try:
+                if len(commands) == 1:
+                    if link.send_command(commands[0]):
+                        acknowledged = 1
+                    else:
+                        self.log("No prompt received after command")
+                else:
+                    acknowledged = link.send_batch(commands)
+                    self.log(f"Batch: {acknowledged}/{len(commands)} lines acknowledged")
+            except serial.SerialException as e:
+                self.log(f"Error sending command: {e}")
+            except Exception as e:
+                # Anything else (a yanked adapter, a line the encoder rejects)
+                # fails this submission only; the worker keeps serving the queue
+                self.log(f"Error running command: {e}")
+            finally:
+                self.jobs.task_done()
+            if done is not None:
+                done(acknowledged)
+
+
+# Up/Down recall for the console entry, oldest first
+class CommandHistory:
+    def __init__(self, entries=()):
+        self.entries = list(entries)[-HISTORY_SIZE:]
+        self.cursor = len(self.entries)
+
+    def add(self, command):
+        if not self.entries or self.entries[-1] != command:
+            self.entries.append(command)
+            del self.entries[:-HISTORY_SIZE]
+        self.cursor = len(self.entries)
+
+    def previous(self):
+        if not self.entries:
+            return None
+        self.cursor = max(self.cursor - 1, 0)
+        return self.entries[self.cursor]
+
+    def next(self):
+        self.cursor = min(self.cursor + 1, len(self.entries))
+        return self.entries[self.cursor] if self.cursor < len(self.entries) else ""
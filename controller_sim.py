@@ -0,0 +1,271 @@
+import math
+import time
+from collections import deque
+
+from binary_protocol import SYNC, BIN_REPLY, FrameDecoder, encode_ack, frame_to_gcode
+from gcode_lexer import lex
+from line_protocol import checksum
+
+# Port name that opens the simulator instead of a serial device
+SIM_PORT = "SIM"
+
+# Single-byte real-time commands. The firmware acts on them as soon as they
+# arrive, between lines or frames, ahead of anything already queued.
+FEED_HOLD = b'!'
+RESUME = b'~'
+STATUS_QUERY = b'?'
+SOFT_RESET = b'\x18'
+JOG_CANCEL = b'\x85'  # Drops queued jog segments and answers with a status report
+REALTIME_BYTES = FEED_HOLD + RESUME + STATUS_QUERY + SOFT_RESET + JOG_CANCEL
+
+HOME_SECONDS = 0.5
+BANNER = b"RPP controller simulator\r\nready>\r\n"
+
+
+def forward_kinematics(theta, d2, d3, base_height=0.0):
+    angle = math.radians(theta)
+    return d3 * math.cos(angle), d3 * math.sin(angle), base_height + d2
+
+
+def inverse_kinematics(x, y, z, base_height=0.0):
+    return math.degrees(math.atan2(y, x)), z - base_height, math.hypot(x, y)
+
+
+# Stand-in for the RPP controller behind a serial.Serial-like interface. It
+# speaks the same ASCII, checksummed and binary protocols as the firmware,
+# runs moves against the clock (scaled by speed) and acknowledges each command
+# when its motion finishes, so the GUIs can be exercised without hardware.
+class SimulatedController:
+    def __init__(self, baudrate=115200, speed=1.0, base_height=0.0):
+        self.port = SIM_PORT
+        self.baudrate = baudrate
+        self.timeout = 1
+        self.dtr = True
+        self.is_open = False
+        self.speed = speed
+        self.base_height = base_height
+        self.rx = bytearray()
+        self.decoder = FrameDecoder()
+        self.binary = False
+        self.expected_line = 1
+        self.resend_pending = False
+        self.position = forward_kinematics(0.0, 0.0, 0.0, base_height)
+        self.feed = None
+        self.moves = deque()  # (seconds, path, ack, report) run in order
+        self.move_start = None
+        self.held = False
+        self.clock = 0.0  # Machine time; frozen during a feed hold
+        self.last_tick = time.monotonic()
+
+    def open(self):
+        self.is_open = True
+        self.last_tick = time.monotonic()
+        if self.dtr:
+            self.rx += BANNER
+
+    def close(self):
+        self.is_open = False
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        self.tick()
+        self.rx.clear()
+
+    @property
+    def in_waiting(self):
+        self.tick()
+        return len(self.rx)
+
+    def read(self, size=1):
+        self.tick()
+        data = bytes(self.rx[:size])
+        del self.rx[:size]
+        return data
+
+    def readline(self):
+        self.tick()
+        end = self.rx.find(b'\n')
+        end = len(self.rx) if end < 0 else end + 1
+        data = bytes(self.rx[:end])
+        del self.rx[:end]
+        return data
+
+    def write(self, data):
+        self.tick()
+        pending = bytearray()
+        for byte in data:
+            if byte in REALTIME_BYTES and not self.decoder.buffer and not pending:
+                self.realtime(bytes((byte,)))
+                continue
+            pending.append(byte)
+            # Flush at each line end so a real-time byte after it is seen at a boundary
+            if byte == 0x0A or (pending[0] == SYNC and self.frame_complete(pending)):
+                self.receive(bytes(pending))
+                pending.clear()
+        if pending:
+            self.receive(bytes(pending))
+        return len(data)
+
+    def frame_complete(self, data):
+        return len(data) >= 4 and len(data) == 4 + 4 * data[3] + 2
+
+    def realtime(self, byte):
+        if byte == FEED_HOLD:
+            self.held = True
+        elif byte == RESUME:
+            self.held = False
+        elif byte == STATUS_QUERY:
+            self.report_status()
+        elif byte == JOG_CANCEL:
+            self.position = self.current_position()
+            self.moves.clear()
+            self.move_start = None
+            self.report_status()
+        elif byte == SOFT_RESET:
+            # Motion stops where it is and everything queued is dropped
+            self.position = self.current_position()
+            self.moves.clear()
+            self.move_start = None
+            self.held = False
+            self.expected_line = 1
+            self.resend_pending = False
+            self.rx += b"Reset\r\nready>\r\n"
+
+    def report_status(self):
+        state = 'Hold' if self.held else 'Run' if self.moves else 'Idle'
+        x, y, z = self.current_position()
+        self.rx += f"<{state}|X:{x:.3f} Y:{y:.3f} Z:{z:.3f}>\r\n".encode('utf-8')
+
+    def receive(self, data):
+        for item in self.decoder.feed(data):
+            if isinstance(item, str):
+                self.command(item)
+                continue
+            opcode, seq, values = item
+            if opcode is None:
+                self.rx += encode_ack(seq, ok=False)
+                continue
+            line = frame_to_gcode(opcode, values)
+            if line is None:
+                # Unknown opcode: refused like a corrupt frame
+                self.rx += encode_ack(seq, ok=False)
+                continue
+            self.execute(line, encode_ack(seq))
+
+    def command(self, line):
+        if line.startswith('N') and '*' in line:
+            text, _, received = line.rpartition('*')
+            number, _, line = text.partition(' ')
+            try:
+                valid = checksum(text) == int(received) and int(number[1:]) == self.expected_line
+            except ValueError:
+                valid = False
+            if not valid:
+                # One request per gap; later lines of the same burst are dropped silently
+                if not self.resend_pending:
+                    self.rx += f"Resend: {self.expected_line}\r\n".encode('utf-8')
+                    self.resend_pending = True
+                return
+            self.resend_pending = False
+            self.expected_line += 1
+        self.execute(line, b"ready>\r\n")
+
+    def execute(self, line, ack):
+        block = lex(line)
+        if block is None:
+            self.queue(0.0, None, ack)
+            return
+        code, words = block
+        if code[0] == 'F':
+            # Bare feedrate line, as a decoded OP_FEED frame reads
+            words = {'F': float(code[1:])}
+        if code == 'M110':
+            self.expected_line = int(words.get('N', 0)) + 1
+        elif code == 'M990':
+            self.binary = words.get('B') == 1
+            if self.binary:
+                self.rx += (BIN_REPLY + "\r\n").encode('utf-8')
+        elif code == 'M991':
+            self.rx += f"BAUD:{int(words['B'])}\r\n".encode('utf-8')
+            self.baudrate = int(words['B'])
+            return
+        elif code == 'M118':
+            self.rx += (line.split(None, 1)[1] + "\r\n").encode('utf-8') if ' ' in line else b"\r\n"
+        elif code == 'M115':
+            self.rx += b"FIRMWARE_NAME:RPP controller simulator\r\nCap:REALTIME:1\r\n"
+        elif code == 'M114':
+            self.queue(0.0, None, b"", report=True)
+            return
+        if 'F' in words:
+            self.feed = words['F']
+
+        start = self.queued_position()
+        if code == 'G28':
+            self.queue(HOME_SECONDS, ('xyz', start, forward_kinematics(0.0, 0.0, 0.0, self.base_height)), ack)
+            return
+        if code in ('G00', 'G01'):
+            end = tuple(words.get(axis, value) for axis, value in zip('XYZ', start))
+            self.queue(self.duration(math.dist(start, end)), ('xyz', start, end), ack)
+            return
+        if code == 'JA' or code in ('J1', 'J2', 'J3'):
+            joints = inverse_kinematics(*start, self.base_height)
+            if code == 'JA':
+                end = tuple(words.get(letter, value) for letter, value in zip('ABC', joints))
+            else:
+                end = list(joints)
+                end[int(code[1]) - 1] += words.get('D', 0.0)
+                end = tuple(end)
+            distance = max(abs(b - a) for a, b in zip(joints, end))
+            self.queue(self.duration(distance), ('joint', joints, end), ack)
+            return
+        self.queue(0.0, None, ack)
+
+    def duration(self, distance):
+        if not distance or not self.feed:
+            return 0.0
+        return distance / (self.feed / 60.0)
+
+    def queue(self, seconds, path, ack, report=False):
+        if not self.moves:
+            self.move_start = self.clock
+        self.moves.append((seconds / self.speed, path, ack, report))
+
+    def queued_position(self):
+        for _, path, _, _ in reversed(self.moves):
+            if path is not None:
+                return self.at(path, 1.0)
+        return self.position
+
+    def at(self, path, fraction):
+        space, start, end = path
+        point = tuple(a + (b - a) * fraction for a, b in zip(start, end))
+        return forward_kinematics(*point, self.base_height) if space == 'joint' else point
+
+    def current_position(self):
+        if not self.moves:
+            return self.position
+        seconds, path, _, _ = self.moves[0]
+        if path is None:
+            return self.position
+        fraction = min((self.clock - self.move_start) / seconds, 1.0) if seconds else 1.0
+        return self.at(path, fraction)
+
+    def tick(self):
+        now = time.monotonic()
+        if not self.held:
+            self.clock += now - self.last_tick
+        self.last_tick = now
+        while self.moves:
+            seconds, path, ack, report = self.moves[0]
+            if self.clock - self.move_start < seconds:
+                break
+            self.moves.popleft()
+            self.move_start += seconds
+            if path is not None:
+                self.position = self.at(path, 1.0)
+            if report:
+                x, y, z = self.position
+                self.rx += f"X:{x:.3f} Y:{y:.3f} Z:{z:.3f}\r\nready>\r\n".encode('utf-8')
+            self.rx += ack
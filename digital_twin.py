@@ -0,0 +1,106 @@
+import bisect
+import math
+import threading
+import time
+from collections import deque
+import serial
+
+# Poll rate used until the operator sets one
+DEFAULT_POLL_HZ = 5.0
+# How often the GUIs redraw the live pose
+FRAME_MS = 100
+
+
+# Reported positions as (time, theta, z, r) joint samples. The view is drawn
+# one poll interval in the past so there is a real sample on both sides of
+# the displayed instant; between samples the joints are interpolated, which
+# keeps the arm moving smoothly at a few reports per second.
+class DigitalTwin:
+    def __init__(self, delay=1.0 / DEFAULT_POLL_HZ):
+        self.delay = delay
+        self.times = deque(maxlen=64)
+        self.joints = deque(maxlen=64)
+        self.lock = threading.Lock()
+
+    def clear(self):
+        with self.lock:
+            self.times.clear()
+            self.joints.clear()
+
+    def add(self, position, timestamp=None):
+        # position is an X/Y/Z report as returned by parse_position_report
+        x, y, z = position['X'], position['Y'], position['Z']
+        r = math.hypot(x, y)
+        with self.lock:
+            theta = math.degrees(math.atan2(y, x)) if r > 0.001 else (self.joints[-1][0] if self.joints else 0.0)
+            if self.joints:
+                # Unwrap so interpolation takes the short way round
+                previous = self.joints[-1][0]
+                theta = previous + (theta - previous + 180.0) % 360.0 - 180.0
+            self.times.append(time.time() if timestamp is None else timestamp)
+            self.joints.append((theta, z, r))
+
+    def pose_at(self, timestamp=None):
+        # (theta, z, r) to display at timestamp, or None before the first report
+        timestamp = (time.time() if timestamp is None else timestamp) - self.delay
+        with self.lock:
+            if not self.times:
+                return None
+            i = bisect.bisect_right(self.times, timestamp)
+            if i == 0:
+                return self.joints[0]
+            if i == len(self.times):
+                return self.joints[-1]
+            t0, t1 = self.times[i - 1], self.times[i]
+            a, b = self.joints[i - 1], self.joints[i]
+        fraction = (timestamp - t0) / (t1 - t0) if t1 > t0 else 1.0
+        return tuple(p + (q - p) * fraction for p, q in zip(a, b))
+
+
+# Asks the controller for its position at a fixed rate. The default uses the
+# real-time status byte, which the firmware answers between lines without
+# touching the command buffer, so it is safe while a job streams. use_m114
+# polls with M114 instead, as does a link whose firmware did not report the
+# status byte; those polls are skipped while another thread is exchanging
+# commands.
+class StatusPoller:
+    def __init__(self, link, twin, rate=DEFAULT_POLL_HZ, use_m114=False, on_report=None):
+        self.link = link
+        self.twin = twin
+        self.on_report = on_report  # Also called with every report, from the reading thread
+        self.interval = 1.0 / max(rate, 0.1)
+        self.use_m114 = use_m114
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.twin.delay = self.interval
+        self.twin.clear()
+        self.link.position_listener = self.report
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.link.position_listener == self.report:
+            self.link.position_listener = None
+
+    def report(self, position):
+        self.twin.add(position)
+        if self.on_report is not None:
+            self.on_report(position)
+
+    def run(self):
+        while not self.stopping.is_set():
+            started = time.time()
+            try:
+                if not self.use_m114 and self.link.realtime_enabled:
+                    self.link.query_status(timeout=self.interval / 2)
+                elif self.link.busy.acquire(blocking=False):
+                    try:
+                        self.link.exchange("M114", timeout=self.interval)
+                    finally:
+                        self.link.busy.release()
+            except (serial.SerialException, OSError):
+                # The port went away; the GUI stops the poller on disconnect
+                return
+            self.stopping.wait(max(self.interval - (time.time() - started), 0.0))
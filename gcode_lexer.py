@@ -0,0 +1,113 @@
+import re
+import sys
+import time
+from collections import namedtuple
+
+# One parsed G-code line: code is the normalised command ("G00", "G01",
+# "G28", "M114", "J1", "JA", ...), words maps each address letter to its value.
+Block = namedtuple('Block', 'code words')
+
+# ; comments, ( ) comments and a trailing *checksum are dropped before lexing
+STRIP_RE = re.compile(r';.*|\([^)]*\)|\*\d*\s*$')
+COMMAND_RE = re.compile(r'\s*(?:N\d+\s*)?(?:(J)([A1-9])|([A-Z])\s*(\d+(?:\.\d+)?))')
+WORD_RE = re.compile(r'([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))')
+
+# Command token as written ("G1", "G01", "J1", ...) -> normalised code. Filled
+# by the regex path; later lines starting with a known token take the fast path.
+_codes = {}
+# Word token ("X103.982", "F1000.0", ...) -> its value. Slicer and translator
+# output revisits the same coordinates and feeds on every layer, so most
+# tokens are looked up here instead of being sliced and converted again.
+_values = {}
+WORD_CACHE_SIZE = 100000
+# Builds a Block without going through the namedtuple's Python-level __new__
+_new_block = tuple.__new__
+
+
+def lex(line):
+    # Returns a Block, or None for blank and comment-only lines
+    if ';' in line or '(' in line or '*' in line:
+        line = STRIP_RE.sub('', line)
+    parts = line.upper().split()
+    if not parts:
+        return None
+    code = _codes.get(parts[0])
+    if code is not None:
+        # A plain loop: on 3.11 a dict comprehension is a function call per line
+        words = {}
+        values = _values
+        try:
+            for part in parts[1:]:
+                value = values.get(part)
+                if value is None:
+                    if len(values) >= WORD_CACHE_SIZE:
+                        values.clear()
+                    value = values[part] = float(part[1:])
+                words[part[0]] = value
+        except ValueError:
+            pass
+        else:
+            return _new_block(Block, (code, words))
+    return lex_regex(line.upper())
+
+
+def lex_regex(line):
+    # Handles packed words ("G1X10Y5"), N line numbers and malformed input
+    match = COMMAND_RE.match(line)
+    if match is None:
+        return None
+    if match.group(1):
+        code = 'J' + match.group(2)
+    else:
+        letter, number = match.group(3), match.group(4)
+        code = f"{letter}{int(number):02d}" if letter in 'GM' and '.' not in number else letter + number
+    head = line.split(None, 1)[0]
+    if head == line[match.start(1) if match.group(1) else match.start(3):match.end()]:
+        _codes[head] = code
+    words = {letter: float(value) for letter, value in WORD_RE.findall(line, match.end())}
+    return Block(code, words)
+
+
+def strip(line):
+    # The command text without comments, checksum or surrounding blanks
+    return STRIP_RE.sub('', line).strip()
+
+
+def legacy_parse(line):
+    # The split()/startswith loop the parsers used before, kept for the benchmark
+    line = line.split(';', 1)[0].strip().upper()
+    if not line:
+        return None
+    parts = line.split()
+    words = {}
+    for part in parts[1:]:
+        if part.startswith('X'):
+            words['X'] = float(part[1:])
+        elif part.startswith('Y'):
+            words['Y'] = float(part[1:])
+        elif part.startswith('Z'):
+            words['Z'] = float(part[1:])
+        elif part.startswith('F'):
+            words['F'] = float(part[1:])
+    return parts[0], words
+
+
+def benchmark(path, rounds=100):
+    # The parsers take turns over the file and each keeps its best round, so
+    # a noisy machine slows both alike
+    with open(path, 'r') as f:
+        lines = f.readlines()
+    parsers = (('legacy split loop', legacy_parse), ('gcode_lexer.lex', lex))
+    best = {name: float('inf') for name, _ in parsers}
+    for _ in range(rounds):
+        for name, parse in parsers:
+            start = time.perf_counter()
+            for line in lines:
+                parse(line)
+            best[name] = min(best[name], time.perf_counter() - start)
+    for name, seconds in best.items():
+        print(f"{name}: {seconds * 1000:.1f} ms for {len(lines)} lines ({seconds / max(len(lines), 1) * 1e6:.2f} us/line)")
+
+
+if __name__ == "__main__":
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else "CFFFP_Test_X.gcode")
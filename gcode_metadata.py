@@ -0,0 +1,148 @@
+import json
+import math
+import os
+
+from gcode_lexer import lex, strip
+
+# Stats for a G-code file are kept beside it in <file>.meta.json. The
+# translator writes them with its output; other files are indexed once. A
+# sidecar is trusted only while the file keeps the size and mtime it records.
+SIDECAR_SUFFIX = ".meta.json"
+
+# Joint speeds used when the machine sets none: θ1 in deg/s, d2 and d3 in mm/s
+DEFAULT_JOINT_SPEEDS = (120.0, 50.0, 100.0)
+
+
+def sidecar_path(path):
+    return path + SIDECAR_SUFFIX
+
+
+# Accumulates stats over the lines of a file in one pass:
+#   lines          physical lines, which is what the send loop counts
+#   commands       lines left after stripping comments
+#   invalid        number of the first line that is not G-code, or None
+#   bounds         [[min x, min y, min z], [max x, max y, max z]] of the moves
+#   path_length    mm travelled by the tool; a JA move counts the straight
+#                  line between its end points
+#   estimated_time seconds at the programmed feeds; a JA move takes as long
+#                  as its slowest joint at joint_speeds or at F
+# JA moves and G28 are placed in the same Cartesian frame as G0/G1, with the
+# d2 = 0 plane at base_height as the translator's inverse kinematics has it.
+#   layers         distinct heights the moves print at
+class MetadataBuilder:
+    def __init__(self, joint_speeds=DEFAULT_JOINT_SPEEDS, base_height=0.0):
+        self.joint_speeds = joint_speeds
+        self.base_height = base_height
+        self.lines = 0
+        self.commands = 0
+        self.invalid = None
+        self.position = None
+        self.joints = None
+        self.feed = None
+        self.low = [math.inf] * 3
+        self.high = [-math.inf] * 3
+        self.path_length = 0.0
+        self.estimated_time = 0.0
+        self.heights = set()
+
+    def feed_lines(self, lines):
+        for line in lines:
+            self.lines += 1
+            if not strip(line):
+                continue
+            self.commands += 1
+            block = lex(line)
+            if block is None:
+                if self.invalid is None:
+                    self.invalid = self.lines
+                continue
+            code, words = block
+            if 'F' in words:
+                self.feed = words['F']
+            if code in ('G00', 'G01'):
+                self.move(tuple(words.get(axis, value) for axis, value in zip('XYZ', self.position or (0.0, 0.0, 0.0))))
+            elif code == 'G28':
+                self.position = (0.0, 0.0, self.base_height)
+                self.joints = (0.0, 0.0, 0.0)
+            elif code == 'JA':
+                joints = tuple(words.get(letter, value) for letter, value in zip('ABC', self.joints or (0.0, 0.0, 0.0)))
+                deltas = [abs(b - a) for a, b in zip(self.joints or joints, joints)]
+                seconds = max(delta / speed for delta, speed in zip(deltas, self.joint_speeds))
+                if self.feed:
+                    # The firmware also caps the fastest joint at F per minute
+                    seconds = max(seconds, max(deltas) / (self.feed / 60.0))
+                self.joints = joints
+                angle = math.radians(joints[0])
+                self.move((joints[2] * math.cos(angle), joints[2] * math.sin(angle), self.base_height + joints[1]), seconds)
+
+    def move(self, position, seconds=None):
+        previous = self.position or position
+        distance = math.dist(previous, position)
+        self.path_length += distance
+        if seconds is not None:
+            self.estimated_time += seconds
+        elif self.feed:
+            self.estimated_time += distance / (self.feed / 60.0)
+        for axis in range(3):
+            self.low[axis] = min(self.low[axis], position[axis])
+            self.high[axis] = max(self.high[axis], position[axis])
+        if position[:2] != previous[:2]:
+            self.heights.add(round(position[2], 3))
+        self.position = position
+
+    def result(self):
+        return {
+            'lines': self.lines,
+            'commands': self.commands,
+            'invalid': self.invalid,
+            'bounds': [self.low, self.high] if self.low[0] <= self.high[0] else None,
+            'path_length': self.path_length,
+            'estimated_time': self.estimated_time,
+            'layers': len(self.heights),
+        }
+
+
+def write_metadata(path, metadata):
+    # Stamped with the file as it is now, so call after the file is complete
+    info = os.stat(path)
+    metadata = dict(metadata, size=info.st_size, mtime_ns=info.st_mtime_ns)
+    with open(sidecar_path(path), 'w') as f:
+        json.dump(metadata, f, indent=4)
+    return metadata
+
+
+def load_metadata(path):
+    # The sidecar's stats, or None if there is none or the file changed since
+    try:
+        with open(sidecar_path(path), 'r') as f:
+            metadata = json.load(f)
+        info = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    if metadata.get('size') != info.st_size or metadata.get('mtime_ns') != info.st_mtime_ns:
+        return None
+    return metadata
+
+
+def index_file(path):
+    # Stats for any file: from its sidecar when current, otherwise one pass
+    # over the file, saved for next time when the directory is writable
+    metadata = load_metadata(path)
+    if metadata is not None:
+        return metadata
+    builder = MetadataBuilder()
+    with open(path, 'r') as f:
+        builder.feed_lines(f)
+    try:
+        return write_metadata(path, builder.result())
+    except OSError:
+        return builder.result()
+
+
+def describe(metadata):
+    seconds = int(metadata['estimated_time'])
+    text = f"{metadata['commands']} commands, {metadata['layers']} layers, {metadata['path_length'] / 1000:.2f} m of moves, about {seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+    if metadata['bounds']:
+        low, high = metadata['bounds']
+        text += f", X {low[0]:.1f}..{high[0]:.1f} Y {low[1]:.1f}..{high[1]:.1f} Z {low[2]:.1f}..{high[2]:.1f}"
+    return text
@@ -0,0 +1,110 @@
+from array import array
+
+from ack_timeout import AckTimeoutModel
+from gcode_lexer import lex, strip
+from profiling import stats
+
+NAN = float('nan')
+
+# What a command does to the robot, as Program.moves stores it. The three
+# target values of a move are X/Y/Z for LINEAR, A/B/C for JOINTS and the
+# distance D (in the first) for a JOG; NaN marks a word the command leaves out.
+NO_MOVE, LINEAR, JOINTS, HOME, JOG1, JOG2, JOG3 = range(7)
+JOGS = {'J1': JOG1, 'J2': JOG2, 'J3': JOG3}
+
+
+def motion(block):
+    # (kind, a, b, c) for a lexed command
+    code, words = block
+    if code in ('G00', 'G01'):
+        if 'X' in words or 'Y' in words or 'Z' in words:
+            return LINEAR, words.get('X', NAN), words.get('Y', NAN), words.get('Z', NAN)
+    elif code == 'JA':
+        return JOINTS, words.get('A', NAN), words.get('B', NAN), words.get('C', NAN)
+    elif code == 'G28':
+        return HOME, NAN, NAN, NAN
+    elif code in JOGS and 'D' in words:
+        return JOGS[code], words['D'], NAN, NAN
+    return NO_MOVE, NAN, NAN, NAN
+
+
+# A G-code file compiled for streaming: every command stripped and encoded
+# once, stored back to back with its newline in one buffer, so a run of
+# commands goes out as one slice of it. Command i spans
+# data[ends[i - 1]:ends[i]] (from 0 for the first) and came from file line
+# line_numbers[i].
+# Everything the sender needs per command is worked out here too, so
+# streaming only indexes arrays: moves[i] and targets[3 * i:3 * i + 3] give
+# what command i does to the robot, and predicted[i] its motion time in
+# seconds from an ack timeout model run over the file (NaN where the model
+# has no prediction and the fallback timeout applies). end_position and
+# end_feed are that model's state after the last command.
+class Program:
+    def __init__(self, data, ends, line_numbers, moves, targets, predicted, end_position=None, end_feed=None):
+        self.data = data
+        self.view = memoryview(data)
+        self.ends = ends
+        self.line_numbers = line_numbers
+        self.moves = moves
+        self.targets = targets
+        self.predicted = predicted
+        self.end_position = end_position
+        self.end_feed = end_feed
+
+    def __len__(self):
+        return len(self.ends)
+
+    def start(self, index):
+        return self.ends[index - 1] if index else 0
+
+    def span(self, first, last):
+        # Commands first to last - 1 as one memoryview, without copying
+        return self.view[self.start(first):self.ends[last - 1]]
+
+    def command(self, index):
+        return self.view[self.start(index):self.ends[index] - 1].tobytes().decode('utf-8')
+
+    def move(self, index):
+        # (kind, a, b, c) for command index, as motion() gives it
+        return (self.moves[index],) + tuple(self.targets[3 * index:3 * index + 3])
+
+
+def compile_file(path):
+    with stats.span('compile'):
+        return compile_lines(path)
+
+
+def compile_lines(path):
+    buffer = bytearray()
+    ends = array('Q')
+    line_numbers = array('L')
+    moves = bytearray()
+    targets = array('d')
+    predicted = array('d')
+    timeouts = AckTimeoutModel()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            # Translator output has no comments or checksums, so its lines
+            # only need trimming
+            if ';' in line or '(' in line or '*' in line:
+                line = strip(line)
+            else:
+                line = line.strip()
+            if not line:
+                continue
+            buffer += line.encode('utf-8')
+            buffer += b'\n'
+            ends.append(len(buffer))
+            line_numbers.append(line_number)
+            block = lex(line)
+            if block is None:
+                moves.append(NO_MOVE)
+                targets.extend((NAN, NAN, NAN))
+                predicted.append(NAN)
+                continue
+            kind, a, b, c = motion(block)
+            moves.append(kind)
+            targets.extend((a, b, c))
+            seconds = timeouts.advance(block)
+            predicted.append(NAN if seconds is None else seconds)
+    return Program(bytes(buffer), ends, line_numbers, moves, targets, predicted, timeouts.position, timeouts.feed)
@@ -0,0 +1,160 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gcode_metadata import index_file
+from gcode_program import compile_file
+from profiling import stats
+from translator import translate_file
+
+# The queue survives restarts in JOBS_FILE; translated jobs are written to JOBS_DIR
+JOBS_FILE = "jobs.json"
+JOBS_DIR = "jobs"
+
+# Per-job settings; unset ones fall back to the GUI's translation options
+JOB_OPTIONS = ('x_offset', 'y_offset', 'z_offset', 'max_feedrate')
+
+# Ordered list of jobs, each a dict:
+#   id, source, translate, priority, options, status, added, error
+# status runs queued -> running -> done / failed / stopped. A job found running
+# at start-up was cut short by a crash and becomes interrupted, not restarted.
+# The next job to run is the queued one with the highest priority, earliest
+# in the list on a tie; Up/Down reorder the list.
+class JobQueue:
+    def __init__(self, path=JOBS_FILE):
+        self.path = path
+        self.jobs = []
+        self.next_id = 1
+
+    def load(self):
+        # Raises on a corrupt file; the queue stays empty in that case
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        self.jobs = data.get('jobs', [])
+        self.next_id = data.get('next_id', max((job['id'] for job in self.jobs), default=0) + 1)
+        for job in self.jobs:
+            if job['status'] == 'running':
+                job['status'] = 'interrupted'
+
+    def save(self):
+        # Written beside the old file and swapped in, so a crash never leaves half a queue
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'next_id': self.next_id, 'jobs': self.jobs}, f, indent=4)
+        os.replace(temp_path, self.path)
+
+    def add(self, source, translate=False, priority=0, options=None):
+        job = {
+            'id': self.next_id,
+            'source': source,
+            'translate': translate,
+            'priority': priority,
+            'options': {key: value for key, value in (options or {}).items() if key in JOB_OPTIONS},
+            'status': 'queued',
+            'added': time.time(),
+            'error': None,
+        }
+        self.next_id += 1
+        self.jobs.append(job)
+        self.save()
+        return job
+
+    def get(self, job_id):
+        for job in self.jobs:
+            if job['id'] == job_id:
+                return job
+        return None
+
+    def remove(self, job_id):
+        self.jobs = [job for job in self.jobs if job['id'] != job_id]
+        self.save()
+
+    def move(self, job_id, offset):
+        job = self.get(job_id)
+        if job is None:
+            return
+        index = self.jobs.index(job)
+        target = min(max(index + offset, 0), len(self.jobs) - 1)
+        self.jobs.insert(target, self.jobs.pop(index))
+        self.save()
+
+    def update(self, job, **fields):
+        job.update(fields)
+        self.save()
+
+    def next(self):
+        queued = [job for job in self.jobs if job['status'] == 'queued']
+        return max(queued, key=lambda job: job['priority']) if queued else None
+
+    def describe(self, job):
+        kind = "Cura" if job['translate'] else "G-code"
+        settings = " ".join(f"{key}={value:g}" for key, value in job['options'].items())
+        text = f"#{job['id']} [{job['status']}] P{job['priority']} {kind} {os.path.basename(job['source'])}"
+        if settings:
+            text += f" ({settings})"
+        if job['error']:
+            text += f" - {job['error']}"
+        return text
+
+
+def prepare_job(job, options, directory=JOBS_DIR):
+    # Translates a Cura job with its own settings, checks that every line of
+    # the file to send lexes and compiles it for streaming. Returns
+    # {'path', 'metadata', 'program', 'warnings'}.
+    path = job['source']
+    warnings = []
+    if job['translate']:
+        options = dict(options, **job['options'])
+        if any(options.get(key) for key in ('x_offset', 'y_offset', 'z_offset')):
+            # The translator applies offsets only when it emits full positions,
+            # and offsets given for the job win over auto placement
+            options['fill_axes'] = True
+            options['auto_place'] = False
+        if 'max_feedrate' in job['options']:
+            options['feed_cap'] = True
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"job-{job['id']}.gcode")
+        with stats.span('translate'):
+            warnings = translate_file(job['source'], path, options)
+
+    # The translator leaves a sidecar; other files are indexed here, off the Tk thread
+    with stats.span('index'):
+        metadata = index_file(path)
+    if metadata['invalid'] is not None:
+        raise ValueError(f"line {metadata['invalid']} is not G-code")
+    return {'path': path, 'metadata': metadata, 'program': compile_file(path), 'warnings': warnings}
+
+
+# Prepares jobs one at a time on a background thread, so the next job is
+# translated and checked while the current one streams. Results are kept by
+# job id until the job is started or dropped.
+class JobScheduler:
+    def __init__(self, log):
+        self.log = log
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.futures = {}
+
+    def prepare(self, job, options):
+        future = self.futures.get(job['id'])
+        if future is None:
+            self.log(f"Preparing job #{job['id']}: {job['source']}")
+            future = self.executor.submit(self.run, dict(job), dict(options))
+            self.futures[job['id']] = future
+        return future
+
+    def run(self, job, options):
+        # Timing spans recorded while preparing count toward this job, not
+        # the one streaming meanwhile
+        with stats.job(job['id']):
+            return prepare_job(job, options)
+
+    def discard(self, job_id):
+        future = self.futures.pop(job_id, None)
+        if future is not None:
+            future.cancel()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
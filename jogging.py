@@ -0,0 +1,78 @@
+import threading
+import time
+
+from ack_timeout import parse_position_report
+from controller_sim import JOG_CANCEL
+
+# How long a jog button is held before the click turns into a continuous jog
+HOLD_DELAY_MS = 300
+# Motion time covered by one streamed jog segment
+SEGMENT_SECONDS = 0.1
+# Segments queued in the controller ahead of the one executing; enough to keep
+# the planner from starving between acks, few enough that a cancel is quick
+PLANNER_DEPTH = 3
+
+
+# Press-and-hold jog on one axis. Streams short J<axis> segments, each worth
+# segment_seconds of motion at the feedrate, keeping depth of them in
+# flight. stop() sends the jog-cancel byte at once; the controller drops the
+# queued segments and answers with a status report. Without the real-time
+# channel the jog ends once the segments in flight are done. on_segment(command)
+# is called from the jog thread for every segment the controller finished.
+class ContinuousJog:
+    def __init__(self, link, axis, direction, feedrate, log, on_segment=None, segment_seconds=SEGMENT_SECONDS, depth=PLANNER_DEPTH):
+        self.link = link
+        self.log = log
+        self.on_segment = on_segment
+        self.segment_seconds = segment_seconds
+        self.depth = depth
+        distance = direction * max(feedrate / 60.0 * segment_seconds, 0.01)
+        self.command = f"J{axis} D{distance:.3f} F{feedrate}"
+        self.stopping = threading.Event()
+        self.stopped_at = None
+        self.cancelled = None  # Whether stop() could send the jog-cancel byte
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        if not self.stopping.is_set():
+            self.stopped_at = time.time()
+            self.stopping.set()
+            self.cancelled = self.link.realtime(JOG_CANCEL)
+
+    def run(self):
+        with self.link.busy:
+            in_flight = 0
+            last_ack = time.time()
+            while True:
+                while in_flight < self.depth and not self.stopping.is_set():
+                    self.link.stream(self.command)
+                    in_flight += 1
+                reply = self.link.read_reply()
+                if reply is None:
+                    if time.time() - max(last_ack, self.stopped_at or 0) > self.segment_seconds * self.depth + 1.0:
+                        if not self.stopping.is_set():
+                            self.log("Jog stalled, no acknowledgement from controller")
+                            self.stop()
+                        else:
+                            self.log("No status report after jog cancel")
+                            return
+                    time.sleep(0.005)
+                elif reply[0] == 'status' and self.stopping.is_set():
+                    # Prompts before the report belong to segments finished before the cancel
+                    position = parse_position_report(reply[1])
+                    if position is not None:
+                        self.link.sync_position(position)
+                    return
+                elif reply[0] == 'line' and 'ready>' in reply[1]:
+                    in_flight -= 1
+                    last_ack = time.time()
+                    self.segment_done()
+                    if in_flight == 0 and self.cancelled is False:
+                        return
+
+    def segment_done(self):
+        if self.on_segment is not None:
+            self.on_segment(self.command)
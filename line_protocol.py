@@ -0,0 +1,55 @@
+import re
+from collections import OrderedDict
+
+# Marlin-style numbered ASCII lines for noisy links. Each command goes out as
+#   N<number> <command>*<checksum>
+# with the checksum the XOR of every byte before the '*'. The firmware answers
+# a line it cannot verify (bad checksum, unexpected number) with
+# "Resend: <number>" and no prompt; ready> still acknowledges executed lines.
+RESET_COMMAND = "M110 N0"
+RESEND_RE = re.compile(r'\b(?:Resend|rs)\s*:?\s*N?(\d+)', re.IGNORECASE)
+
+# Sent lines kept for retransmission; matches the controller's command buffer
+RESEND_WINDOW = 16
+
+
+def checksum(text):
+    value = 0
+    for byte in text.encode('utf-8'):
+        value ^= byte
+    return value
+
+
+def parse_resend(text):
+    # The line number the controller asks for, or None
+    match = RESEND_RE.search(text)
+    return int(match.group(1)) if match else None
+
+
+class LineNumberer:
+    # Numbers and checksums outgoing commands and remembers the last
+    # RESEND_WINDOW of them, so a resend request retransmits only the lines
+    # from the rejected one on instead of aborting the job.
+    def __init__(self, window=RESEND_WINDOW):
+        self.number = 0
+        self.window = window
+        self.sent = OrderedDict()
+
+    def reset(self):
+        self.number = 0
+        self.sent.clear()
+
+    def encode(self, command):
+        self.number += 1
+        text = f"N{self.number} {command}"
+        line = f"{text}*{checksum(text)}\n".encode('utf-8')
+        self.sent[self.number] = line
+        while len(self.sent) > self.window:
+            self.sent.popitem(last=False)
+        return line
+
+    def resend_from(self, number):
+        # Lines number..latest, or None once number has left the window
+        if number not in self.sent:
+            return None
+        return [line for n, line in self.sent.items() if n >= number]
@@ -0,0 +1,144 @@
+import json
+import math
+import os
+
+from gcode_metadata import DEFAULT_JOINT_SPEEDS
+from jogging import PLANNER_DEPTH, SEGMENT_SECONDS
+from line_protocol import RESEND_WINDOW
+from serial_link import PIPELINE_DEPTH
+
+# Machine profiles, one per cell, are kept in MACHINES_FILE so limits and
+# tuning can change without editing source. The GUIs pick one by name
+# (settings.json "machine") and reload the file when it changes on disk.
+MACHINES_FILE = "machines.json"
+DEFAULT_MACHINE = "Default"
+# How often the GUIs look for changes to the file
+MACHINE_POLL_MS = 1000
+
+# (name, type, default, minimum) of every machine field. A profile in the
+# file may leave any of them out.
+#   kinematics  base_height, d2_max, d3_max, d3_min, theta_center, joint_speeds
+#   planner     max_feedrate, jog_distance, jog_feedrate, jog_segment_seconds, jog_planner_depth
+#   streaming   pipeline_depth (ASCII lines awaiting their prompt in a batch),
+#               resend_window (numbered lines kept for resends, from the next connect)
+#   translator  translator_profile, selected with the machine when set
+MACHINE_FIELDS = (
+    ('base_height', float, 0.0, None),
+    ('d2_max', float, 1000.0, 0.0),
+    ('d3_max', float, 1000.0, 0.0),
+    ('d3_min', float, 0.0, 0.0),
+    ('theta_center', float, 0.0, None),
+    ('joint_speeds', tuple, DEFAULT_JOINT_SPEEDS, 0.001),
+    ('max_feedrate', float, 1000.0, 0.0),
+    ('jog_distance', float, 10.0, 0.0),
+    ('jog_feedrate', float, 1000.0, 0.0),
+    ('jog_segment_seconds', float, SEGMENT_SECONDS, 0.01),
+    ('jog_planner_depth', int, PLANNER_DEPTH, 1),
+    ('pipeline_depth', int, PIPELINE_DEPTH, 1),
+    ('resend_window', int, RESEND_WINDOW, 1),
+    ('translator_profile', str, "", None),
+)
+
+# Fields translator_profiles.compile_profile takes from the machine
+TRANSLATOR_FIELDS = ('base_height', 'd2_max', 'd3_max', 'd3_min', 'theta_center', 'joint_speeds', 'max_feedrate')
+
+
+def check_number(name, value, kind, minimum):
+    # bool is an int to Python but never a valid number here
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or (kind is int and not isinstance(value, int)):
+        raise ValueError(f"{name} must be {'an integer' if kind is int else 'a number'}")
+    # json reads NaN, Infinity and out-of-range literals such as 1e400 as floats
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be finite")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{name} must be at least {minimum:g}")
+    return kind(value)
+
+
+def validate_machine(fields, name=DEFAULT_MACHINE):
+    # Every field of a machine profile, typed, with defaults for those left
+    # out. Raises ValueError naming the profile and field at fault.
+    if not isinstance(fields, dict):
+        raise ValueError(f"Machine {name}: expected an object")
+    unknown = set(fields).difference(field[0] for field in MACHINE_FIELDS)
+    if unknown:
+        raise ValueError(f"Machine {name}: unknown field {', '.join(sorted(unknown))}")
+    machine = {}
+    try:
+        for key, kind, default, minimum in MACHINE_FIELDS:
+            value = fields.get(key, default)
+            if kind is tuple:
+                if not isinstance(value, (list, tuple)) or len(value) != 3:
+                    raise ValueError(f"{key} must list θ1, d2 and d3 speeds")
+                value = tuple(check_number(key, speed, float, minimum) for speed in value)
+            elif kind is str:
+                if not isinstance(value, str):
+                    raise ValueError(f"{key} must be text")
+            else:
+                value = check_number(key, value, kind, minimum)
+            machine[key] = value
+    except ValueError as e:
+        raise ValueError(f"Machine {name}: {e}") from None
+    if machine['d3_min'] >= machine['d3_max']:
+        raise ValueError(f"Machine {name}: d3_min must be below d3_max")
+    return machine
+
+
+def translator_machine(machine):
+    return {key: machine[key] for key in TRANSLATOR_FIELDS}
+
+
+def save_json(path, data):
+    # Written beside the old file and swapped in, so a crash or a full disk
+    # never leaves it half written
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f, indent=4)
+    os.replace(temp_path, path)
+
+
+def file_stamp(path):
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return info.st_size, info.st_mtime_ns
+
+
+class MachineStore:
+    def __init__(self, path=MACHINES_FILE):
+        self.path = path
+        self.machines = {DEFAULT_MACHINE: validate_machine({})}
+        self.stamp = None
+
+    def load(self):
+        # Raises on a corrupt file or an invalid profile and keeps the
+        # machines it had. The file is written out with the defaults on first
+        # use, so there is something to edit.
+        if not os.path.exists(self.path):
+            self.save()
+            return
+        # Taken before reading, so a file that fails to load is not retried
+        # until it changes again
+        self.stamp = file_stamp(self.path)
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or not isinstance(data.get('machines', {}), dict):
+            raise ValueError(f"{self.path} must hold an object with a \"machines\" object")
+        machines = {DEFAULT_MACHINE: validate_machine({})}
+        for name, fields in data.get('machines', {}).items():
+            machines[name] = validate_machine(fields, name)
+        self.machines = machines
+
+    def changed(self):
+        return file_stamp(self.path) != self.stamp
+
+    def save(self):
+        # Swapped in whole, so a reader never sees half a file
+        machines = {name: dict(machine, joint_speeds=list(machine['joint_speeds'])) for name, machine in self.machines.items()}
+        save_json(self.path, {'machines': machines})
+        self.stamp = file_stamp(self.path)
+
+    def get(self, name):
+        # The named machine, or the default one if the file no longer has it
+        return self.machines.get(name, self.machines[DEFAULT_MACHINE])
@@ -0,0 +1,206 @@
+import csv
+import heapq
+import json
+import os
+import struct
+import threading
+import time
+import numpy as np
+
+# One directory per job under RECORDINGS_DIR holding
+#   job.json       source file and start time
+#   commanded.npy  (t, line, x, y, z) for every line sent
+#   reported.npy   (t, x, y, z) for every position report received
+# Both arrays are written append-only: a fixed-size .npy header followed by
+# raw little-endian records, with the row count patched into the header on
+# close. A recording cut short by a crash is still readable because readers
+# take the row count from the file size.
+RECORDINGS_DIR = "recordings"
+
+COMMANDED_DTYPE = np.dtype([('t', '<f8'), ('line', '<i4'), ('x', '<f4'), ('y', '<f4'), ('z', '<f4')])
+REPORTED_DTYPE = np.dtype([('t', '<f8'), ('x', '<f4'), ('y', '<f4'), ('z', '<f4')])
+
+HEADER_BYTES = 192  # Room for any row count; a multiple of 64 like numpy's own headers
+CHUNK_ROWS = 65536
+
+
+def npy_header(dtype, count):
+    text = repr({'descr': dtype.descr, 'fortran_order': False, 'shape': (count,)})
+    text = text.ljust(HEADER_BYTES - 10 - 1) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(text)) + text.encode('latin1')
+
+
+class AppendOnlyArray:
+    # Buffers rows and appends them to the file in blocks
+    def __init__(self, path, dtype, buffer_rows=256):
+        self.path = path
+        self.dtype = dtype
+        self.buffer = np.empty(buffer_rows, dtype=dtype)
+        self.buffered = 0
+        self.count = 0
+        self.file = open(path, 'wb')
+        self.file.write(npy_header(dtype, 0))
+
+    def append(self, row):
+        self.buffer[self.buffered] = row
+        self.buffered += 1
+        if self.buffered == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        if self.buffered:
+            self.file.write(self.buffer[:self.buffered].tobytes())
+            self.count += self.buffered
+            self.buffered = 0
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.seek(0)
+        self.file.write(npy_header(self.dtype, self.count))
+        self.file.close()
+
+
+def new_recording_dir(directory):
+    # Named by start time; a job started within the same second as the last
+    # gets a -2, -3, ... suffix instead of overwriting its files
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(directory, stamp)
+    attempt = 1
+    while True:
+        try:
+            os.mkdir(path)
+            return path
+        except FileExistsError:
+            attempt += 1
+            path = os.path.join(directory, f"{stamp}-{attempt}")
+
+
+class PathRecorder:
+    # Records one job. commanded() is called by the sender thread and
+    # reported() by whichever thread reads the port, so writes are locked.
+    def __init__(self, source, directory=RECORDINGS_DIR, flush_interval=1.0):
+        self.path = new_recording_dir(directory)
+        with open(os.path.join(self.path, "job.json"), 'w') as f:
+            json.dump({'source': source, 'started': time.time()}, f, indent=4)
+        self.commanded_rows = AppendOnlyArray(os.path.join(self.path, "commanded.npy"), COMMANDED_DTYPE)
+        self.reported_rows = AppendOnlyArray(os.path.join(self.path, "reported.npy"), REPORTED_DTYPE)
+        self.lock = threading.Lock()
+        self.closed = False
+        self.flush_interval = flush_interval
+        self.last_flush = time.time()
+
+    def commanded(self, line_number, x, y, z):
+        with self.lock:
+            if self.closed:
+                return
+            self.commanded_rows.append((time.time(), line_number, x, y, z))
+            self.maybe_flush()
+
+    def reported(self, position):
+        # Reports can still arrive from the poller after the job ended
+        with self.lock:
+            if self.closed:
+                return
+            self.reported_rows.append((time.time(), position['X'], position['Y'], position['Z']))
+            self.maybe_flush()
+
+    def maybe_flush(self):
+        if time.time() - self.last_flush >= self.flush_interval:
+            self.commanded_rows.flush()
+            self.reported_rows.flush()
+            self.last_flush = time.time()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.commanded_rows.close()
+            self.reported_rows.close()
+
+
+def load(path, dtype):
+    # Memory-mapped rows of one table; nothing is read until it is indexed
+    count = max(os.path.getsize(path) - HEADER_BYTES, 0) // dtype.itemsize
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=HEADER_BYTES, shape=(count,))
+
+
+def load_recording(directory):
+    return (load(os.path.join(directory, "commanded.npy"), COMMANDED_DTYPE),
+            load(os.path.join(directory, "reported.npy"), REPORTED_DTYPE))
+
+
+def chunks(rows, size=CHUNK_ROWS):
+    for start in range(0, len(rows), size):
+        yield np.asarray(rows[start:start + size])
+
+
+def playback(directory, speed=1.0, stop=None):
+    # Yields (x, y, z) of the reported path, or the commanded one if nothing
+    # was reported, paced to the recorded timestamps
+    commanded, reported = load_recording(directory)
+    rows = reported if len(reported) else commanded
+    if not len(rows):
+        return
+    start_time = time.time()
+    first = float(rows[0]['t'])
+    for chunk in chunks(rows):
+        for t, x, y, z in zip(chunk['t'].tolist(), chunk['x'].tolist(), chunk['y'].tolist(), chunk['z'].tolist()):
+            if stop is not None and stop.is_set():
+                return
+            delay = (t - first) / speed - (time.time() - start_time)
+            if delay > 0:
+                time.sleep(delay)
+            yield x, y, z
+
+
+def compare(directory):
+    # Distance of every reported position from the commanded segment being
+    # executed at that moment (previous target to current target). Returns
+    # {'samples', 'mean', 'rms', 'max', 'max_t'} or None without both tables.
+    commanded, reported = load_recording(directory)
+    if len(commanded) < 2 or not len(reported):
+        return None
+    command_times = commanded['t']
+    samples = 0
+    total = 0.0
+    squares = 0.0
+    worst, worst_t = 0.0, None
+    for chunk in chunks(reported):
+        # The target sent last before the report, and the one before it
+        index = np.clip(np.searchsorted(command_times, chunk['t'], side='right') - 1, 1, len(commanded) - 1)
+        low, high = int(index.min()) - 1, int(index.max()) + 1
+        window = np.asarray(commanded[low:high])
+        a = np.stack([window[axis] for axis in 'xyz'], axis=1).astype(np.float64)
+        start, end = a[index - 1 - low], a[index - low]
+        points = np.stack([chunk[axis] for axis in 'xyz'], axis=1).astype(np.float64)
+        direction = end - start
+        length = np.einsum('ij,ij->i', direction, direction)
+        fraction = np.clip(np.einsum('ij,ij->i', points - start, direction) / np.where(length > 0, length, 1.0), 0.0, 1.0)
+        error = np.linalg.norm(points - (start + fraction[:, None] * direction), axis=1)
+        samples += len(error)
+        total += float(error.sum())
+        squares += float((error ** 2).sum())
+        i = int(error.argmax())
+        if error[i] > worst:
+            worst, worst_t = float(error[i]), float(chunk['t'][i])
+    return {'samples': samples, 'mean': total / samples, 'rms': (squares / samples) ** 0.5, 'max': worst, 'max_t': worst_t}
+
+
+def export_csv(directory, csv_path):
+    # Both tables merged in time order, one chunk in memory per table
+    commanded, reported = load_recording(directory)
+
+    def rows(table, kind):
+        for chunk in chunks(table):
+            lines = chunk['line'].tolist() if kind == 'commanded' else [''] * len(chunk)
+            for t, line, x, y, z in zip(chunk['t'].tolist(), lines, chunk['x'].tolist(), chunk['y'].tolist(), chunk['z'].tolist()):
+                yield t, kind, line, x, y, z
+
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['t', 'kind', 'line', 'x', 'y', 'z'])
+        for t, kind, line, x, y, z in heapq.merge(rows(commanded, 'commanded'), rows(reported, 'reported')):
+            writer.writerow([f"{t:.3f}", kind, line, f"{x:.3f}", f"{y:.3f}", f"{z:.3f}"])
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Where per-job profiler captures are written
+PROFILES_DIR = "profiles"
+# Capture choices offered by the GUIs; pyinstrument is used only if installed
+CAPTURES = ("No capture", "cProfile", "pyinstrument")
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+# Stats.local.job while a thread has not named a job
+_NO_JOB = object()
+
+
+class _Span:
+    __slots__ = ('stats', 'name', 'start')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+# Named timing spans for the send pipeline. While disabled, span() hands back
+# one shared no-op context and add() returns at once, so the calls can stay in
+# the hot loops. Any thread may record; totals are per job and name:
+# [count, seconds, longest]. A job is any key, None for a send outside the job
+# queue. Spans count toward the job a thread named with job(), otherwise
+# toward the one begin() last made current, so a job prepared while another
+# one streams keeps its preparation in its own totals.
+class Stats:
+    def __init__(self):
+        self.enabled = False
+        self.totals = {}
+        self.started = {}
+        self.current = None
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def begin(self, key=None):
+        # Makes key the current job, dropping the totals of the one before it.
+        # Whatever key already recorded, such as its preparation, stays.
+        with self.lock:
+            self.totals.pop(self.current, None)
+            self.started.pop(self.current, None)
+            self.current = key
+            self.totals.setdefault(key, {})
+            self.started.setdefault(key, time.perf_counter())
+
+    @contextmanager
+    def job(self, key):
+        # Spans this thread records inside the block count toward key
+        previous = getattr(self.local, 'job', _NO_JOB)
+        self.local.job = key
+        try:
+            yield
+        finally:
+            self.local.job = previous
+
+    def span(self, name):
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name)
+
+    def add(self, name, seconds, count=1):
+        if not self.enabled:
+            return
+        key = getattr(self.local, 'job', _NO_JOB)
+        with self.lock:
+            if key is _NO_JOB:
+                key = self.current
+            totals = self.totals.get(key)
+            if totals is None:
+                totals = self.totals[key] = {}
+                self.started[key] = time.perf_counter() - seconds
+            entry = totals.get(name)
+            if entry is None:
+                totals[name] = [count, seconds, seconds]
+            else:
+                entry[0] += count
+                entry[1] += seconds
+                if seconds > entry[2]:
+                    entry[2] = seconds
+
+    def summary(self):
+        # Report lines for the current job, the largest share of wall-clock
+        # time since its first span or begin() first. Spans on different
+        # threads overlap, so shares can sum past 100%.
+        with self.lock:
+            wall = time.perf_counter() - self.started.get(self.current, time.perf_counter())
+            totals = sorted(self.totals.get(self.current, {}).items(), key=lambda item: item[1][1], reverse=True)
+        lines = [f"Timing over {wall:.2f} s wall clock:"]
+        for name, (count, seconds, longest) in totals:
+            share = 100.0 * seconds / wall if wall > 0 else 0.0
+            lines.append(f"  {name:12} {seconds:8.3f} s {share:5.1f}%  {count} calls, {1e6 * seconds / count:.0f} µs mean, {1e3 * longest:.1f} ms max")
+        return lines
+
+
+# The spans every module records into
+stats = Stats()
+
+
+# A cProfile or pyinstrument run around one job, started and stopped on the
+# thread that sends it. stop() writes it to PROFILES_DIR and returns the
+# path. pyinstrument falls back to cProfile when it is not installed.
+class Capture:
+    def __init__(self, kind, log):
+        self.log = log
+        self.kind = kind
+        self.profiler = None
+
+    def start(self):
+        if self.kind == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                self.log("pyinstrument is not installed, capturing with cProfile")
+                self.kind = "cProfile"
+            else:
+                self.profiler = Profiler()
+                self.profiler.start()
+                return
+        import cProfile
+        self.kind = "cProfile"
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop(self, name):
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(PROFILES_DIR, f"{os.path.splitext(os.path.basename(name))[0]}-{stamp}")
+        if self.kind == "pyinstrument":
+            self.profiler.stop()
+            path = base + ".html"
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.profiler.output_html())
+        else:
+            self.profiler.disable()
+            path = base + ".prof"
+            self.profiler.dump_stats(path)
+        return path
@@ -3,14 +3,56 @@ import serial.tools.list_ports
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import threading
+import multiprocessing
 import time
 import queue
 import json
+import math
 import os
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from mpl_toolkits.mplot3d import Axes3D
-import numpy as np
+from command_console import DEFAULT_MACROS, CommandHistory, CommandWorker
+from digital_twin import DEFAULT_POLL_HZ, FRAME_MS, DigitalTwin, StatusPoller
+from gcode_lexer import lex, strip
+from gcode_metadata import describe, index_file
+from gcode_program import HOME, JOG1, JOG2, JOG3, JOINTS, LINEAR, compile_file, motion
+from job_queue import JobQueue, JobScheduler
+from jogging import HOLD_DELAY_MS, ContinuousJog
+from machine_store import DEFAULT_MACHINE, MACHINE_POLL_MS, MachineStore, save_json, translator_machine
+from profiling import CAPTURES, Capture, stats
+from serial_link import PROTOCOLS, REALTIME_COMMANDS, SIM_PORT, open_link, release_link, close_pool
+from translator_profiles import compile_profile, load_profiles, translated_path
+from translator import translate_file, TranslationCancelled
+from visual_loader import ModuleLoader
+
+class PreviewCancelled(Exception):
+    pass
+
+def advance_robot_state(block, theta, z, r):
+    # Applies one lexed command to the (theta, z, r) preview state. Returns the
+    # new state, or None if the command does not move the robot.
+    return advance_robot_pose(*motion(block), theta, z, r)
+
+
+def advance_robot_pose(kind, a, b, c, theta, z, r):
+    # advance_robot_state for a command already reduced by
+    # gcode_program.motion, as a compiled Program stores it
+    if kind == LINEAR:
+        if not (math.isnan(a) or math.isnan(b)):
+            r = math.hypot(a, b)
+            theta = math.degrees(math.atan2(b, a))
+        if not math.isnan(c):
+            z = max(0, c)
+        return theta, z, r
+    if kind == JOINTS:
+        return (theta if math.isnan(a) else a), max(0, z if math.isnan(b) else b), max(0, r if math.isnan(c) else c)
+    if kind == HOME:
+        return 0.0, 0.0, 0.0
+    if kind == JOG1:
+        return theta + a, z, r
+    if kind == JOG2:
+        return theta, max(0, z + a), r
+    if kind == JOG3:
+        return theta, z, max(0, r + a)
+    return None
 
 class GCodeSenderApp:
     def __init__(self, root):
@@ -22,17 +64,37 @@ class GCodeSenderApp:
         self.running = False
         self.paused = False
         self.queue = queue.Queue()
+        self.jog_queue = queue.Queue()  # Segments a continuous jog finished
+        self.pose_queue = queue.Queue()  # (theta, z, r) from recording playback
+        self.jog = None
+        self.jog_button_down = False
+        self.jog_hold = None
         self.total_lines = 0
         self.translated_file = None
+        self.program = None  # Compiled file handed from start_sending to the send thread
+        self.metadata = None  # Its index, likewise
 
         # Robot state
         self.theta = 0.0  # degrees
         self.z = 0.0      # mm
         self.r = 0.0      # mm
         self.trajectory = []  # List of (theta, z, r) for preview
+        self.trajectory_lod = None  # Decimated XYZ pyramid of self.trajectory, built by the preview
+        self.view_bounds = None
+        self.preview_queue = queue.Queue()  # Results from the background preview worker
+        self.preview_cancel = threading.Event()
+        self.preview_job = 0
 
         self.load_settings()
 
+        # Limits and tuning of this cell's machine, reloaded when machines.json changes
+        self.machines = MachineStore()
+        try:
+            self.machines.load()
+        except (OSError, ValueError) as e:
+            self.log(f"Error loading machine profiles: {e}")
+        self.machine = self.machines.get(self.settings.get("machine", DEFAULT_MACHINE))
+
         # Serial Port Selection
         tk.Label(root, text="Serial Port:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
         self.port_var = tk.StringVar(value=self.settings.get("port", ""))
@@ -43,9 +105,14 @@ class GCodeSenderApp:
         self.refresh_button = tk.Button(root, text="Refresh", command=self.refresh_ports)
         self.refresh_button.grid(row=0, column=2, padx=5, pady=5)
 
+        self.protocol_var = tk.StringVar(value=self.settings.get("protocol", "Binary" if self.settings.get("binary") else "ASCII"))
+        ttk.Combobox(root, textvariable=self.protocol_var, values=PROTOCOLS, state="readonly", width=12).grid(row=0, column=3, padx=5, pady=5, sticky="w")
+
         tk.Label(root, text="Baud Rate:").grid(row=1, column=0, padx=5, pady=5, sticky="e")
         self.baud_var = tk.StringVar(value=self.settings.get("baud", "115200"))
         tk.Entry(root, textvariable=self.baud_var, width=10).grid(row=1, column=1, padx=5, pady=5, sticky="w")
+        self.auto_baud_var = tk.BooleanVar(value=self.settings.get("auto_baud", False))
+        tk.Checkbutton(root, text="Auto baud", variable=self.auto_baud_var).grid(row=1, column=1, padx=5, pady=5, sticky="e")
 
         self.connect_button = tk.Button(root, text="Connect", command=self.connect_serial)
         self.connect_button.grid(row=1, column=2, padx=5, pady=5)
@@ -58,14 +125,31 @@ class GCodeSenderApp:
         self.cura_file_var = tk.StringVar()
         tk.Entry(root, textvariable=self.cura_file_var, width=40, state="readonly").grid(row=2, column=1, padx=5, pady=5, sticky="w")
         tk.Button(root, text="Browse Cura File", command=self.browse_cura_file).grid(row=2, column=2, padx=5, pady=5)
-        tk.Label(root, text="Note: Upload Cura G-code to translate.").grid(row=3, column=1, columnspan=2, padx=5, pady=2, sticky="w")
+        self.preview_progress = ttk.Progressbar(root, length=100, mode="determinate")
+        self.preview_progress.grid(row=2, column=3, padx=5, pady=5)
+        tk.Label(root, text="Note: Upload Cura G-code to translate.").grid(row=3, column=1, padx=5, pady=2, sticky="w")
+        self.user_profiles = self.settings.get("profiles", {})
+        self.profiles = load_profiles(self.user_profiles, self.log)
+        self.profile_var = tk.StringVar(value=self.settings.get("profile", "Cura"))
+        if self.profile_var.get() not in self.profiles:
+            self.profile_var.set("Cura")
+        self.profile_combo = ttk.Combobox(root, textvariable=self.profile_var, values=list(self.profiles), state="readonly", width=15)
+        self.profile_combo.grid(row=3, column=2, padx=5, pady=2)
+        self.joint_space_var = tk.BooleanVar(value=self.settings.get("joint_space", False))
+        tk.Checkbutton(root, text="Joint-space output", variable=self.joint_space_var).grid(row=3, column=3, padx=5, pady=2, sticky="w")
 
         # Standard G-code Upload
         tk.Label(root, text="G-code File:").grid(row=4, column=0, padx=5, pady=5, sticky="e")
         self.file_var = tk.StringVar(value=self.settings.get("file", ""))
         tk.Entry(root, textvariable=self.file_var, width=40, state="readonly").grid(row=4, column=1, padx=5, pady=5, sticky="w")
         tk.Button(root, text="Browse", command=self.browse_file).grid(row=4, column=2, padx=5, pady=5)
-        tk.Label(root, text="Note: Use translated or compatible G-code.").grid(row=5, column=1, columnspan=2, padx=5, pady=2, sticky="w")
+        self.cancel_preview_button = tk.Button(root, text="Cancel Preview", command=self.cancel_preview, state="disabled")
+        self.cancel_preview_button.grid(row=4, column=3, padx=5, pady=5)
+        tk.Label(root, text="Note: Use translated or compatible G-code.").grid(row=5, column=1, padx=5, pady=2, sticky="w")
+        self.optimize_travel_var = tk.BooleanVar(value=self.settings.get("optimize_travel", False))
+        tk.Checkbutton(root, text="Optimize travel", variable=self.optimize_travel_var).grid(row=5, column=2, padx=5, pady=2, sticky="w")
+        self.resync_var = tk.BooleanVar(value=self.settings.get("resync", True))
+        tk.Checkbutton(root, text="Resync on missed ack", variable=self.resync_var).grid(row=5, column=3, padx=5, pady=2, sticky="w")
 
         # Jog Controls
         jog_frame = tk.LabelFrame(root, text="Jog Controls", padx=5, pady=5)
@@ -80,24 +164,53 @@ class GCodeSenderApp:
         self.jog_feedrate_var = tk.StringVar(value="1000")
         tk.Entry(jog_frame, textvariable=self.jog_feedrate_var, width=10).grid(row=0, column=3, padx=5, pady=2)
 
-        self.theta_plus_button = tk.Button(jog_frame, text="θ+", command=lambda: self.jog_axis("1", 1), width=5, state="disabled")
+        self.theta_plus_button = tk.Button(jog_frame, text="θ+", width=5, state="disabled")
         self.theta_plus_button.grid(row=1, column=0, padx=2, pady=2)
-        self.theta_minus_button = tk.Button(jog_frame, text="θ-", command=lambda: self.jog_axis("1", -1), width=5, state="disabled")
+        self.bind_jog(self.theta_plus_button, "1", 1)
+        self.theta_minus_button = tk.Button(jog_frame, text="θ-", width=5, state="disabled")
         self.theta_minus_button.grid(row=1, column=1, padx=2, pady=2)
+        self.bind_jog(self.theta_minus_button, "1", -1)
 
-        self.z_plus_button = tk.Button(jog_frame, text="Z+", command=lambda: self.jog_axis("2", 1), width=5, state="disabled")
+        self.z_plus_button = tk.Button(jog_frame, text="Z+", width=5, state="disabled")
         self.z_plus_button.grid(row=1, column=2, padx=2, pady=2)
-        self.z_minus_button = tk.Button(jog_frame, text="Z-", command=lambda: self.jog_axis("2", -1), width=5, state="disabled")
+        self.bind_jog(self.z_plus_button, "2", 1)
+        self.z_minus_button = tk.Button(jog_frame, text="Z-", width=5, state="disabled")
         self.z_minus_button.grid(row=1, column=3, padx=2, pady=2)
+        self.bind_jog(self.z_minus_button, "2", -1)
 
-        self.r_plus_button = tk.Button(jog_frame, text="R+", command=lambda: self.jog_axis("3", 1), width=5, state="disabled")
+        self.r_plus_button = tk.Button(jog_frame, text="R+", width=5, state="disabled")
         self.r_plus_button.grid(row=1, column=4, padx=2, pady=2)
-        self.r_minus_button = tk.Button(jog_frame, text="R-", command=lambda: self.jog_axis("3", -1), width=5, state="disabled")
+        self.bind_jog(self.r_plus_button, "3", 1)
+        self.r_minus_button = tk.Button(jog_frame, text="R-", width=5, state="disabled")
         self.r_minus_button.grid(row=1, column=5, padx=2, pady=2)
+        self.bind_jog(self.r_minus_button, "3", -1)
 
         self.home_button = tk.Button(jog_frame, text="Home All Axes", command=self.home_axes, state="disabled")
         self.home_button.grid(row=0, column=4, columnspan=2, padx=5, pady=2)
 
+        # Live position from controller reports
+        self.live_var = tk.BooleanVar(value=self.settings.get("live_position", False))
+        tk.Checkbutton(jog_frame, text="Live position", variable=self.live_var, command=self.toggle_live_position).grid(row=2, column=0, columnspan=2, padx=5, pady=2, sticky="w")
+        tk.Label(jog_frame, text="Poll rate (Hz):").grid(row=2, column=2, padx=5, pady=2)
+        self.poll_rate_var = tk.StringVar(value=self.settings.get("poll_rate", str(DEFAULT_POLL_HZ)))
+        tk.Entry(jog_frame, textvariable=self.poll_rate_var, width=10).grid(row=2, column=3, padx=5, pady=2)
+        self.poll_m114_var = tk.BooleanVar(value=self.settings.get("poll_m114", False))
+        tk.Checkbutton(jog_frame, text="Poll with M114", variable=self.poll_m114_var).grid(row=2, column=4, columnspan=2, padx=5, pady=2, sticky="w")
+        tk.Label(jog_frame, text="Machine:").grid(row=3, column=0, padx=5, pady=2)
+        self.machine_var = tk.StringVar(value=self.settings.get("machine", DEFAULT_MACHINE))
+        if self.machine_var.get() not in self.machines.machines:
+            self.machine_var.set(DEFAULT_MACHINE)
+        self.machine_combo = ttk.Combobox(jog_frame, textvariable=self.machine_var, values=list(self.machines.machines), state="readonly", width=15)
+        self.machine_combo.grid(row=3, column=1, columnspan=2, padx=5, pady=2, sticky="w")
+        self.machine_combo.bind("<<ComboboxSelected>>", lambda event: self.apply_machine())
+        self.apply_machine()
+        self.root.after(MACHINE_POLL_MS, self.check_machine_file)
+        self.twin = DigitalTwin()
+        self.recorder = None  # Records the running job's commanded and reported path
+        self.playback_stop = None
+        self.poller = None
+        self.live_pose = None
+
         # Manual Command
         tk.Label(root, text="Manual Command:").grid(row=7, column=0, padx=5, pady=5, sticky="e")
         self.command_var = tk.StringVar()
@@ -106,6 +219,16 @@ class GCodeSenderApp:
         self.send_button = tk.Button(root, text="Send", command=self.send_manual_command, state="disabled")
         self.send_button.grid(row=7, column=2, padx=5, pady=5)
         self.command_entry.bind("<Return>", lambda event: self.send_manual_command())
+        self.command_entry.bind("<Up>", lambda event: self.recall_command(self.history.previous()))
+        self.command_entry.bind("<Down>", lambda event: self.recall_command(self.history.next()))
+        self.command_entry.bind("<<Paste>>", self.paste_commands)
+        self.history = CommandHistory(self.settings.get("history", []))
+        self.macros = self.settings.get("macros", DEFAULT_MACROS)
+        self.console = CommandWorker(self.log)
+        self.macro_var = tk.StringVar()
+        self.macro_combo = ttk.Combobox(root, textvariable=self.macro_var, values=sorted(self.macros), state="readonly", width=15)
+        self.macro_combo.grid(row=7, column=3, padx=5, pady=5, sticky="w")
+        self.macro_combo.bind("<<ComboboxSelected>>", self.run_selected_macro)
 
         # Controls
         self.start_button = tk.Button(root, text="Start", command=self.start_sending, state="disabled")
@@ -121,16 +244,87 @@ class GCodeSenderApp:
         self.output_text = tk.Text(root, height=10, width=50, state="disabled")
         self.output_text.grid(row=9, column=0, columnspan=4, padx=5, pady=5)
 
-        # 3D Visualization
-        self.fig = plt.Figure(figsize=(5, 4))
-        self.ax = self.fig.add_subplot(111, projection='3d')
-        self.canvas = FigureCanvasTkAgg(self.fig, master=root)
-        self.canvas.get_tk_widget().grid(row=0, column=4, rowspan=10, padx=5, pady=5, sticky="nsew")
-        self.init_3d_plot()
+        # Recorded jobs
+        tk.Button(root, text="Play Recording", command=self.play_recording).grid(row=10, column=0, padx=5, pady=5)
+        tk.Button(root, text="Compare Recording", command=self.compare_recording).grid(row=10, column=1, padx=5, pady=5)
+        tk.Button(root, text="Export Recording", command=self.export_recording).grid(row=10, column=2, padx=5, pady=5)
+
+        # Instrumentation: span timings reported at job end, and an optional profiler capture per job
+        timing_frame = tk.Frame(root)
+        timing_frame.grid(row=10, column=3, padx=5, pady=5, sticky="w")
+        self.timing_var = tk.BooleanVar(value=self.settings.get("timing", False))
+        tk.Checkbutton(timing_frame, text="Timing", variable=self.timing_var, command=self.toggle_timing).grid(row=0, column=0, sticky="w")
+        self.capture_var = tk.StringVar(value=self.settings.get("capture", CAPTURES[0]))
+        if self.capture_var.get() not in CAPTURES:
+            self.capture_var.set(CAPTURES[0])
+        ttk.Combobox(timing_frame, textvariable=self.capture_var, values=CAPTURES, state="readonly", width=11).grid(row=0, column=1, padx=2)
+        self.toggle_timing()
+        self.capture = None  # Profiler for the job being started, run by the send thread
+
+        # Job queue
+        queue_frame = tk.LabelFrame(root, text="Job Queue", padx=5, pady=5)
+        queue_frame.grid(row=11, column=0, columnspan=4, padx=5, pady=5, sticky="ew")
+        self.job_list = tk.Listbox(queue_frame, height=5, width=70, exportselection=False)
+        self.job_list.grid(row=0, column=0, columnspan=8, padx=5, pady=2, sticky="ew")
+        tk.Label(queue_frame, text="Priority:").grid(row=1, column=0, padx=2, pady=2, sticky="e")
+        self.job_priority_var = tk.StringVar(value="0")
+        tk.Entry(queue_frame, textvariable=self.job_priority_var, width=5).grid(row=1, column=1, padx=2, pady=2, sticky="w")
+        # Blank fields use the translation defaults
+        self.job_option_vars = {}
+        for column, (key, label) in enumerate((('x_offset', "X off:"), ('y_offset', "Y off:"), ('z_offset', "Z off:"), ('max_feedrate', "Feed cap:")), 1):
+            tk.Label(queue_frame, text=label).grid(row=1, column=2 * column, padx=2, pady=2, sticky="e")
+            self.job_option_vars[key] = tk.StringVar()
+            tk.Entry(queue_frame, textvariable=self.job_option_vars[key], width=7).grid(row=1, column=2 * column + 1, padx=2, pady=2, sticky="w")
+        tk.Button(queue_frame, text="Add Job", command=lambda: self.add_job(False)).grid(row=2, column=0, padx=2, pady=2)
+        tk.Button(queue_frame, text="Add Cura Job", command=lambda: self.add_job(True)).grid(row=2, column=1, padx=2, pady=2)
+        tk.Button(queue_frame, text="Remove", command=self.remove_job).grid(row=2, column=2, padx=2, pady=2)
+        tk.Button(queue_frame, text="Up", command=lambda: self.move_job(-1)).grid(row=2, column=3, padx=2, pady=2)
+        tk.Button(queue_frame, text="Down", command=lambda: self.move_job(1)).grid(row=2, column=4, padx=2, pady=2)
+        tk.Button(queue_frame, text="Retry", command=self.retry_job).grid(row=2, column=5, padx=2, pady=2)
+        self.run_queue_button = tk.Button(queue_frame, text="Run Queue", command=self.toggle_job_queue)
+        self.run_queue_button.grid(row=2, column=6, columnspan=2, padx=2, pady=2)
+        self.jobs = JobQueue()
+        try:
+            self.jobs.load()
+        except (json.JSONDecodeError, IOError, KeyError) as e:
+            self.log(f"Error loading job queue: {e}")
+        self.scheduler = JobScheduler(self.log)
+        self.queue_running = False
+        self.current_job = None
+        self.job_events = queue.Queue()  # Whether each finished transmission completed
+        self.connect_queue = queue.Queue()  # Links set up by connect_thread, or None if it failed
+        self.connecting = False
+        self.refresh_job_list()
+
+        # 3D Visualization, built by check_queue once matplotlib has loaded
+        # in the background so the console is usable straight away
+        self.fig = self.ax = self.canvas = None
+        self.view_placeholder = tk.Label(root, text="Loading 3D view...", width=60)
+        self.view_placeholder.grid(row=0, column=4, rowspan=10, padx=5, pady=5, sticky="nsew")
+        self.visual_loader = ModuleLoader()
+        self.root.after_idle(self.visual_loader.start)
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         self.root.after(100, self.check_queue)
 
+    def build_3d_view(self, loader):
+        if loader.error is not None:
+            self.view_placeholder.config(text="3D view unavailable")
+            self.log(f"Error loading 3D view: {loader.error}")
+            return
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from mpl_toolkits.mplot3d import Axes3D  # Registers the 3d projection
+        self.view_placeholder.destroy()
+        self.fig = Figure(figsize=(5, 4))
+        self.ax = self.fig.add_subplot(111, projection='3d')
+        self.canvas = FigureCanvasTkAgg(self.fig, master=self.root)
+        self.canvas.get_tk_widget().grid(row=0, column=4, rowspan=10, padx=5, pady=5, sticky="nsew")
+        self.canvas.mpl_connect('button_release_event', self.on_view_changed)
+        self.canvas.mpl_connect('scroll_event', self.on_view_changed)
+        self.init_3d_plot()
+        self.log(f"3D view loaded in {loader.seconds:.2f} s")
+
     def init_3d_plot(self):
         self.ax.clear()
         self.ax.set_xlabel('X (mm)')
@@ -142,14 +336,28 @@ class GCodeSenderApp:
         self.update_robot_visual()
         self.canvas.draw()
 
+    def get_view_bounds(self):
+        return (tuple(self.ax.get_xlim3d()), tuple(self.ax.get_ylim3d()), tuple(self.ax.get_zlim3d()))
+
+    def on_view_changed(self, event):
+        # Zooming changes the axis limits; redraw so the trajectory level matches the new view
+        if self.get_view_bounds() != self.view_bounds:
+            self.update_robot_visual()
+
     def update_robot_visual(self):
+        if self.ax is None:
+            return
+        import numpy as np
+        # Keep the operator's zoom across redraws
+        self.view_bounds = self.get_view_bounds()
+        (x_min, x_max), (y_min, y_max), (z_min, z_max) = self.view_bounds
         self.ax.clear()
         self.ax.set_xlabel('X (mm)')
         self.ax.set_ylabel('Y (mm)')
         self.ax.set_zlabel('Z (mm)')
-        self.ax.set_xlim(-200, 200)
-        self.ax.set_ylim(-200, 200)
-        self.ax.set_zlim(0, 300)
+        self.ax.set_xlim(x_min, x_max)
+        self.ax.set_ylim(y_min, y_max)
+        self.ax.set_zlim(z_min, z_max)
 
         # Robot parameters
         base_radius = 50
@@ -182,70 +390,54 @@ class GCodeSenderApp:
         z_ee = self.z
         self.ax.scatter([x_ee], [y_ee], [z_ee], color='k', s=50, label='End Effector')
 
-        # Trajectory preview
-        if self.trajectory:
-            x_traj = [r * np.cos(np.radians(theta)) for theta, _, r in self.trajectory]
-            y_traj = [r * np.sin(np.radians(theta)) for theta, _, r in self.trajectory]
-            z_traj = [z for _, z, _ in self.trajectory]
-            self.ax.plot(x_traj, y_traj, z_traj, 'c--', alpha=0.7, label='Trajectory')
+        # Trajectory preview at the level of detail that fits the current view
+        if self.trajectory_lod is not None and self.trajectory_lod.count:
+            traj = self.trajectory_lod.polyline(self.view_bounds)
+            if len(traj):
+                self.ax.plot(traj[:, 0], traj[:, 1], traj[:, 2], 'c--', alpha=0.7, label='Trajectory')
 
         self.ax.legend()
         self.canvas.draw()
 
-    def parse_gcode_for_trajectory(self, file_path):
-        self.trajectory = []
+    def parse_gcode_for_trajectory(self, file_path, progress=None, cancel=None):
+        trajectory = []
         current_theta = 0.0
         current_z = 0.0
         current_r = 0.0
+        total_size = max(os.path.getsize(file_path), 1)
+        bytes_read = 0
 
         try:
             with open(file_path, 'r') as f:
-                for line in f:
-                    line = line.split(';', 1)[0].strip().upper()
-                    if not line:
-                        continue
-                    parts = line.split()
-                    if not parts:
+                for line_number, line in enumerate(f, 1):
+                    bytes_read += len(line)
+                    if line_number % 1000 == 0:
+                        if cancel is not None and cancel.is_set():
+                            raise PreviewCancelled()
+                        if progress is not None:
+                            progress(bytes_read / total_size)
+                    block = lex(line)
+                    if block is None:
                         continue
-
-                    if parts[0] == 'G28':
-                        current_theta = 0.0
-                        current_z = 0.0
-                        current_r = 0.0
-                        self.trajectory.append((current_theta, current_z, current_r))
-                    elif parts[0] in ('G00', 'G01'):
-                        x, y, z = None, None, None
-                        for part in parts[1:]:
-                            if part.startswith('X'):
-                                x = float(part[1:])
-                            elif part.startswith('Y'):
-                                y = float(part[1:])
-                            elif part.startswith('Z'):
-                                z = float(part[1:])
-                        if x is not None and y is not None:
-                            current_r = (x**2 + y**2)**0.5
-                            current_theta = np.degrees(np.arctan2(y, x))
-                        if z is not None:
-                            current_z = max(0, z)
-                        if x is not None or y is not None or z is not None:
-                            self.trajectory.append((current_theta, current_z, current_r))
-                    elif parts[0].startswith('J'):
-                        axis = parts[0][1]
-                        distance = None
-                        for part in parts[1:]:
-                            if part.startswith('D'):
-                                distance = float(part[1:])
-                        if distance is not None:
-                            if axis == '1':
-                                current_theta += distance
-                            elif axis == '2':
-                                current_z = max(0, current_z + distance)
-                            elif axis == '3':
-                                current_r = max(0, current_r + distance)
-                            self.trajectory.append((current_theta, current_z, current_r))
+                    state = advance_robot_state(block, current_theta, current_z, current_r)
+                    if state is not None:
+                        current_theta, current_z, current_r = state
+                        trajectory.append(state)
+        except PreviewCancelled:
+            raise
         except Exception as e:
             self.log(f"Error parsing G-code for trajectory: {e}")
-            self.trajectory = []
+            trajectory = []
+
+        # Build the drawing pyramid here so the caller gets finished arrays
+        import numpy as np
+        from trajectory_lod import TrajectoryLOD
+        trajectory_lod = TrajectoryLOD()
+        if trajectory:
+            traj = np.array(trajectory)
+            theta_rad = np.radians(traj[:, 0])
+            trajectory_lod.set_points(np.column_stack((traj[:, 2] * np.cos(theta_rad), traj[:, 2] * np.sin(theta_rad), traj[:, 1])))
+        return trajectory, trajectory_lod
 
     def load_settings(self):
         self.settings = {}
@@ -262,16 +454,30 @@ class GCodeSenderApp:
         self.settings = {
             "port": self.port_var.get(),
             "baud": self.baud_var.get(),
-            "file": self.file_var.get()
+            "file": self.file_var.get(),
+            "protocol": self.protocol_var.get(),
+            "joint_space": self.joint_space_var.get(),
+            "optimize_travel": self.optimize_travel_var.get(),
+            "resync": self.resync_var.get(),
+            "auto_baud": self.auto_baud_var.get(),
+            "live_position": self.live_var.get(),
+            "poll_rate": self.poll_rate_var.get(),
+            "poll_m114": self.poll_m114_var.get(),
+            "profile": self.profile_var.get(),
+            "machine": self.machine_var.get(),
+            "profiles": self.user_profiles,
+            "history": self.history.entries,
+            "timing": self.timing_var.get(),
+            "capture": self.capture_var.get(),
+            "macros": self.macros
         }
         try:
-            with open("settings.json", "w") as f:
-                json.dump(self.settings, f, indent=4)
+            save_json("settings.json", self.settings)
         except IOError as e:
             self.log(f"Error saving settings: {e}")
 
     def refresh_ports(self):
-        ports = [port.device for port in serial.tools.list_ports.comports()]
+        ports = [port.device for port in serial.tools.list_ports.comports()] + [SIM_PORT]
         self.port_combo["values"] = ports
         if ports and not self.port_var.get():
             self.port_var.set(ports[0])
@@ -285,77 +491,110 @@ class GCodeSenderApp:
             self.file_var.set(file_path)
             self.cura_file_var.set("")
             self.log(f"Selected standard G-code file: {file_path}")
-            self.parse_gcode_for_trajectory(file_path)
-            self.update_robot_visual()
-            self.log("Trajectory preview updated")
+            self.start_preview(file_path, translate=False)
 
     def browse_cura_file(self):
         file_path = filedialog.askopenfilename(filetypes=[("G-code Files", "*.gcode"), ("All Files", "*.*")])
         if file_path:
             self.cura_file_var.set(file_path)
             self.log(f"Selected Cura G-code file: {file_path}")
-            try:
-                translated_path = self.translate_cura_gcode(file_path)
-                self.file_var.set(translated_path)
-                self.log(f"Translated Cura G-code saved as: {translated_path}")
-                self.parse_gcode_for_trajectory(translated_path)
-                self.update_robot_visual()
-                self.log("Trajectory preview updated")
-            except Exception as e:
-                self.log(f"Error translating Cura G-code: {e}")
-                messagebox.showerror("Error", f"Failed to translate Cura G-code: {e}")
-
-    def translate_cura_gcode(self, input_path):
-        output_path = "translated.gcode"
-        max_feedrate = 1000.0
-
-        output_lines = ["G28\n", "G90\n"]
-        current_f = max_feedrate
-
-        with open(input_path, 'r') as f:
-            lines = f.readlines()
+            self.start_preview(file_path, translate=True)
+
+    def start_preview(self, file_path, translate):
+        # A newer selection supersedes any preview still loading
+        self.preview_cancel.set()
+        self.preview_cancel = threading.Event()
+        self.preview_job += 1
+        self.preview_progress["value"] = 0
+        self.cancel_preview_button.config(state="normal")
+        # Tk variables are read here, on the main thread, not in the worker
+        options = self.get_translate_options() if translate else None
+        threading.Thread(target=self.preview_thread, args=(self.preview_job, file_path, options, self.preview_cancel), daemon=True).start()
+
+    def cancel_preview(self):
+        self.preview_cancel.set()
+
+    def preview_thread(self, job, file_path, options, cancel):
+        try:
+            if options is not None:
+                # Translation is the first half of the work, parsing the second
+                file_path = self.translate_cura_gcode(file_path, options, lambda fraction: self.preview_queue.put(("progress", job, fraction / 2)), cancel)
+                self.preview_queue.put(("translated", job, file_path))
+                trajectory, trajectory_lod = self.parse_gcode_for_trajectory(file_path, lambda fraction: self.preview_queue.put(("progress", job, 0.5 + fraction / 2)), cancel)
+            else:
+                trajectory, trajectory_lod = self.parse_gcode_for_trajectory(file_path, lambda fraction: self.preview_queue.put(("progress", job, fraction)), cancel)
+            self.show_job_stats(file_path)
+            self.preview_queue.put(("done", job, (trajectory, trajectory_lod)))
+        except (PreviewCancelled, TranslationCancelled):
+            self.preview_queue.put(("cancelled", job, None))
+        except Exception as e:
+            self.preview_queue.put(("error", job, e))
 
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith(';'):
-                continue
-            if line.startswith(('M104', 'M105', 'M109', 'M82', 'M107', 'G92')):
+    def check_preview_queue(self):
+        while not self.preview_queue.empty():
+            kind, job, payload = self.preview_queue.get()
+            if job != self.preview_job:
                 continue
-            if line.startswith(('G0 ', 'G1 ')):
-                parts = line.split()
-                cmd = 'G00' if line.startswith('G0') else 'G01'
-                x, y, z, f = None, None, None, None
-                for part in parts[1:]:
-                    if part.startswith('X'):
-                        x = float(part[1:])
-                    elif part.startswith('Y'):
-                        y = float(part[1:])
-                    elif part.startswith('Z'):
-                        z = float(part[1:])
-                    elif part.startswith('F'):
-                        f = float(part[1:])
-                if x is not None or y is not None or z is not None:
-                    if f is not None:
-                        current_f = min(f, max_feedrate)
-                    new_line = f"{cmd} "
-                    if x is not None:
-                        new_line += f"X{x:.3f} "
-                    if y is not None:
-                        new_line += f"Y{y:.3f} "
-                    if z is not None:
-                        new_line += f"Z{z:.3f} "
-                    new_line += f"F{current_f}"
-                    output_lines.append(new_line + "\n")
-            elif line == 'G90':
-                output_lines.append("G90\n")
-            elif line == 'G28':
-                output_lines.append("G28\n")
-
-        output_lines.append("M114\n")
-
-        with open(output_path, 'w') as f:
-            f.writelines(output_lines)
-
+            if kind == "progress":
+                self.preview_progress["value"] = payload * 100
+            elif kind == "translated":
+                self.file_var.set(payload)
+                self.log(f"Translated Cura G-code saved as: {payload}")
+            elif kind == "done":
+                self.trajectory, self.trajectory_lod = payload
+                self.preview_progress["value"] = 100
+                self.cancel_preview_button.config(state="disabled")
+                self.update_robot_visual()
+                self.log("Trajectory preview updated")
+            elif kind == "cancelled":
+                self.preview_progress["value"] = 0
+                self.cancel_preview_button.config(state="disabled")
+                self.log("Preview cancelled")
+            elif kind == "error":
+                self.preview_progress["value"] = 0
+                self.cancel_preview_button.config(state="disabled")
+                self.log(f"Error translating Cura G-code: {payload}")
+                messagebox.showerror("Error", f"Failed to translate Cura G-code: {payload}")
+
+    def apply_machine(self):
+        # Jog defaults, the open link's batch depth and the translation
+        # profile follow the selected machine
+        machine = self.machine = self.machines.get(self.machine_var.get())
+        self.jog_distance_var.set(f"{machine['jog_distance']:g}")
+        self.jog_feedrate_var.set(f"{machine['jog_feedrate']:g}")
+        if self.serial and self.serial.is_open:
+            self.serial.pipeline_depth = machine['pipeline_depth']
+            self.serial.resend_window = machine['resend_window']
+        profile = machine['translator_profile']
+        if profile in self.profiles:
+            self.profile_var.set(profile)
+        elif profile:
+            self.log(f"Machine {self.machine_var.get()} names unknown translation profile {profile}")
+
+    def check_machine_file(self):
+        # Hot reload: a profile edited mid-shift applies without a restart; a
+        # broken edit is reported and the previous profiles stay in effect
+        if self.machines.changed():
+            try:
+                self.machines.load()
+            except (OSError, ValueError) as e:
+                self.log(f"Error reloading machine profiles, keeping the previous ones: {e}")
+            else:
+                self.machine_combo.config(values=list(self.machines.machines))
+                self.apply_machine()
+                self.log(f"Machine profiles reloaded, using {self.machine_var.get()}")
+        self.root.after(MACHINE_POLL_MS, self.check_machine_file)
+
+    def get_translate_options(self):
+        stages = [stage for stage, var in (('joint_space', self.joint_space_var), ('optimize_travel', self.optimize_travel_var)) if var.get()]
+        return compile_profile(self.profiles[self.profile_var.get()], stages, translator_machine(self.machine))
+
+    def translate_cura_gcode(self, input_path, options, progress=None, cancel=None):
+        output_path = translated_path(input_path)
+        with stats.span('translate'):
+            warnings = translate_file(input_path, output_path, options, progress=progress, cancel=cancel)
+        for warning in warnings:
+            self.log(warning)
         return output_path
 
     def jog_axis(self, axis, direction):
@@ -387,6 +626,148 @@ class GCodeSenderApp:
         
         self.send_manual_command(command)
 
+    def record_report(self, position):
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.reported(position)
+
+    def choose_recording(self):
+        from path_recorder import RECORDINGS_DIR
+        return filedialog.askdirectory(initialdir=RECORDINGS_DIR if os.path.isdir(RECORDINGS_DIR) else None, title="Select a recording")
+
+    def play_recording(self):
+        # A second click while playing stops the playback
+        if self.playback_stop is not None and not self.playback_stop.is_set():
+            self.playback_stop.set()
+            return
+        directory = self.choose_recording()
+        if not directory:
+            return
+        self.playback_stop = threading.Event()
+        threading.Thread(target=self.playback_thread, args=(directory, self.playback_stop), daemon=True).start()
+
+    def playback_thread(self, directory, stop):
+        from path_recorder import playback
+        self.log(f"Playing back {directory}")
+        try:
+            for x, y, z in playback(directory, stop=stop):
+                r = math.hypot(x, y)
+                theta = math.degrees(math.atan2(y, x)) if r > 0.001 else self.theta
+                self.pose_queue.put((theta, z, r))
+        except (OSError, ValueError) as e:
+            self.log(f"Error playing recording: {e}")
+            return
+        finally:
+            stop.set()
+        self.log("Playback finished")
+
+    def compare_recording(self):
+        directory = self.choose_recording()
+        if not directory:
+            return
+        from path_recorder import compare
+        try:
+            result = compare(directory)
+        except (OSError, ValueError) as e:
+            self.log(f"Error comparing recording: {e}")
+            return
+        if result is None:
+            self.log("Recording needs commanded lines and position reports to compare")
+            return
+        self.log(f"Deviation over {result['samples']} reports: mean {result['mean']:.3f} mm, RMS {result['rms']:.3f} mm, max {result['max']:.3f} mm")
+
+    def export_recording(self):
+        directory = self.choose_recording()
+        if not directory:
+            return
+        csv_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV Files", "*.csv"), ("All Files", "*.*")])
+        if not csv_path:
+            return
+        from path_recorder import export_csv
+        try:
+            export_csv(directory, csv_path)
+            self.log(f"Recording exported to {csv_path}")
+        except (OSError, ValueError) as e:
+            self.log(f"Error exporting recording: {e}")
+
+    def toggle_live_position(self):
+        if self.live_var.get():
+            self.start_live_position()
+        else:
+            self.stop_live_position()
+
+    def start_live_position(self):
+        self.stop_live_position()
+        if not self.serial or not self.serial.is_open:
+            return
+        try:
+            rate = float(self.poll_rate_var.get())
+        except ValueError:
+            self.log("Invalid poll rate.")
+            return
+        self.poller = StatusPoller(self.serial, self.twin, rate, use_m114=self.poll_m114_var.get(), on_report=self.record_report)
+        self.poller.start()
+        self.log(f"Polling position at {rate:g} Hz")
+        self.root.after(FRAME_MS, lambda: self.update_live_position(self.poller))
+
+    def stop_live_position(self):
+        if self.poller is not None:
+            self.poller.stop()
+            self.poller = None
+            self.live_pose = None
+
+    def update_live_position(self, poller):
+        # Redraws the arm at the interpolated reported pose until the poller changes
+        if poller is not self.poller:
+            return
+        pose = self.twin.pose_at()
+        if pose is not None and (self.live_pose is None or max(abs(a - b) for a, b in zip(pose, self.live_pose)) > 0.01):
+            self.live_pose = pose
+            self.theta, self.z, self.r = pose
+            self.update_robot_visual()
+        self.root.after(FRAME_MS, lambda: self.update_live_position(poller))
+
+    def bind_jog(self, button, axis, direction):
+        # A click jogs one step; holding the button jogs until it is released
+        button.bind("<ButtonPress-1>", lambda event: self.jog_pressed(button, axis, direction))
+        button.bind("<ButtonRelease-1>", lambda event: self.jog_released(axis, direction))
+
+    def jog_pressed(self, button, axis, direction):
+        if str(button["state"]) == "disabled":
+            return
+        self.jog_button_down = True
+        self.jog_hold = self.root.after(HOLD_DELAY_MS, lambda: self.start_continuous_jog(axis, direction))
+
+    def jog_released(self, axis, direction):
+        if not self.jog_button_down:
+            return
+        self.jog_button_down = False
+        if self.jog is not None:
+            self.jog.stop()
+            self.jog = None
+            self.log("Jog stopped")
+        else:
+            self.root.after_cancel(self.jog_hold)
+            self.jog_axis(axis, direction)
+
+    def start_continuous_jog(self, axis, direction):
+        self.jog_button_down = False
+        if not self.serial or not self.serial.is_open:
+            self.log("Not connected. Please connect first.")
+            return
+        if self.running:
+            self.log("Cannot jog while G-code is running.")
+            return
+        try:
+            feedrate = float(self.jog_feedrate_var.get())
+        except ValueError:
+            self.log("Invalid jog feedrate.")
+            return
+        self.jog_button_down = True
+        self.jog = ContinuousJog(self.serial, axis, direction, feedrate, self.log, self.jog_queue.put, self.machine['jog_segment_seconds'], self.machine['jog_planner_depth'])
+        self.jog.start()
+        self.log(f"Jogging axis {axis} {'+' if direction > 0 else '-'} at {feedrate}, release to stop")
+
     def home_axes(self):
         if not self.serial or not self.serial.is_open:
             self.log("Not connected. Please connect first.")
@@ -410,67 +791,248 @@ class GCodeSenderApp:
         if command is None:
             command = self.command_var.get().strip()
             self.command_var.set("")
+            if command:
+                self.history.add(command)
         if not command:
             self.log("No command entered")
             return
 
+        if command.upper() in REALTIME_COMMANDS:
+            self.log(f"Real-time command: {command}")
+            try:
+                if not self.serial.realtime(REALTIME_COMMANDS[command.upper()]):
+                    self.log("Controller does not support real-time commands")
+            except serial.SerialException as e:
+                self.log(f"Error sending command: {e}")
+            return
+        if self.running:
+            self.log("Only real-time commands (! ~ ? ^X) can be sent while G-code is running.")
+            return
+
+        if command.startswith('@'):
+            commands = self.macros.get(command[1:])
+            if commands is None:
+                self.log(f"Unknown macro: {command[1:]}")
+                return
+        else:
+            commands = [command]
+        self.submit_commands(commands)
+
+    def submit_commands(self, commands):
+        moved = False
+        for command in commands:
+            try:
+                block = lex(command)
+                state = advance_robot_state(block, self.theta, self.z, self.r) if block else None
+                if state is not None:
+                    self.theta, self.z, self.r = state
+                    moved = True
+            except Exception as e:
+                self.log(f"Error parsing command for visualization: {e}")
+        if moved:
+            self.update_robot_visual()
+
+        if len(commands) == 1:
+            self.log(f"Sending command: {commands[0]}")
+        else:
+            self.log(f"Sending {len(commands)} lines")
+        self.console.submit(self.serial, commands)
+
+    def recall_command(self, command):
+        if command is not None:
+            self.command_var.set(command)
+            self.command_entry.icursor(tk.END)
+        return "break"
+
+    def paste_commands(self, event):
+        # A multi-line paste is sent as one pipelined batch instead of landing in the entry
         try:
-            parts = command.upper().split()
-            if parts[0].startswith('J'):
-                axis = parts[0][1]
-                distance = None
-                for part in parts[1:]:
-                    if part.startswith('D'):
-                        distance = float(part[1:])
-                if distance is not None:
-                    if axis == "1":
-                        self.theta += distance
-                    elif axis == "2":
-                        self.z = max(0, self.z + distance)
-                    elif axis == "3":
-                        self.r = max(0, self.r + distance)
-                    self.update_robot_visual()
-            elif parts[0] == "G28":
-                self.theta = 0.0
-                self.z = 0.0
-                self.r = 0.0
-                self.update_robot_visual()
-        except Exception as e:
-            self.log(f"Error parsing command for visualization: {e}")
+            text = self.root.clipboard_get()
+        except tk.TclError:
+            return None
+        commands = [line for line in (strip(line) for line in text.splitlines()) if line]
+        if len(commands) < 2:
+            return None
+        if not self.serial or not self.serial.is_open:
+            self.log("Not connected. Please connect first.")
+        elif self.running:
+            self.log("Cannot send a batch while G-code is running.")
+        else:
+            self.submit_commands(commands)
+        return "break"
+
+    def run_selected_macro(self, event):
+        name = self.macro_var.get()
+        self.macro_var.set("")
+        if name:
+            self.send_manual_command("@" + name)
+
+    def selected_job(self):
+        selection = self.job_list.curselection()
+        if not selection:
+            return None
+        return self.jobs.jobs[selection[0]]
+
+    def refresh_job_list(self):
+        selection = self.job_list.curselection()
+        self.job_list.delete(0, tk.END)
+        for job in self.jobs.jobs:
+            self.job_list.insert(tk.END, self.jobs.describe(job))
+        if selection and selection[0] < len(self.jobs.jobs):
+            self.job_list.selection_set(selection[0])
+
+    def add_job(self, translate):
+        file_path = filedialog.askopenfilename(filetypes=[("G-code Files", "*.gcode"), ("All Files", "*.*")])
+        if not file_path:
+            return
+        try:
+            priority = int(self.job_priority_var.get() or 0)
+            options = {key: float(var.get()) for key, var in self.job_option_vars.items() if var.get().strip()}
+        except ValueError:
+            messagebox.showerror("Error", "Invalid priority or job setting.")
+            return
+        try:
+            job = self.jobs.add(file_path, translate=translate, priority=priority, options=options)
+        except OSError as e:
+            self.log(f"Error saving job queue: {e}")
+            return
+        self.log(f"Queued job #{job['id']}: {file_path}")
+        self.refresh_job_list()
 
+    def remove_job(self):
+        job = self.selected_job()
+        if job is None:
+            return
+        if job is self.current_job:
+            self.log("Cannot remove the running job.")
+            return
+        self.scheduler.discard(job['id'])
+        self.jobs.remove(job['id'])
+        self.refresh_job_list()
+
+    def move_job(self, offset):
+        job = self.selected_job()
+        if job is None:
+            return
+        self.jobs.move(job['id'], offset)
+        self.refresh_job_list()
+        self.job_list.selection_clear(0, tk.END)
+        self.job_list.selection_set(self.jobs.jobs.index(job))
+
+    def retry_job(self):
+        job = self.selected_job()
+        if job is None or job is self.current_job:
+            return
+        self.scheduler.discard(job['id'])
+        self.jobs.update(job, status='queued', error=None)
+        self.refresh_job_list()
+
+    def toggle_job_queue(self):
+        self.queue_running = not self.queue_running
+        self.run_queue_button.config(text="Stop Queue" if self.queue_running else "Run Queue")
+        if self.queue_running:
+            self.log("Job queue started")
+        else:
+            self.log("Job queue stopped; the running job will finish")
+
+    def start_next_job(self):
+        # Called from the Tk loop whenever the queue runs and nothing is sending
+        job = self.jobs.next()
+        if job is None:
+            self.toggle_job_queue()
+            self.log("Job queue finished")
+            return
+        if not self.serial or not self.serial.is_open:
+            self.toggle_job_queue()
+            self.log("Not connected. Please connect first.")
+            return
+        future = self.scheduler.prepare(job, self.get_translate_options())
+        if not future.done():
+            return
+        self.scheduler.discard(job['id'])
         try:
-            self.log(f"Sending command: {command}")
-            self.serial.write((command + '\n').encode('utf-8'))
-            self.serial.flush()
-            start_time = time.time()
-            prompt_seen = False
-            while time.time() - start_time < 60:
-                if self.serial.in_waiting > 0:
-                    raw_data = self.serial.readline()
-                    try:
-                        response = raw_data.decode('utf-8').strip()
-                        self.log(f"Received: {response}")
-                        if 'ready>' in response:
-                            prompt_seen = True
-                            break
-                    except UnicodeDecodeError:
-                        self.log(f"Decode error: {raw_data.hex()}")
-                time.sleep(0.01)
-            if not prompt_seen:
-                self.log("No prompt received after command")
-        except serial.SerialException as e:
-            self.log(f"Error sending command: {e}")
+            prepared = future.result()
+        except Exception as e:
+            self.log(f"Job #{job['id']} failed preparation: {e}")
+            self.jobs.update(job, status='failed', error=str(e))
+            self.refresh_job_list()
+            return
+        for warning in prepared['warnings']:
+            self.log(warning)
+        self.file_var.set(prepared['path'])
+        self.current_job = job
+        self.jobs.update(job, status='running', error=None)
+        self.log(f"Starting job #{job['id']}: {describe(prepared['metadata'])}")
+        self.start_sending(prepared['program'], prepared['metadata'])
+        if not self.running:
+            self.finish_job(False)
+            return
+        # Translate the following job while this one streams
+        following = self.jobs.next()
+        if following is not None:
+            self.scheduler.prepare(following, self.get_translate_options())
+        self.refresh_job_list()
+
+    def finish_job(self, completed):
+        job, self.current_job = self.current_job, None
+        if job is None:
+            return
+        if completed:
+            self.jobs.update(job, status='done')
+        elif self.queue_running:
+            # An unattended run stops at the first job that did not finish
+            self.jobs.update(job, status='failed', error="transmission did not complete")
+            self.toggle_job_queue()
+        else:
+            self.jobs.update(job, status='stopped')
+        self.log(f"Job #{job['id']} {job['status']}")
+        self.refresh_job_list()
+
+    def show_job_stats(self, file_path):
+        # Runs off the Tk thread; indexing a new file reads it once
+        try:
+            self.log(f"Job stats: {describe(index_file(file_path))}")
+        except (OSError, ValueError) as e:
+            self.log(f"Error reading file stats: {e}")
+
+    def toggle_timing(self):
+        # Takes effect at once; the totals restart with the next job
+        stats.enabled = self.timing_var.get()
 
     def log(self, message):
         self.queue.put(message)
 
     def check_queue(self):
-        while not self.queue.empty():
-            message = self.queue.get()
-            self.output_text.config(state="normal")
-            self.output_text.insert(tk.END, message + "\n")
-            self.output_text.see(tk.END)
-            self.output_text.config(state="disabled")
+        with stats.span('log'):
+            while not self.queue.empty():
+                message = self.queue.get()
+                self.output_text.config(state="normal")
+                self.output_text.insert(tk.END, message + "\n")
+                self.output_text.see(tk.END)
+                self.output_text.config(state="disabled")
+        moved = False
+        while not self.jog_queue.empty():
+            state = advance_robot_state(lex(self.jog_queue.get()), self.theta, self.z, self.r)
+            if state is not None:
+                self.theta, self.z, self.r = state
+                moved = True
+        while not self.pose_queue.empty():
+            self.theta, self.z, self.r = self.pose_queue.get()
+            moved = True
+        if moved:
+            with stats.span('redraw'):
+                self.update_robot_visual()
+        loader = self.visual_loader
+        if loader is not None and loader.ready.is_set():
+            self.visual_loader = None
+            self.build_3d_view(loader)
+        self.check_preview_queue()
+        while not self.connect_queue.empty():
+            self.finish_connect(self.connect_queue.get())
+        while not self.job_events.empty():
+            self.finish_job(self.job_events.get())
+        if self.queue_running and not self.running:
+            self.start_next_job()
         self.root.after(100, self.check_queue)
 
     def connect_serial(self):
@@ -487,52 +1049,69 @@ class GCodeSenderApp:
             self.log("Already connected.")
             return
 
+        if self.connecting:
+            self.log("Already connecting.")
+            return
+
+        # The handshake and the baud probe can take many seconds, so the link
+        # is set up by connect_thread and handed back through connect_queue
+        self.connecting = True
+        self.connect_button.config(state="disabled")
+        options = dict(resync=self.resync_var.get(), auto_baud=self.auto_baud_var.get(), pipeline_depth=self.machine['pipeline_depth'], resend_window=self.machine['resend_window'])
+        threading.Thread(target=self.connect_thread, args=(self.port_var.get(), baud_rate, self.protocol_var.get(), options), daemon=True).start()
+
+    def connect_thread(self, port, baud_rate, protocol, options):
+        link = None
         try:
-            self.serial = serial.Serial(self.port_var.get(), baud_rate, timeout=1)
-            self.log(f"Connected to {self.port_var.get()} at {baud_rate} baud")
-            time.sleep(2)
-            self.serial.flush()
-
-            start_time = time.time()
-            while time.time() - start_time < 5:
-                if self.serial.in_waiting > 0:
-                    raw_data = self.serial.readline()
-                    try:
-                        response = raw_data.decode('utf-8').strip()
-                        self.log(f"Arduino: {response}")
-                        if 'ready>' in response:
-                            break
-                    except UnicodeDecodeError:
-                        self.log(f"Initial noise: {raw_data.hex()}")
-                time.sleep(0.05)
+            link, warm = open_link(port, baud_rate, self.log, **options)
+            if warm:
+                self.log(f"Reusing open connection to {port} at {link.port.baudrate} baud")
             else:
-                self.log("No prompt received within 5 seconds")
-
-            self.connect_button.config(state="disabled")
-            self.start_button.config(state="normal")
-            self.stop_button.config(state="normal")
-            self.command_entry.config(state="normal")
-            self.send_button.config(state="normal")
-            self.theta_plus_button.config(state="normal")
-            self.theta_minus_button.config(state="normal")
-            self.z_plus_button.config(state="normal")
-            self.z_minus_button.config(state="normal")
-            self.r_plus_button.config(state="normal")
-            self.r_minus_button.config(state="normal")
-            self.home_button.config(state="normal")
-            self.log("Ready for commands, jogging, or file sending")
-        except serial.SerialException as e:
+                self.log(f"Connected to {port} at {baud_rate} baud")
+                link.handshake()
+                if options['auto_baud']:
+                    link.probe()
+            link.negotiate_realtime()
+            if protocol == "Binary":
+                link.negotiate_binary()
+            elif protocol == "Checksummed":
+                link.enable_line_numbers()
+        except Exception as e:
             self.log(f"Error opening serial port: {e}")
-            if self.serial and self.serial.is_open:
-                self.serial.close()
-                self.serial = None
+            if link is not None and link.is_open:
+                link.close()
+            link = None
+        self.connect_queue.put(link)
+
+    def finish_connect(self, link):
+        self.connecting = False
+        if link is None:
+            self.connect_button.config(state="normal")
+            return
+        self.serial = link
+        self.baud_var.set(str(link.port.baudrate))
+        self.start_button.config(state="normal")
+        self.stop_button.config(state="normal")
+        self.command_entry.config(state="normal")
+        self.send_button.config(state="normal")
+        self.theta_plus_button.config(state="normal")
+        self.theta_minus_button.config(state="normal")
+        self.z_plus_button.config(state="normal")
+        self.z_minus_button.config(state="normal")
+        self.r_plus_button.config(state="normal")
+        self.r_minus_button.config(state="normal")
+        self.home_button.config(state="normal")
+        if self.live_var.get():
+            self.start_live_position()
+        self.log("Ready for commands, jogging, or file sending")
 
     def disconnect_serial(self):
         self.running = False
         self.paused = False
+        self.stop_live_position()
         if self.serial and self.serial.is_open:
-            self.serial.close()
-            self.log("Serial connection closed")
+            release_link(self.serial)
+            self.log("Serial connection released")
             self.serial = None
             self.connect_button.config(state="normal")
             self.start_button.config(state="disabled")
@@ -547,7 +1126,9 @@ class GCodeSenderApp:
             self.r_minus_button.config(state="disabled")
             self.home_button.config(state="disabled")
 
-    def start_sending(self):
+    def start_sending(self, program=None, metadata=None):
+        # program and metadata are the file already compiled and indexed by
+        # the job scheduler, if any
         if not self.serial or not self.serial.is_open:
             self.log("Not connected. Please connect first.")
             return
@@ -555,16 +1136,7 @@ class GCodeSenderApp:
             messagebox.showerror("Error", "Please select a G-code file.")
             return
 
-        try:
-            with open(self.file_var.get(), 'r') as f:
-                self.total_lines = sum(1 for line in f if line.split(';', 1)[0].strip())
-            self.progress["maximum"] = self.total_lines
-            self.progress["value"] = 0
-            self.log(f"File loaded: {self.total_lines} lines")
-        except Exception as e:
-            self.log(f"Error counting lines: {e}")
-            return
-
+        self.progress["value"] = 0
         self.start_button.config(state="disabled")
         self.pause_button.config(state="normal")
         self.theta_plus_button.config(state="disabled")
@@ -578,6 +1150,17 @@ class GCodeSenderApp:
         self.paused = False
         self.log(f"Starting G-code transmission from {self.file_var.get()}")
         
+        from path_recorder import PathRecorder
+        try:
+            self.recorder = PathRecorder(self.file_var.get())
+            self.log(f"Recording executed path to {self.recorder.path}")
+        except OSError as e:
+            self.recorder = None
+            self.log(f"Error creating recording: {e}")
+        self.program = program
+        self.metadata = metadata
+        self.capture = Capture(self.capture_var.get(), self.log) if self.capture_var.get() != CAPTURES[0] else None
+        self.stream_pose = (self.theta, self.z, self.r)  # Preview state the send thread advances
         threading.Thread(target=self.send_gcode_thread, daemon=True).start()
 
     def stop_sending(self):
@@ -599,44 +1182,99 @@ class GCodeSenderApp:
         self.r_minus_button.config(state="disabled")
         self.home_button.config(state="disabled")
         self.log("Stopped by user.")
+        if self.queue_running:
+            self.toggle_job_queue()
+        self.stop_live_position()
         if self.serial and self.serial.is_open:
+            try:
+                self.serial.feed_hold()
+                self.serial.soft_reset()
+            except serial.SerialException as e:
+                self.log(f"Error stopping controller: {e}")
             self.serial.close()
             self.serial = None
             self.log("Serial connection closed")
 
     def toggle_pause(self):
         self.paused = not self.paused
+        if self.serial and self.serial.is_open:
+            try:
+                if self.paused:
+                    if not self.serial.feed_hold():
+                        self.log("No feed hold on this controller, pausing after the commands already sent")
+                else:
+                    self.serial.resume()
+            except serial.SerialException as e:
+                self.log(f"Error sending {'feed hold' if self.paused else 'resume'}: {e}")
         self.pause_button.config(text="Resume" if self.paused else "Pause")
         self.log("Paused" if self.paused else "Resumed")
 
     def send_gcode_thread(self):
+        completed = False
+        program, self.program = self.program, None
+        metadata, self.metadata = self.metadata, None
+        capture, self.capture = self.capture, None
+        # A queued job keeps the spans recorded while it was prepared
+        stats.begin(self.current_job['id'] if self.current_job else None)
+        if capture is not None:
+            capture.start()
+        line_number = 0
         try:
-            with open(self.file_var.get(), 'r') as f:
-                for line_number, line in enumerate(f, 1):
-                    if not self.running:
-                        self.log("Transmission stopped")
-                        break
-                    while self.paused and self.running:
-                        time.sleep(0.1)
+            if metadata is None:
+                # Indexing reads the whole file when it has no current sidecar,
+                # so it happens here rather than on the Tk thread
+                metadata = index_file(self.file_var.get())
+            # The send loop advances the bar by file line, comments included
+            self.total_lines = metadata['lines']
+            self.progress["maximum"] = self.total_lines
+            self.log(f"File loaded: {describe(metadata)}")
+            if program is None:
+                program = compile_file(self.file_var.get())
+            stream = self.serial.send_program(program, lambda: self.paused)
+            acknowledged = 0
+            if len(program):
+                self.track_command(program, 0)
+            try:
+                for index in stream:
                     if not self.running:
                         self.log("Transmission stopped")
                         break
-                    try:
-                        self.send_gcode_line(line, line_number)
-                        self.progress["value"] = line_number
-                        self.root.update_idletasks()
-                    except serial.SerialTimeoutException:
-                        self.log(f"Timeout on line {line_number}: {line.strip()}")
-                        break
-                    except Exception as e:
-                        self.log(f"Error on line {line_number}: {e}")
-                        break
-            self.log("G-code transmission complete")
+                    if index is None:
+                        continue
+                    acknowledged += 1
+                    line_number = program.line_numbers[index]
+                    self.progress["value"] = line_number
+                    if index + 1 < len(program):
+                        self.track_command(program, index + 1)
+                else:
+                    completed = acknowledged == len(program)
+                    if not completed:
+                        self.log(f"No prompt received for line {program.line_numbers[acknowledged]} - check Arduino")
+            finally:
+                stream.close()
+            if completed:
+                self.log("G-code transmission complete")
         except FileNotFoundError:
             self.log(f"Error: G-code file '{self.file_var.get()}' not found")
+        except serial.SerialException as e:
+            self.log(f"Serial error after line {line_number}: {e}")
         except Exception as e:
             self.log(f"Error reading file: {e}")
 
+        if capture is not None:
+            try:
+                self.log(f"Profile saved to {capture.stop(self.file_var.get())}")
+            except OSError as e:
+                self.log(f"Error saving profile: {e}")
+        if stats.enabled:
+            for line in stats.summary():
+                self.log(line)
+
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+            self.log(f"Recording saved to {recorder.path}")
+        self.job_events.put(completed)
         self.start_button.config(state="normal")
         self.stop_button.config(state="normal")
         self.pause_button.config(state="disabled")
@@ -653,83 +1291,35 @@ class GCodeSenderApp:
             self.r_minus_button.config(state="normal")
             self.home_button.config(state="normal")
 
-    def send_gcode_line(self, line, line_number):
-        line = line.split(';', 1)[0].strip()
-        if not line:
-            return
-
-        try:
-            parts = line.upper().split()
-            if parts[0] == 'G28':
-                self.theta = 0.0
-                self.z = 0.0
-                self.r = 0.0
-            elif parts[0] in ('G00', 'G01'):
-                x, y, z = None, None, None
-                for part in parts[1:]:
-                    if part.startswith('X'):
-                        x = float(part[1:])
-                    elif part.startswith('Y'):
-                        y = float(part[1:])
-                    elif part.startswith('Z'):
-                        z = float(part[1:])
-                if x is not None and y is not None:
-                    self.r = (x**2 + y**2)**0.5
-                    self.theta = np.degrees(np.arctan2(y, x))
-                if z is not None:
-                    self.z = max(0, z)
-            elif parts[0].startswith('J'):
-                axis = parts[0][1]
-                distance = None
-                for part in parts[1:]:
-                    if part.startswith('D'):
-                        distance = float(part[1:])
-                if distance is not None:
-                    if axis == '1':
-                        self.theta += distance
-                    elif axis == '2':
-                        self.z = max(0, self.z + distance)
-                    elif axis == '3':
-                        self.r = max(0, self.r + distance)
-            self.update_robot_visual()
-        except Exception as e:
-            self.log(f"Error parsing line {line_number} for visualization: {e}")
-
-        try:
-            self.log(f"Sending line {line_number}: {line}")
-            self.serial.write((line + '\n').encode('utf-8'))
-            self.serial.flush()
-            start_time = time.time()
-            prompt_seen = False
-            while time.time() - start_time < 60:
-                if self.serial.in_waiting > 0:
-                    raw_data = self.serial.readline()
-                    try:
-                        response = raw_data.decode('utf-8').strip()
-                        self.log(f"Received: {response}")
-                        if 'ready>' in response:
-                            prompt_seen = True
-                            break
-                    except UnicodeDecodeError:
-                        self.log(f"Decode error: {raw_data.hex()}")
-                time.sleep(0.01)
-            if not prompt_seen:
-                self.log(f"No prompt received for line {line_number} - check Arduino")
-        except serial.SerialException as e:
-            self.log(f"Error sending line {line_number}: {e}")
-            raise
+    def track_command(self, program, index):
+        # Called as the controller starts on command index (the one before it
+        # was just acknowledged): the preview follows it and the recording
+        # takes it as the target being executed. The move was reduced to
+        # numbers when the program was compiled, so nothing is parsed here.
+        with stats.span('track'):
+            state = advance_robot_pose(*program.move(index), *self.stream_pose)
+            if state is not None:
+                self.stream_pose = state
+                self.pose_queue.put(state)
+                if self.recorder is not None:
+                    theta, z, r = state
+                    angle = math.radians(theta)
+                    self.recorder.commanded(program.line_numbers[index], r * math.cos(angle), r * math.sin(angle), z)
 
     def on_closing(self):
         self.running = False
         self.paused = False
+        self.stop_live_position()
         if self.serial and self.serial.is_open:
             self.serial.close()
             self.log("Serial connection closed")
+        close_pool()
+        self.scheduler.shutdown()
         self.save_settings()
-        plt.close(self.fig)
         self.root.destroy()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = GCodeSenderApp(root)
     root.mainloop()
\ No newline at end of file
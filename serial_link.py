@@ -0,0 +1,702 @@
+import threading
+import time
+from collections import deque
+import serial
+
+from ack_timeout import AckTimeoutModel, parse_position_report
+from binary_protocol import ACK, NAK, BIN_REPLY, NEGOTIATE_COMMAND, BinaryEncoder
+from controller_sim import SIM_PORT, FEED_HOLD, RESUME, STATUS_QUERY, SOFT_RESET, SimulatedController
+from line_protocol import RESEND_WINDOW, RESET_COMMAND, LineNumberer, checksum, parse_resend
+from profiling import stats
+
+# Wire formats offered by the GUIs
+PROTOCOLS = ("ASCII", "Checksummed", "Binary")
+
+# Console spellings of the real-time commands
+REALTIME_COMMANDS = {'!': FEED_HOLD, '~': RESUME, '?': STATUS_QUERY, '^X': SOFT_RESET}
+# Firmware that acts on the real-time bytes lists this capability in its
+# M115 report. Other firmware would read them as the start of the next line.
+CAPABILITY_COMMAND = "M115"
+REALTIME_CAPABILITY = "Cap:REALTIME:1"
+
+# Candidate rates for the link probe, slowest first
+BAUD_RATES = (115200, 230400, 250000, 500000, 1000000)
+# Firmware answers "BAUD:<rate>" and switches; if no valid ping arrives at the
+# new rate within a second it falls back to the previous one on its own
+BAUD_COMMAND = "M991 B{}"
+# Firmware echoes the text back before its prompt
+PING_COMMAND = "M118 P{}"
+# Unacknowledged lines a pasted batch may have in the controller's buffer
+PIPELINE_DEPTH = 4
+# Rolling error rate at which a running link steps down one rate
+BACKOFF_ERROR_RATE = 0.02
+
+
+# Rolling success/failure record of the last exchanges on the link
+class LinkMonitor:
+    def __init__(self, window=200):
+        self.results = deque(maxlen=window)
+
+    def record(self, ok):
+        self.results.append(ok)
+
+    def reset(self):
+        self.results.clear()
+
+    @property
+    def error_rate(self):
+        if not self.results:
+            return 0.0
+        return 1.0 - sum(self.results) / len(self.results)
+
+
+# Seconds a released link stays open in the pool before its port is freed
+POOL_IDLE = 30.0
+
+# Links released on disconnect, keyed by port name, and every port opened
+# during this session (the controller behind those is already booted)
+_pool = {}
+_booted = set()
+_pool_lock = threading.Lock()
+
+
+def open_link(port, baud_rate, log, **options):
+    # Returns (link, warm). A warm link comes from the pool, is already past
+    # its handshake and keeps the rate it was running at; a cold one still
+    # needs handshake(). Ports opened before in this session are reopened
+    # without pulsing DTR so the controller keeps its state.
+    with _pool_lock:
+        pooled = _pool.pop(port, None)
+    if pooled is not None:
+        link, timer = pooled
+        timer.cancel()
+        link.log = log
+        link.configure(**options)
+        if link.is_open and link.handshake(timeout=1.0, quiet=0.0):
+            return link, True
+        link.close()
+    link = SerialLink(port, baud_rate, log, reset=port not in _booted, **options)
+    _booted.add(port)
+    return link, False
+
+
+def release_link(link, idle=POOL_IDLE):
+    # Parks an open link for the next open_link() on the same port
+    name = link.port.port
+    timer = threading.Timer(idle, _expire, (name, link))
+    timer.daemon = True
+    with _pool_lock:
+        previous = _pool.pop(name, None)
+        _pool[name] = (link, timer)
+    if previous is not None and previous[0] is not link:
+        previous[1].cancel()
+        previous[0].close()
+    timer.start()
+
+
+def _expire(name, link):
+    with _pool_lock:
+        if _pool.get(name, (None,))[0] is not link:
+            return
+        del _pool[name]
+    link.close()
+
+
+def close_pool():
+    with _pool_lock:
+        pooled = list(_pool.values())
+        _pool.clear()
+    for link, timer in pooled:
+        timer.cancel()
+        link.close()
+
+
+# Owns the serial port and the command/ready> exchange shared by the GUIs.
+# Exposes is_open and close() like serial.Serial so callers can keep their
+# "self.serial and self.serial.is_open" checks.
+class SerialLink:
+    def __init__(self, port, baud_rate, log, reset=True, **options):
+        # With reset=False DTR stays low while opening, so boards that reset on
+        # DTR (Arduino Uno/Mega) keep running. Some drivers still pulse it on
+        # open; the handshake copes with either.
+        if port == SIM_PORT:
+            self.port = SimulatedController(baud_rate)
+        else:
+            self.port = serial.Serial(None, baud_rate, timeout=1)
+            self.port.port = port
+        if not reset:
+            self.port.dtr = False
+        self.port.open()
+        self.reset = reset
+        self.log = log
+        self.monitor = LinkMonitor()
+        self.timeouts = AckTimeoutModel()
+        # Real-time bytes go out between, never inside, lines and frames
+        self.write_lock = threading.Lock()
+        # Held by whoever is waiting for replies; a status query made while the
+        # sender holds it is answered through that reader instead
+        self.busy = threading.Lock()
+        self.held = False
+        self.holds = 0
+        self.status = None  # Last "<State|X:.. Y:.. Z:..>" report
+        # Called with each position report read from the port; reports go
+        # there instead of the log while it is set
+        self.position_listener = None
+        self.configure(**options)
+
+    def configure(self, fallback_timeout=60.0, resync=True, auto_baud=False, pipeline_depth=PIPELINE_DEPTH, resend_window=RESEND_WINDOW):
+        self.timeouts.fallback = fallback_timeout
+        self.pipeline_depth = pipeline_depth  # Default depth of send_batch; safe to change while open
+        self.resend_window = resend_window  # Used when line numbers are next enabled
+        self.resync_enabled = resync  # Query M114 on a missed ack instead of giving up
+        self.auto_baud = auto_baud  # Step the rate down when the error rate climbs
+        self.encoder = None  # Set once the firmware accepts binary frames
+        self.realtime_enabled = False  # Set once the firmware reports the real-time bytes
+        self.numbering = None  # Set when ASCII lines go out as N<n> ... *<checksum>
+
+    @property
+    def is_open(self):
+        return self.port.is_open
+
+    @property
+    def binary(self):
+        return self.encoder is not None
+
+    def close(self):
+        self.port.close()
+
+    def write(self, data, flush=True):
+        with self.write_lock:
+            self.port.write(data)
+            if flush:
+                self.port.flush()
+
+    def flush(self):
+        with self.write_lock:
+            self.port.flush()
+
+    def realtime(self, command):
+        # Goes straight to the port ahead of anything the sender is waiting on.
+        # Returns False without sending when the firmware lacks the channel.
+        if not self.realtime_enabled:
+            return False
+        if command == FEED_HOLD:
+            self.held = True
+            self.holds += 1
+        elif command == RESUME:
+            self.held = False
+        elif command == SOFT_RESET:
+            self.held = False
+            self.timeouts.position = None
+            if self.numbering:
+                self.numbering.reset()
+            if self.encoder:
+                self.encoder.position = {'X': None, 'Y': None, 'Z': None}
+        self.write(command)
+        return True
+
+    def feed_hold(self):
+        return self.realtime(FEED_HOLD)
+
+    def resume(self):
+        return self.realtime(RESUME)
+
+    def soft_reset(self):
+        return self.realtime(SOFT_RESET)
+
+    def query_status(self, timeout=0.5):
+        # Returns the status report, or None if the sender thread is reading
+        # (it logs the report and stores it in self.status when it arrives)
+        # or the firmware has no status byte
+        if not self.realtime(STATUS_QUERY) or not self.busy.acquire(blocking=False):
+            return None
+        try:
+            start_time = time.time()
+            while time.time() - start_time < timeout:
+                reply = self.read_reply()
+                if reply is None:
+                    time.sleep(0.005)
+                elif reply[0] == 'status':
+                    return reply[1]
+            return None
+        finally:
+            self.busy.release()
+
+    def idle(self, start_time):
+        # Sleeps one poll interval. Time spent in a feed hold does not count
+        # against ack timeouts, so returns start_time pushed back by the hold.
+        before = time.time()
+        time.sleep(0.01)
+        return start_time + (time.time() - before) if self.held else start_time
+
+    def handshake(self, timeout=5.0, quiet=None):
+        # Returns as soon as the controller prompts. A board that just reset
+        # prints its banner and prompt once the bootloader hands over; one that
+        # did not reset stays silent, so after quiet seconds without output it
+        # is sent M114, which an idle controller answers with a prompt.
+        if quiet is None:
+            quiet = 2.5 if self.reset else 0.1
+        if quiet == 0:
+            self.port.reset_input_buffer()
+        start_time = last_output = time.time()
+        poked = False
+        while time.time() - start_time < timeout:
+            if self.port.in_waiting > 0:
+                raw_data = self.port.readline()
+                last_output = time.time()
+                try:
+                    response = raw_data.decode('utf-8').strip()
+                    self.log(f"Arduino: {response}")
+                    position = parse_position_report(response)
+                    if position is not None:
+                        self.timeouts.resync(position)
+                    if 'ready>' in response:
+                        return True
+                except UnicodeDecodeError:
+                    self.log(f"Initial noise: {raw_data.hex()}")
+                continue
+            if not poked and time.time() - last_output >= quiet:
+                self.write(b'M114\n')
+                poked = True
+            time.sleep(0.005)
+        self.log(f"No prompt received within {timeout:g} seconds")
+        return False
+
+    def negotiate_realtime(self):
+        self.write((CAPABILITY_COMMAND + '\n').encode('utf-8'))
+        accepted = False
+        start_time = time.time()
+        while time.time() - start_time < 2:
+            if self.port.in_waiting > 0:
+                raw_data = self.port.readline()
+                response = raw_data.decode('utf-8', errors='replace').strip()
+                if REALTIME_CAPABILITY in response:
+                    accepted = True
+                if 'ready>' in response:
+                    break
+            time.sleep(0.01)
+        self.realtime_enabled = accepted
+        if accepted:
+            self.log("Real-time commands enabled")
+        else:
+            self.log("Controller does not support real-time commands; pause and stop take effect between lines")
+        return accepted
+
+    def negotiate_binary(self):
+        # Firmware without frame support answers the request with a plain prompt
+        self.write((NEGOTIATE_COMMAND + '\n').encode('utf-8'))
+        accepted = False
+        start_time = time.time()
+        while time.time() - start_time < 2:
+            if self.port.in_waiting > 0:
+                raw_data = self.port.readline()
+                response = raw_data.decode('utf-8', errors='replace').strip()
+                if BIN_REPLY in response:
+                    accepted = True
+                if 'ready>' in response:
+                    break
+            time.sleep(0.01)
+        if accepted:
+            self.encoder = BinaryEncoder()
+            self.log("Binary protocol enabled")
+        else:
+            self.log("Controller does not support binary protocol, using ASCII")
+        return accepted
+
+    def enable_line_numbers(self):
+        self.write((RESET_COMMAND + '\n').encode('utf-8'))
+        if not self.wait_for_prompt(2):
+            self.log("Controller did not accept M110, sending plain lines")
+            return False
+        # Firmware that ignores line numbers prompts after anything, so support
+        # is confirmed by a refusal: only a controller that checks them answers
+        # a bad checksum with "Resend: 1". The valid line then numbers from 1.
+        text = f"N1 {RESET_COMMAND}"
+        self.write(f"{text}*{(checksum(text) + 1) % 256}\n".encode('utf-8'))
+        if self.wait_for_resend(2) != 1:
+            self.log("Controller does not check line numbers, sending plain lines")
+            return False
+        self.write(f"{text}*{checksum(text)}\n".encode('utf-8'))
+        if not self.wait_for_prompt(2):
+            self.log("Controller did not accept a numbered line, sending plain lines")
+            return False
+        self.numbering = LineNumberer(self.resend_window)
+        self.log("Line numbers and checksums enabled")
+        return True
+
+    def probe(self, candidates=BAUD_RATES, pings=20):
+        # Measures latency and error rate at the current rate and at each faster
+        # candidate, stops at the first one that drops or garbles a ping and
+        # settles on the fastest clean rate. Returns the chosen baud rate.
+        best = self.port.baudrate
+        latency, error_rate = self.measure(pings)
+        self.log(f"Link probe {best} baud: {latency * 1000:.1f} ms round trip, {error_rate:.0%} errors")
+        if error_rate > 0:
+            return best
+        best_latency = latency
+        for baud in sorted(rate for rate in candidates if rate > best):
+            if not self.switch_baud(baud):
+                break
+            latency, error_rate = self.measure(pings)
+            self.log(f"Link probe {baud} baud: {latency * 1000:.1f} ms round trip, {error_rate:.0%} errors")
+            if error_rate > 0:
+                if not self.restore_baud(best):
+                    raise serial.SerialException(f"Lost the controller switching back to {best} baud")
+                break
+            best, best_latency = baud, latency
+        self.timeouts.latency = best_latency
+        self.monitor.reset()
+        self.log(f"Using {best} baud")
+        return best
+
+    def restore_baud(self, baud, attempts=3):
+        # Returns True once the link runs at baud again
+        for _ in range(attempts):
+            if self.switch_baud(baud):
+                return True
+        # The controller may have switched with its confirmation lost
+        self.port.baudrate = baud
+        self.port.reset_input_buffer()
+        return self.measure(1)[1] == 0
+
+    def switch_baud(self, baud):
+        previous = self.port.baudrate
+        self.write((BAUD_COMMAND.format(baud) + '\n').encode('utf-8'))
+        confirmed = False
+        start_time = time.time()
+        while time.time() - start_time < 1:
+            reply = self.read_reply()
+            if reply is None:
+                time.sleep(0.01)
+            elif reply[0] == 'line' and f"BAUD:{baud}" in reply[1]:
+                confirmed = True
+                break
+        if not confirmed:
+            return False
+        self.port.baudrate = baud
+        self.port.reset_input_buffer()
+        if self.measure(1)[1] == 0:
+            return True
+        # The firmware falls back by itself when no ping arrives at the new rate
+        self.port.baudrate = previous
+        time.sleep(1.2)
+        self.port.reset_input_buffer()
+        return False
+
+    def measure(self, pings):
+        # Returns (mean round trip seconds, fraction of pings lost or garbled)
+        round_trips = []
+        for n in range(pings):
+            token = f"P{n}"
+            start_time = time.time()
+            self.write((PING_COMMAND.format(n) + '\n').encode('utf-8'))
+            echoed = False
+            while time.time() - start_time < 0.5:
+                reply = self.read_reply()
+                if reply is None:
+                    time.sleep(0.001)
+                elif reply[0] == 'line':
+                    echoed = echoed or token in reply[1].split()
+                    if 'ready>' in reply[1]:
+                        break
+            else:
+                echoed = False
+            if echoed:
+                round_trips.append(time.time() - start_time)
+        error_rate = 1.0 - len(round_trips) / max(pings, 1)
+        latency = sum(round_trips) / len(round_trips) if round_trips else 0.0
+        return latency, error_rate
+
+    def step_down(self):
+        slower = [rate for rate in BAUD_RATES if rate < self.port.baudrate]
+        if not slower:
+            return False
+        self.log(f"Link error rate {self.monitor.error_rate:.1%}, dropping to {slower[-1]} baud")
+        self.monitor.reset()
+        return self.switch_baud(slower[-1])
+
+    def send_command(self, command, timeout=None):
+        with self.busy:
+            return self.exchange(command, timeout)
+
+    def send_batch(self, commands, depth=None):
+        # Streams ASCII lines with up to depth (pipeline_depth by default) of
+        # them awaiting their prompt. Binary frames are sent one by one.
+        # Returns how many were acknowledged.
+        depth = depth or self.pipeline_depth
+        with self.busy:
+            # Ack timeouts come from the motion times compiled into the
+            # program; the live model takes its end state once every line is
+            # acknowledged and does not know where the robot is before then
+            self.timeouts.position = None
+            if self.encoder:
+                for acknowledged, command in enumerate(commands):
+                    if not self.exchange(command):
+                        return acknowledged
+                return len(commands)
+            pending = deque()
+            acknowledged = 0
+            for command in commands:
+                if len(pending) >= depth:
+                    if not self.wait_for_prompt(pending.popleft()):
+                        return acknowledged
+                    acknowledged += 1
+                pending.append(self.timeouts.expect(command)[0])
+                self.write(self.format_line(command))
+            while pending:
+                if not self.wait_for_prompt(pending.popleft()):
+                    return acknowledged
+                acknowledged += 1
+            return acknowledged
+
+    def send_program(self, program, hold=None, depth=None):
+        # Streams a gcode_program.Program with up to depth (pipeline_depth by
+        # default) lines awaiting their prompt. Each refill of the window is
+        # one write of a slice of the program's buffer, and the port is only
+        # flushed before waiting on a prompt. Numbered links encode the lines
+        # of a refill as they go; binary links exchange one command at a time.
+        # Prompts already waiting are read before refilling, so a busy host
+        # coalesces several freed slots into one write.
+        # Yields the index of each acknowledged command, or None about every
+        # 0.1 s while hold() keeps new lines back, and ends early on a missed
+        # ack that resync cannot recover. Closing it waits for the lines
+        # already sent, so the next reader does not take their prompts.
+        depth = depth or self.pipeline_depth
+        with self.busy:
+            # Ack timeouts come from the motion times compiled into the
+            # program; the live model takes its end state once every line is
+            # acknowledged and does not know where the robot is before then
+            self.timeouts.position = None
+            if self.encoder:
+                for index in range(len(program)):
+                    while hold is not None and hold():
+                        time.sleep(0.1)
+                        yield None
+                    with stats.span('controller'):
+                        acked = self.exchange(program.command(index), *self.timeouts.plan(program.predicted[index]))
+                    if not acked:
+                        return
+                    yield index
+                self.timeouts.position, self.timeouts.feed = program.end_position, program.end_feed or self.timeouts.feed
+                return
+            pending = deque()  # (index, timeout, predicted, sent at)
+            sent = 0
+            unflushed = False
+            last_ack = time.time()
+            try:
+                while sent < len(program) or pending:
+                    held = hold is not None and hold()
+                    if not held and sent < len(program) and len(pending) < depth and (not pending or self.port.in_waiting <= 0):
+                        last = min(sent + depth - len(pending), len(program))
+                        now = time.time()
+                        with stats.span('encode'):
+                            for index in range(sent, last):
+                                pending.append((index,) + self.timeouts.plan(program.predicted[index]) + (now,))
+                            data = b''.join(self.numbering.encode(program.command(index)) for index in range(sent, last)) if self.numbering else program.span(sent, last)
+                        with stats.span('write'):
+                            self.write(data, flush=False)
+                        sent = last
+                        unflushed = True
+                    if not pending:
+                        self.check_link()
+                        time.sleep(0.1)
+                        yield None
+                        continue
+                    if unflushed:
+                        with stats.span('flush'):
+                            self.flush()
+                        unflushed = False
+                    index, timeout, predicted, sent_at = pending[0]
+                    holds = self.holds
+                    with stats.span('controller'):
+                        acked = self.wait_for_prompt(timeout)
+                    self.monitor.record(acked)
+                    if acked:
+                        pending.popleft()
+                        now = time.time()
+                        if self.holds == holds:
+                            self.timeouts.observe(predicted, now - max(sent_at, last_ack))
+                        last_ack = now
+                        yield index
+                        continue
+                    # Either way the pending lines are settled: done if resync
+                    # succeeds, and in an unknown state if it does not
+                    done = [item[0] for item in pending]
+                    resync_timeout = sum(item[1] for item in pending)
+                    pending.clear()
+                    if not self.resync_enabled:
+                        return
+                    self.log(f"No acknowledgement within {timeout:.1f} s, querying position")
+                    # M114 queues behind every pending line, so its reply means all of them are done
+                    if not self.resync(resync_timeout):
+                        return
+                    yield from done
+                self.timeouts.position, self.timeouts.feed = program.end_position, program.end_feed or self.timeouts.feed
+            finally:
+                for index, timeout, _, _ in pending:
+                    if not self.wait_for_prompt(timeout):
+                        break
+
+    def exchange(self, command, timeout=None, predicted=None):
+        # Returns True once the controller acknowledged the command. Without an
+        # explicit timeout the deadline comes from the ack timeout model; a
+        # caller passing one may pass the motion time it was predicted from.
+        holds = self.holds
+        if timeout is None:
+            timeout, predicted = self.timeouts.expect(command)
+        start_time = time.time()
+        frames = self.encoder.encode_line(command) if self.encoder else None
+        if frames is None:
+            self.write(self.format_line(command))
+            acked = self.wait_for_prompt(timeout)
+        else:
+            acked = all(self.send_frame(frame, timeout) for frame in frames)
+        self.monitor.record(acked)
+        if acked:
+            if self.holds == holds:
+                self.timeouts.observe(predicted, time.time() - start_time)
+            self.check_link()
+            return True
+        if self.resync_enabled:
+            self.log(f"No acknowledgement within {timeout:.1f} s, querying position")
+            return self.resync(timeout)
+        return False
+
+    def format_line(self, command):
+        if self.numbering:
+            return self.numbering.encode(command)
+        return (command + '\n').encode('utf-8')
+
+    def stream(self, command):
+        # Writes an ASCII line without waiting for its prompt; the caller holds
+        # busy and collects prompts itself with wait_for_prompt
+        self.timeouts.expect(command)
+        if self.encoder:
+            self.encoder.position = {'X': None, 'Y': None, 'Z': None}
+        self.write(self.format_line(command))
+
+    def check_link(self):
+        if self.auto_baud and len(self.monitor.results) >= 50 and self.monitor.error_rate > BACKOFF_ERROR_RATE:
+            self.step_down()
+
+    def resync(self, timeout):
+        # The ack may have been lost or the move may just be slower than predicted.
+        # M114 queues behind it, so a position report followed by a prompt means
+        # the controller is idle again and the job can carry on.
+        self.write(b'M114\n')
+        position = None
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            reply = self.read_reply()
+            if reply is None:
+                start_time = self.idle(start_time)
+                continue
+            kind, value = reply
+            if kind != 'line':
+                continue
+            position = parse_position_report(value) or position
+            if 'ready>' in value and position is not None:
+                self.sync_position(position)
+                self.log("Controller responded to M114, resynchronised")
+                return True
+        self.log("Controller did not respond to M114")
+        return False
+
+    def sync_position(self, position):
+        # Adopts a position the controller reported as the modal position
+        self.timeouts.resync(position)
+        if self.encoder:
+            self.encoder.position = dict(position)
+
+    def send_frame(self, frame, timeout, retries=3):
+        seq = frame[2]
+        for _ in range(retries):
+            self.write(frame)
+            reply = self.wait_for_ack(seq, timeout)
+            if reply == ACK:
+                return True
+            if reply is None:
+                return False
+            self.monitor.record(False)
+            self.log(f"Frame {seq} rejected by controller, resending")
+        return False
+
+    def read_reply(self):
+        # One unit of controller output: ('ack', (code, seq)), ('line', text),
+        # ('status', report) or ('noise', raw bytes); None if nothing is waiting
+        if self.port.in_waiting <= 0:
+            return None
+        first = self.port.read(1)
+        if self.encoder and first and first[0] in (ACK, NAK):
+            ack_seq = self.port.read(1)
+            return 'ack', (first[0], ack_seq[0] if ack_seq else None)
+        raw_data = first + self.port.readline()
+        try:
+            response = raw_data.decode('utf-8').strip()
+        except UnicodeDecodeError:
+            self.log(f"Decode error: {raw_data.hex()}")
+            self.monitor.record(False)
+            return 'noise', raw_data
+        position = parse_position_report(response) if self.position_listener is not None else None
+        if position is not None:
+            self.position_listener(position)
+        else:
+            self.log(f"Received: {response}")
+        if response.startswith('<') and response.endswith('>'):
+            self.status = response
+            return 'status', response
+        return 'line', response
+
+    def wait_for_ack(self, seq, timeout):
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            reply = self.read_reply()
+            if reply is None:
+                start_time = self.idle(start_time)
+            elif reply[0] == 'ack' and reply[1][1] == seq:
+                return reply[1][0]
+        return None
+
+    def wait_for_prompt(self, timeout):
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            reply = self.read_reply()
+            if reply is None:
+                start_time = self.idle(start_time)
+            elif reply[0] == 'line':
+                if 'ready>' in reply[1]:
+                    return True
+                if self.numbering and not self.resend(reply[1]):
+                    return False
+        return False
+
+    def wait_for_resend(self, timeout):
+        # The line number of a resend request, or None after a prompt or timeout
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            reply = self.read_reply()
+            if reply is None:
+                start_time = self.idle(start_time)
+            elif reply[0] == 'line':
+                number = parse_resend(reply[1])
+                if number is not None:
+                    return number
+                if 'ready>' in reply[1]:
+                    return None
+        return None
+
+    def resend(self, text):
+        # Retransmits the lines a "Resend: N" reply asks for. Returns False only
+        # when the requested line is no longer in the resend window.
+        number = parse_resend(text)
+        if number is None:
+            return True
+        self.monitor.record(False)
+        lines = self.numbering.resend_from(number)
+        if lines is None:
+            self.log(f"Line {number} is outside the resend window")
+            return False
+        self.log(f"Resending from line {number}")
+        for line in lines:
+            self.write(line)
+        return True
@@ -0,0 +1,57 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+# Times GUI start-up in fresh interpreters, so nothing is cached in-process:
+#   import   launch until the GUI module is imported
+#   console  launch until the window has drawn and the serial console takes input
+#   visual   launch until the background loader has built the 3D view
+# Without a display only the import is timed.
+# Usage: python startup_benchmark.py [send_gcode|test] [runs]
+VISUAL_TIMEOUT = 60.0
+
+
+def measure(module_name, launched):
+    # Runs in the child interpreter; prints one JSON line of seconds since launch
+    import importlib
+    result = {}
+    gui = importlib.import_module(module_name)
+    result['import'] = time.time() - launched
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        print(json.dumps(result))
+        return
+    app = gui.GCodeSenderApp(root)
+    root.update()
+    result['console'] = time.time() - launched
+    deadline = time.time() + VISUAL_TIMEOUT
+    while app.visual_loader is not None and time.time() < deadline:
+        root.update()
+        time.sleep(0.005)
+    if app.visual_loader is None and app.fig is not None:
+        result['visual'] = time.time() - launched
+    root.destroy()
+    print(json.dumps(result))
+
+
+def run(module_name, runs):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, __file__, '--child', module_name, repr(time.time())], capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    print(f"{module_name}: {runs} runs")
+    for key in ('import', 'console', 'visual'):
+        values = [result[key] for result in results if key in result]
+        if values:
+            print(f"  {key:8} median {statistics.median(values) * 1000:7.0f} ms   max {max(values) * 1000:7.0f} ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        measure(sys.argv[2], float(sys.argv[3]))
+    else:
+        run(sys.argv[1] if len(sys.argv) > 1 else 'send_gcode', int(sys.argv[2]) if len(sys.argv) > 2 else 5)
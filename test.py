@@ -3,13 +3,25 @@ import serial.tools.list_ports
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import threading
+import multiprocessing
 import time
 import queue
 import json
+import math
 import os
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
-import numpy as np
+from command_console import DEFAULT_MACROS, CommandHistory, CommandWorker
+from digital_twin import DEFAULT_POLL_HZ, FRAME_MS, DigitalTwin, StatusPoller
+from gcode_lexer import lex, strip
+from gcode_metadata import describe, index_file
+from gcode_program import HOME, JOG1, JOG2, JOG3, JOINTS, LINEAR, NO_MOVE, compile_file, motion
+from job_queue import JobQueue, JobScheduler
+from jogging import HOLD_DELAY_MS, ContinuousJog
+from machine_store import DEFAULT_MACHINE, MACHINE_POLL_MS, MachineStore, save_json, translator_machine
+from profiling import CAPTURES, Capture, stats
+from serial_link import PROTOCOLS, REALTIME_COMMANDS, SIM_PORT, open_link, release_link, close_pool
+from translator_profiles import compile_profile, load_profiles, translated_path
+from translator import translate_file
+from visual_loader import ModuleLoader
 
 class GCodeSenderApp:
     def __init__(self, root):
@@ -22,21 +34,36 @@ class GCodeSenderApp:
         self.paused = False
         self.queue = queue.Queue()  # For log messages
         self.plot_queue = queue.Queue()  # For thread-safe plot updates
+        self.jog_queue = queue.Queue()  # Segments a continuous jog finished
+        self.jog = None
+        self.jog_button_down = False
+        self.jog_hold = None
         self.total_lines = 0
         self.translated_file = None
+        self.program = None  # Compiled file handed from start_sending to the send thread
+        self.metadata = None  # Its index, likewise
 
         # Initialize joint positions and current Cartesian state
         self.joints = {'theta1': 0.0, 'd2': 0.0, 'd3': 0.0}  # θ1 (deg), d2 (mm), d3 (mm)
         self.current_pos = {'X': 0.0, 'Y': 0.0, 'Z': 300.0}  # Start at base height
         self.positions = []  # Store end effector position history
-        # Robot dimensions
+        self.trajectory_lod = None  # Decimated pyramid of self.positions for drawing, made with the plot
+        self.view_bounds = None
+        # Robot dimensions, replaced by the selected profile's machine
         self.base_height = 0.0  # mm
         self.d2_max = 1000.0  # mm (vertical arm)
         self.d3_max = 1000.0  # mm (radial arm)
-        self.z_offset = self.base_height  # Map Cura Z=0 to robot Z=300 mm
 
         self.load_settings()
 
+        # Limits and tuning of this cell's machine, reloaded when machines.json changes
+        self.machines = MachineStore()
+        try:
+            self.machines.load()
+        except (OSError, ValueError) as e:
+            self.log(f"Error loading machine profiles: {e}")
+        self.machine = self.machines.get(self.settings.get("machine", DEFAULT_MACHINE))
+
         # Serial Port Selection
         tk.Label(root, text="Serial Port:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
         self.port_var = tk.StringVar(value=self.settings.get("port", ""))
@@ -47,9 +74,14 @@ class GCodeSenderApp:
         self.refresh_button = tk.Button(root, text="Refresh", command=self.refresh_ports)
         self.refresh_button.grid(row=0, column=2, padx=5, pady=5)
 
+        self.protocol_var = tk.StringVar(value=self.settings.get("protocol", "Binary" if self.settings.get("binary") else "ASCII"))
+        ttk.Combobox(root, textvariable=self.protocol_var, values=PROTOCOLS, state="readonly", width=12).grid(row=0, column=3, padx=5, pady=5, sticky="w")
+
         tk.Label(root, text="Baud Rate:").grid(row=1, column=0, padx=5, pady=5, sticky="e")
         self.baud_var = tk.StringVar(value=self.settings.get("baud", "115200"))
         tk.Entry(root, textvariable=self.baud_var, width=10).grid(row=1, column=1, padx=5, pady=5, sticky="w")
+        self.auto_baud_var = tk.BooleanVar(value=self.settings.get("auto_baud", False))
+        tk.Checkbutton(root, text="Auto baud", variable=self.auto_baud_var).grid(row=1, column=1, padx=5, pady=5, sticky="e")
 
         self.connect_button = tk.Button(root, text="Connect", command=self.connect_serial)
         self.connect_button.grid(row=1, column=2, padx=5, pady=5)
@@ -62,14 +94,27 @@ class GCodeSenderApp:
         self.cura_file_var = tk.StringVar()
         tk.Entry(root, textvariable=self.cura_file_var, width=40, state="readonly").grid(row=2, column=1, padx=5, pady=5, sticky="w")
         tk.Button(root, text="Browse Cura File", command=self.browse_cura_file).grid(row=2, column=2, padx=5, pady=5)
-        tk.Label(root, text="Note: Upload Cura G-code to translate.").grid(row=3, column=1, columnspan=2, padx=5, pady=2, sticky="w")
+        tk.Label(root, text="Note: Upload Cura G-code to translate.").grid(row=3, column=1, padx=5, pady=2, sticky="w")
+        self.user_profiles = self.settings.get("profiles", {})
+        self.profiles = load_profiles(self.user_profiles, self.log)
+        self.profile_var = tk.StringVar(value=self.settings.get("profile", "Cura auto-fit"))
+        if self.profile_var.get() not in self.profiles:
+            self.profile_var.set("Cura auto-fit")
+        self.profile_combo = ttk.Combobox(root, textvariable=self.profile_var, values=list(self.profiles), state="readonly", width=15)
+        self.profile_combo.grid(row=3, column=2, padx=5, pady=2)
+        self.joint_space_var = tk.BooleanVar(value=self.settings.get("joint_space", False))
+        tk.Checkbutton(root, text="Joint-space output", variable=self.joint_space_var).grid(row=3, column=3, padx=5, pady=2, sticky="w")
 
         # Standard G-code Upload
         tk.Label(root, text="G-code File:").grid(row=4, column=0, padx=5, pady=5, sticky="e")
         self.file_var = tk.StringVar(value=self.settings.get("file", ""))
         tk.Entry(root, textvariable=self.file_var, width=40, state="readonly").grid(row=4, column=1, padx=5, pady=5, sticky="w")
         tk.Button(root, text="Browse", command=self.browse_file).grid(row=4, column=2, padx=5, pady=5)
-        tk.Label(root, text="Note: Use translated or compatible G-code.").grid(row=5, column=1, columnspan=2, padx=5, pady=2, sticky="w")
+        tk.Label(root, text="Note: Use translated or compatible G-code.").grid(row=5, column=1, padx=5, pady=2, sticky="w")
+        self.optimize_travel_var = tk.BooleanVar(value=self.settings.get("optimize_travel", False))
+        tk.Checkbutton(root, text="Optimize travel", variable=self.optimize_travel_var).grid(row=5, column=2, padx=5, pady=2, sticky="w")
+        self.resync_var = tk.BooleanVar(value=self.settings.get("resync", True))
+        tk.Checkbutton(root, text="Resync on missed ack", variable=self.resync_var).grid(row=5, column=3, padx=5, pady=2, sticky="w")
 
         # Jog Controls
         jog_frame = tk.LabelFrame(root, text="Jog Controls", padx=5, pady=5)
@@ -85,27 +130,56 @@ class GCodeSenderApp:
         tk.Entry(jog_frame, textvariable=self.jog_feedrate_var, width=10).grid(row=0, column=3, padx=5, pady=2)
 
         # θ1 Axis (J1)
-        self.theta1_plus_button = tk.Button(jog_frame, text="θ1+", command=lambda: self.jog_axis("1", 1), width=5, state="disabled")
+        self.theta1_plus_button = tk.Button(jog_frame, text="θ1+", width=5, state="disabled")
         self.theta1_plus_button.grid(row=1, column=0, padx=2, pady=2)
-        self.theta1_minus_button = tk.Button(jog_frame, text="θ1-", command=lambda: self.jog_axis("1", -1), width=5, state="disabled")
+        self.bind_jog(self.theta1_plus_button, "1", 1)
+        self.theta1_minus_button = tk.Button(jog_frame, text="θ1-", width=5, state="disabled")
         self.theta1_minus_button.grid(row=1, column=1, padx=2, pady=2)
+        self.bind_jog(self.theta1_minus_button, "1", -1)
 
         # d2 Axis (J2, vertical)
-        self.d2_plus_button = tk.Button(jog_frame, text="d2+", command=lambda: self.jog_axis("2", 1), width=5, state="disabled")
+        self.d2_plus_button = tk.Button(jog_frame, text="d2+", width=5, state="disabled")
         self.d2_plus_button.grid(row=1, column=2, padx=2, pady=2)
-        self.d2_minus_button = tk.Button(jog_frame, text="d2-", command=lambda: self.jog_axis("2", -1), width=5, state="disabled")
+        self.bind_jog(self.d2_plus_button, "2", 1)
+        self.d2_minus_button = tk.Button(jog_frame, text="d2-", width=5, state="disabled")
         self.d2_minus_button.grid(row=1, column=3, padx=2, pady=2)
+        self.bind_jog(self.d2_minus_button, "2", -1)
 
         # d3 Axis (J3, radial)
-        self.d3_plus_button = tk.Button(jog_frame, text="d3+", command=lambda: self.jog_axis("3", 1), width=5, state="disabled")
+        self.d3_plus_button = tk.Button(jog_frame, text="d3+", width=5, state="disabled")
         self.d3_plus_button.grid(row=1, column=4, padx=2, pady=2)
-        self.d3_minus_button = tk.Button(jog_frame, text="d3-", command=lambda: self.jog_axis("3", -1), width=5, state="disabled")
+        self.bind_jog(self.d3_plus_button, "3", 1)
+        self.d3_minus_button = tk.Button(jog_frame, text="d3-", width=5, state="disabled")
         self.d3_minus_button.grid(row=1, column=5, padx=2, pady=2)
+        self.bind_jog(self.d3_minus_button, "3", -1)
 
         # Home Button
         self.home_button = tk.Button(jog_frame, text="Home All Axes", command=self.home_axes, state="disabled")
         self.home_button.grid(row=0, column=4, columnspan=2, padx=5, pady=2)
 
+        # Live position from controller reports
+        self.live_var = tk.BooleanVar(value=self.settings.get("live_position", False))
+        tk.Checkbutton(jog_frame, text="Live position", variable=self.live_var, command=self.toggle_live_position).grid(row=2, column=0, columnspan=2, padx=5, pady=2, sticky="w")
+        tk.Label(jog_frame, text="Poll rate (Hz):").grid(row=2, column=2, padx=5, pady=2)
+        self.poll_rate_var = tk.StringVar(value=self.settings.get("poll_rate", str(DEFAULT_POLL_HZ)))
+        tk.Entry(jog_frame, textvariable=self.poll_rate_var, width=10).grid(row=2, column=3, padx=5, pady=2)
+        self.poll_m114_var = tk.BooleanVar(value=self.settings.get("poll_m114", False))
+        tk.Checkbutton(jog_frame, text="Poll with M114", variable=self.poll_m114_var).grid(row=2, column=4, columnspan=2, padx=5, pady=2, sticky="w")
+        tk.Label(jog_frame, text="Machine:").grid(row=3, column=0, padx=5, pady=2)
+        self.machine_var = tk.StringVar(value=self.settings.get("machine", DEFAULT_MACHINE))
+        if self.machine_var.get() not in self.machines.machines:
+            self.machine_var.set(DEFAULT_MACHINE)
+        self.machine_combo = ttk.Combobox(jog_frame, textvariable=self.machine_var, values=list(self.machines.machines), state="readonly", width=15)
+        self.machine_combo.grid(row=3, column=1, columnspan=2, padx=5, pady=2, sticky="w")
+        self.machine_combo.bind("<<ComboboxSelected>>", lambda event: self.apply_machine())
+        self.apply_machine()
+        self.root.after(MACHINE_POLL_MS, self.check_machine_file)
+        self.twin = DigitalTwin()
+        self.recorder = None  # Records the running job's commanded and reported path
+        self.playback_stop = None
+        self.poller = None
+        self.live_pose = None
+
         # Manual Command
         tk.Label(root, text="Manual Command:").grid(row=7, column=0, padx=5, pady=5, sticky="e")
         self.command_var = tk.StringVar()
@@ -114,6 +188,16 @@ class GCodeSenderApp:
         self.send_button = tk.Button(root, text="Send", command=self.send_manual_command, state="disabled")
         self.send_button.grid(row=7, column=2, padx=5, pady=5)
         self.command_entry.bind("<Return>", lambda event: self.send_manual_command())
+        self.command_entry.bind("<Up>", lambda event: self.recall_command(self.history.previous()))
+        self.command_entry.bind("<Down>", lambda event: self.recall_command(self.history.next()))
+        self.command_entry.bind("<<Paste>>", self.paste_commands)
+        self.history = CommandHistory(self.settings.get("history", []))
+        self.macros = self.settings.get("macros", DEFAULT_MACROS)
+        self.console = CommandWorker(self.log)
+        self.macro_var = tk.StringVar()
+        self.macro_combo = ttk.Combobox(root, textvariable=self.macro_var, values=sorted(self.macros), state="readonly", width=15)
+        self.macro_combo.grid(row=7, column=3, padx=5, pady=5, sticky="w")
+        self.macro_combo.bind("<<ComboboxSelected>>", self.run_selected_macro)
 
         # Controls
         self.start_button = tk.Button(root, text="Start", command=self.start_sending, state="disabled")
@@ -133,10 +217,66 @@ class GCodeSenderApp:
         self.output_text = tk.Text(root, height=15, width=80, state="disabled")
         self.output_text.grid(row=9, column=0, columnspan=4, padx=5, pady=5)
 
-        # Initialize 3D visualization
+        # Recorded jobs
+        tk.Button(root, text="Play Recording", command=self.play_recording).grid(row=10, column=0, padx=5, pady=5)
+        tk.Button(root, text="Compare Recording", command=self.compare_recording).grid(row=10, column=1, padx=5, pady=5)
+        tk.Button(root, text="Export Recording", command=self.export_recording).grid(row=10, column=2, padx=5, pady=5)
+
+        # Instrumentation: span timings reported at job end, and an optional profiler capture per job
+        timing_frame = tk.Frame(root)
+        timing_frame.grid(row=10, column=3, padx=5, pady=5, sticky="w")
+        self.timing_var = tk.BooleanVar(value=self.settings.get("timing", False))
+        tk.Checkbutton(timing_frame, text="Timing", variable=self.timing_var, command=self.toggle_timing).grid(row=0, column=0, sticky="w")
+        self.capture_var = tk.StringVar(value=self.settings.get("capture", CAPTURES[0]))
+        if self.capture_var.get() not in CAPTURES:
+            self.capture_var.set(CAPTURES[0])
+        ttk.Combobox(timing_frame, textvariable=self.capture_var, values=CAPTURES, state="readonly", width=11).grid(row=0, column=1, padx=2)
+        self.toggle_timing()
+        self.capture = None  # Profiler for the job being started, run by the send thread
+
+        # Job queue
+        queue_frame = tk.LabelFrame(root, text="Job Queue", padx=5, pady=5)
+        queue_frame.grid(row=11, column=0, columnspan=4, padx=5, pady=5, sticky="ew")
+        self.job_list = tk.Listbox(queue_frame, height=5, width=70, exportselection=False)
+        self.job_list.grid(row=0, column=0, columnspan=8, padx=5, pady=2, sticky="ew")
+        tk.Label(queue_frame, text="Priority:").grid(row=1, column=0, padx=2, pady=2, sticky="e")
+        self.job_priority_var = tk.StringVar(value="0")
+        tk.Entry(queue_frame, textvariable=self.job_priority_var, width=5).grid(row=1, column=1, padx=2, pady=2, sticky="w")
+        # Blank fields use the translation defaults
+        self.job_option_vars = {}
+        for column, (key, label) in enumerate((('x_offset', "X off:"), ('y_offset', "Y off:"), ('z_offset', "Z off:"), ('max_feedrate', "Feed cap:")), 1):
+            tk.Label(queue_frame, text=label).grid(row=1, column=2 * column, padx=2, pady=2, sticky="e")
+            self.job_option_vars[key] = tk.StringVar()
+            tk.Entry(queue_frame, textvariable=self.job_option_vars[key], width=7).grid(row=1, column=2 * column + 1, padx=2, pady=2, sticky="w")
+        tk.Button(queue_frame, text="Add Job", command=lambda: self.add_job(False)).grid(row=2, column=0, padx=2, pady=2)
+        tk.Button(queue_frame, text="Add Cura Job", command=lambda: self.add_job(True)).grid(row=2, column=1, padx=2, pady=2)
+        tk.Button(queue_frame, text="Remove", command=self.remove_job).grid(row=2, column=2, padx=2, pady=2)
+        tk.Button(queue_frame, text="Up", command=lambda: self.move_job(-1)).grid(row=2, column=3, padx=2, pady=2)
+        tk.Button(queue_frame, text="Down", command=lambda: self.move_job(1)).grid(row=2, column=4, padx=2, pady=2)
+        tk.Button(queue_frame, text="Retry", command=self.retry_job).grid(row=2, column=5, padx=2, pady=2)
+        self.run_queue_button = tk.Button(queue_frame, text="Run Queue", command=self.toggle_job_queue)
+        self.run_queue_button.grid(row=2, column=6, columnspan=2, padx=2, pady=2)
+        self.jobs = JobQueue()
+        try:
+            self.jobs.load()
+        except (json.JSONDecodeError, IOError, KeyError) as e:
+            self.log(f"Error loading job queue: {e}")
+        self.scheduler = JobScheduler(self.log)
+        self.queue_running = False
+        self.current_job = None
+        self.job_events = queue.Queue()  # Whether each finished transmission completed
+        self.connect_queue = queue.Queue()  # Links set up by connect_thread, or None if it failed
+        self.connecting = False
+        self.refresh_job_list()
+
+        # The 3D plot opens from check_queues once matplotlib has loaded in
+        # the background, so the console is usable straight away
         self.fig = None
         self.ax = None
-        self.init_3d_plot()
+        x, y, z = self.forward_kinematics(self.joints['theta1'], self.joints['d2'], self.joints['d3'])
+        self.positions.append([x, y, z])
+        self.visual_loader = ModuleLoader()
+        self.root.after_idle(self.visual_loader.start)
 
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         self.root.after(10, self.check_queues)
@@ -156,16 +296,30 @@ class GCodeSenderApp:
         self.settings = {
             "port": self.port_var.get(),
             "baud": self.baud_var.get(),
-            "file": self.file_var.get()
+            "file": self.file_var.get(),
+            "protocol": self.protocol_var.get(),
+            "joint_space": self.joint_space_var.get(),
+            "optimize_travel": self.optimize_travel_var.get(),
+            "resync": self.resync_var.get(),
+            "auto_baud": self.auto_baud_var.get(),
+            "live_position": self.live_var.get(),
+            "poll_rate": self.poll_rate_var.get(),
+            "poll_m114": self.poll_m114_var.get(),
+            "profile": self.profile_var.get(),
+            "machine": self.machine_var.get(),
+            "profiles": self.user_profiles,
+            "history": self.history.entries,
+            "timing": self.timing_var.get(),
+            "capture": self.capture_var.get(),
+            "macros": self.macros
         }
         try:
-            with open("settings.json", "w") as f:
-                json.dump(self.settings, f, indent=4)
+            save_json("settings.json", self.settings)
         except IOError as e:
             self.log(f"Error saving settings: {e}")
 
     def refresh_ports(self):
-        ports = [port.device for port in serial.tools.list_ports.comports()]
+        ports = [port.device for port in serial.tools.list_ports.comports()] + [SIM_PORT]
         self.port_combo["values"] = ports
         if ports and not self.port_var.get():
             self.port_var.set(ports[0])
@@ -179,6 +333,7 @@ class GCodeSenderApp:
             self.file_var.set(file_path)
             self.cura_file_var.set("")
             self.log(f"Selected standard G-code file: {file_path}")
+            threading.Thread(target=self.show_job_stats, args=(file_path,), daemon=True).start()
 
     def browse_cura_file(self):
         file_path = filedialog.askopenfilename(filetypes=[("G-code Files", "*.gcode"), ("All Files", "*.*")])
@@ -189,80 +344,74 @@ class GCodeSenderApp:
                 translated_path = self.translate_cura_gcode(file_path)
                 self.file_var.set(translated_path)
                 self.log(f"Translated Cura G-code saved as: {translated_path}")
+                self.show_job_stats(translated_path)
             except Exception as e:
                 self.log(f"Error translating Cura G-code: {e}")
                 messagebox.showerror("Error", f"Failed to translate Cura G-code: {e}")
 
-    def translate_cura_gcode(self, input_path):
-        output_path = "C:/Users/Obed Wambugu/Documents/Gcode Sender/newtranslated.gcode"
-        max_feedrate = 1000.0
-
-        output_lines = ["G28\n", "G90\n"]
-        current_pos = {'X': 0.0, 'Y': 0.0, 'Z': 0.0}
-        current_f = max_feedrate
-
-        # Offset to center print (adjust based on problematic coordinates)
-        x_offset = 700.0  # Shift X to reduce d3
-        y_offset = 500.0  # Shift Y to reduce d3
-
-        with open(input_path, 'r') as f:
-            lines = f.readlines()
-
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith(';'):
-                continue
-            if line.startswith(('M104', 'M105', 'M109', 'M82', 'M107', 'G92')):
-                continue
-            if line.startswith(('G0 ', 'G1 ')):
-                parts = line.split()
-                cmd = 'G00' if line.startswith('G0') else 'G01'
-                x, y, z, f = current_pos['X'], current_pos['Y'], current_pos['Z'], None
-                for part in parts[1:]:
-                    if part.startswith('X'):
-                        x = float(part[1:])
-                    elif part.startswith('Y'):
-                        y = float(part[1:])
-                    elif part.startswith('Z'):
-                        z = float(part[1:])
-                    elif part.startswith('F'):
-                        f = float(part[1:])
-                current_pos.update({'X': x, 'Y': y, 'Z': z})
-                if f is not None:
-                    current_f = min(f, max_feedrate)
-                # Apply offsets
-                x_trans = x - x_offset
-                y_trans = y - y_offset
-                z_trans = z + self.z_offset
-                # Check workspace
-                d2 = z_trans - self.base_height
-                d3 = np.sqrt(x_trans**2 + y_trans**2)
-                if 0 <= d2 <= self.d2_max and d3 <= self.d3_max:
-                    new_line = f"{cmd} X{x_trans:.3f} Y{y_trans:.3f} Z{z_trans:.3f} F{current_f}"
-                    output_lines.append(new_line + "\n")
-                else:
-                    self.log(f"Warning: Translated position (X={x_trans}, Y={y_trans}, Z={z_trans}) out of range (d2: [0, {self.d2_max}], d3: [0, {self.d3_max}])")
-            elif line == 'G90':
-                output_lines.append("G90\n")
-            elif line == 'G28':
-                current_pos = {'X': 0.0, 'Y': 0.0, 'Z': 0.0}
-                output_lines.append("G28\n")
-
-        output_lines.append("M114\n")
+    def apply_machine(self):
+        # The plot and position checks use the selected machine's dimensions;
+        # jog defaults, the open link's batch depth and the translation
+        # profile follow it too
+        machine = self.machine = self.machines.get(self.machine_var.get())
+        self.base_height = machine['base_height']
+        self.d2_max = machine['d2_max']
+        self.d3_max = machine['d3_max']
+        self.jog_distance_var.set(f"{machine['jog_distance']:g}")
+        self.jog_feedrate_var.set(f"{machine['jog_feedrate']:g}")
+        if self.serial and self.serial.is_open:
+            self.serial.pipeline_depth = machine['pipeline_depth']
+            self.serial.resend_window = machine['resend_window']
+        profile = machine['translator_profile']
+        if profile in self.profiles:
+            self.profile_var.set(profile)
+        elif profile:
+            self.log(f"Machine {self.machine_var.get()} names unknown translation profile {profile}")
+
+    def check_machine_file(self):
+        # Hot reload: a profile edited mid-shift applies without a restart; a
+        # broken edit is reported and the previous profiles stay in effect
+        if self.machines.changed():
+            try:
+                self.machines.load()
+            except (OSError, ValueError) as e:
+                self.log(f"Error reloading machine profiles, keeping the previous ones: {e}")
+            else:
+                self.machine_combo.config(values=list(self.machines.machines))
+                self.apply_machine()
+                self.log(f"Machine profiles reloaded, using {self.machine_var.get()}")
+        self.root.after(MACHINE_POLL_MS, self.check_machine_file)
 
-        with open(output_path, 'w') as f:
-            f.writelines(output_lines)
+    def get_translate_options(self):
+        # Run the RPP inverse kinematics here and stream θ1/d2/d3 targets when joint-space is on
+        stages = [stage for stage, var in (('joint_space', self.joint_space_var), ('optimize_travel', self.optimize_travel_var)) if var.get()]
+        return compile_profile(self.profiles[self.profile_var.get()], stages, translator_machine(self.machine))
 
+    def translate_cura_gcode(self, input_path):
+        output_path = translated_path(input_path)
+        options = self.get_translate_options()
+        # Large files are split into chunks and translated in a process pool
+        with stats.span('translate'):
+            warnings = translate_file(input_path, output_path, options)
+        for warning in warnings:
+            self.log(warning)
         return output_path
 
     def forward_kinematics(self, theta1, d2, d3):
-        theta1_rad = np.radians(theta1)
-        x = d3 * np.cos(theta1_rad)
-        y = d3 * np.sin(theta1_rad)
+        theta1_rad = math.radians(theta1)
+        x = d3 * math.cos(theta1_rad)
+        y = d3 * math.sin(theta1_rad)
         z = self.base_height + d2
         return x, y, z
 
-    def init_3d_plot(self):
+    def init_3d_plot(self, loader):
+        if loader.error is not None:
+            self.log(f"Error loading 3D plot: {loader.error}")
+            return
+        import matplotlib.pyplot as plt
+        from mpl_toolkits.mplot3d import Axes3D  # Registers the 3d projection
+        from trajectory_lod import TrajectoryLOD
+        self.trajectory_lod = TrajectoryLOD()
         self.fig = plt.figure(figsize=(6, 6))
         self.ax = self.fig.add_subplot(111, projection='3d')
         self.ax.set_xlabel('X (mm)')
@@ -272,21 +421,36 @@ class GCodeSenderApp:
         self.ax.set_xlim([-1200, 1200])
         self.ax.set_ylim([-1200, 1200])
         self.ax.set_zlim([0, 1500])
-        x, y, z = self.forward_kinematics(self.joints['theta1'], self.joints['d2'], self.joints['d3'])
-        self.positions.append([x, y, z])
+        self.fig.canvas.mpl_connect('button_release_event', self.on_view_changed)
+        self.fig.canvas.mpl_connect('scroll_event', self.on_view_changed)
         self.update_3d_plot()
         plt.ion()
         plt.show()
+        self.log(f"3D plot loaded in {loader.seconds:.2f} s")
+
+    def get_view_bounds(self):
+        return (tuple(self.ax.get_xlim3d()), tuple(self.ax.get_ylim3d()), tuple(self.ax.get_zlim3d()))
+
+    def on_view_changed(self, event):
+        # Zooming changes the axis limits; redraw so the trajectory level matches the new view
+        if self.get_view_bounds() != self.view_bounds:
+            self.update_3d_plot()
 
     def update_3d_plot(self):
+        if self.ax is None:
+            return
+        import numpy as np
+        # Keep the operator's zoom across redraws
+        self.view_bounds = self.get_view_bounds()
+        (x_min, x_max), (y_min, y_max), (z_min, z_max) = self.view_bounds
         self.ax.clear()
         self.ax.set_xlabel('X (mm)')
         self.ax.set_ylabel('Y (mm)')
         self.ax.set_zlabel('Z (mm)')
         self.ax.set_title('RPP Robot (Base: 300 mm, d2: Vertical, d3: Radial)')
-        self.ax.set_xlim([-1200, 1200])
-        self.ax.set_ylim([-1200, 1200])
-        self.ax.set_zlim([0, 1500])
+        self.ax.set_xlim([x_min, x_max])
+        self.ax.set_ylim([y_min, y_max])
+        self.ax.set_zlim([z_min, z_max])
 
         theta1 = self.joints['theta1']
         d2 = np.clip(self.joints['d2'], 0, self.d2_max)
@@ -319,9 +483,12 @@ class GCodeSenderApp:
         # End effector
         self.ax.scatter([x2], [y2], [z2], color='red', s=100, label='End Effector')
 
-        # Trajectory
-        pos_array = np.array(self.positions[-1000:])
-        if len(pos_array) > 1:
+        # Trajectory, drawn in full at the level of detail that fits the current view
+        if len(self.positions) < self.trajectory_lod.count:
+            self.trajectory_lod.clear()
+        self.trajectory_lod.extend(self.positions[self.trajectory_lod.count:])
+        if self.trajectory_lod.count > 1:
+            pos_array = self.trajectory_lod.polyline(self.view_bounds)
             self.ax.plot(pos_array[:, 0], pos_array[:, 1], pos_array[:, 2], 'b--', label='Trajectory')
 
         self.ax.legend(loc='upper left')
@@ -330,65 +497,71 @@ class GCodeSenderApp:
 
     def parse_command_for_position(self, command):
         command = command.strip()
-        if command.startswith(('G0', 'G1', 'G00', 'G01')):
-            parts = command.split()
-            x, y, z = self.current_pos['X'], self.current_pos['Y'], self.current_pos['Z']
-            update = False
-            for part in parts[1:]:
-                if part.startswith('X'):
-                    x = float(part[1:])
-                    update = True
-                elif part.startswith('Y'):
-                    y = float(part[1:])
-                    update = True
-                elif part.startswith('Z'):
-                    z = float(part[1:])
-                    update = True
-            if update:
-                d2 = z - self.base_height
-                d3 = np.sqrt(x**2 + y**2)
-                if 0 <= d2 <= self.d2_max and d3 <= self.d3_max:
-                    self.joints['d2'] = d2
-                    self.joints['d3'] = d3
-                    self.joints['theta1'] = np.degrees(np.arctan2(y, x)) if d3 > 0.001 else self.joints['theta1']
-                    self.current_pos.update({'X': x, 'Y': y, 'Z': z})
-                    self.log(f"Parsed G0/G1: θ1={self.joints['theta1']:.1f}°, d2={d2:.1f} mm, d3={d3:.1f} mm")
-                    x_pos, y_pos, z_pos = self.forward_kinematics(self.joints['theta1'], self.joints['d2'], self.joints['d3'])
-                    self.positions.append([x_pos, y_pos, z_pos])
-                    return True
-                else:
-                    self.log(f"Warning: Position (X={x}, Y={y}, Z={z}) out of range (d2: [0, {self.d2_max}], d3: [0, {self.d3_max}])")
-                    return False
-            else:
+        block = lex(command)
+        if block is None:
+            self.log(f"Skipped unsupported command: {command}")
+            return False
+        code = block[0]
+        kind, a, b, c = motion(block)
+        if kind == NO_MOVE:
+            if code in ('G00', 'G01'):
                 self.log(f"Skipped empty G0/G1: {command}")
-                return False
-        elif command.startswith('J'):
-            parts = command.split()
-            if len(parts) >= 3:
-                axis = parts[0][1:]
-                distance = float(parts[1][1:])
-                if axis == '1':
-                    self.joints['theta1'] += distance
-                elif axis == '2':
-                    self.joints['d2'] = np.clip(self.joints['d2'] + distance, 0, self.d2_max)
-                elif axis == '3':
-                    self.joints['d3'] = np.clip(self.joints['d3'] + distance, 0, self.d3_max)
-                x, y, z = self.forward_kinematics(self.joints['theta1'], self.joints['d2'], self.joints['d3'])
-                self.current_pos.update({'X': x, 'Y': y, 'Z': z})
-                self.positions.append([x, y, z])
-                return True
-            else:
+            elif code[0] == 'J' and code != 'JA':
                 self.log(f"Skipped invalid jog: {command}")
+            else:
+                self.log(f"Skipped unsupported command: {command}")
+            return False
+        if not self.apply_motion(kind, a, b, c):
+            return False
+        if kind == LINEAR:
+            self.log(f"Parsed G0/G1: θ1={self.joints['theta1']:.1f}°, d2={self.joints['d2']:.1f} mm, d3={self.joints['d3']:.1f} mm")
+        elif kind == HOME:
+            self.log("Parsed G28: Homing to θ1=0°, d2=0 mm, d3=0 mm")
+        return True
+
+    def apply_motion(self, kind, a, b, c):
+        # Moves the joints and position by a command reduced with
+        # gcode_program.motion. Returns False if it does not move the robot.
+        if kind == LINEAR:
+            x = self.current_pos['X'] if math.isnan(a) else a
+            y = self.current_pos['Y'] if math.isnan(b) else b
+            z = self.current_pos['Z'] if math.isnan(c) else c
+            d2 = z - self.base_height
+            d3 = math.hypot(x, y)
+            if not (0 <= d2 <= self.d2_max and d3 <= self.d3_max):
+                self.log(f"Warning: Position (X={x}, Y={y}, Z={z}) out of range (d2: [0, {self.d2_max}], d3: [0, {self.d3_max}])")
                 return False
-        elif command == 'G28':
+            self.joints['d2'] = d2
+            self.joints['d3'] = d3
+            self.joints['theta1'] = math.degrees(math.atan2(y, x)) if d3 > 0.001 else self.joints['theta1']
+            self.current_pos.update({'X': x, 'Y': y, 'Z': z})
+            self.positions.append(list(self.forward_kinematics(self.joints['theta1'], self.joints['d2'], self.joints['d3'])))
+            return True
+        if kind == HOME:
             self.joints = {'theta1': 0.0, 'd2': 0.0, 'd3': 0.0}
             self.current_pos = {'X': 0.0, 'Y': 0.0, 'Z': self.base_height}
             self.positions.append([0, 0, self.base_height])
-            self.log("Parsed G28: Homing to θ1=0°, d2=0 mm, d3=0 mm")
             return True
+        # Absolute joint move from a joint-space translation (JA A<θ1> B<d2> C<d3>) or a jog
+        if kind == JOINTS:
+            if not math.isnan(a):
+                self.joints['theta1'] = a
+            if not math.isnan(b):
+                self.joints['d2'] = min(max(b, 0), self.d2_max)
+            if not math.isnan(c):
+                self.joints['d3'] = min(max(c, 0), self.d3_max)
+        elif kind == JOG1:
+            self.joints['theta1'] += a
+        elif kind == JOG2:
+            self.joints['d2'] = min(max(self.joints['d2'] + a, 0), self.d2_max)
+        elif kind == JOG3:
+            self.joints['d3'] = min(max(self.joints['d3'] + a, 0), self.d3_max)
         else:
-            self.log(f"Skipped unsupported command: {command}")
             return False
+        x, y, z = self.forward_kinematics(self.joints['theta1'], self.joints['d2'], self.joints['d3'])
+        self.current_pos.update({'X': x, 'Y': y, 'Z': z})
+        self.positions.append([x, y, z])
+        return True
 
     def jog_axis(self, axis, direction):
         if not self.serial or not self.serial.is_open:
@@ -412,6 +585,149 @@ class GCodeSenderApp:
             self.update_3d_plot()
             self.send_manual_command(command)
 
+    def record_report(self, position):
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.reported(position)
+
+    def choose_recording(self):
+        from path_recorder import RECORDINGS_DIR
+        return filedialog.askdirectory(initialdir=RECORDINGS_DIR if os.path.isdir(RECORDINGS_DIR) else None, title="Select a recording")
+
+    def play_recording(self):
+        # A second click while playing stops the playback
+        if self.playback_stop is not None and not self.playback_stop.is_set():
+            self.playback_stop.set()
+            return
+        directory = self.choose_recording()
+        if not directory:
+            return
+        self.playback_stop = threading.Event()
+        threading.Thread(target=self.playback_thread, args=(directory, self.playback_stop), daemon=True).start()
+
+    def playback_thread(self, directory, stop):
+        from path_recorder import playback
+        self.log(f"Playing back {directory}")
+        try:
+            for x, y, z in playback(directory, stop=stop):
+                r = math.hypot(x, y)
+                theta = math.degrees(math.atan2(y, x)) if r > 0.001 else self.joints['theta1']
+                self.plot_queue.put({'theta1': theta, 'd2': z - self.base_height, 'd3': r})
+        except (OSError, ValueError) as e:
+            self.log(f"Error playing recording: {e}")
+            return
+        finally:
+            stop.set()
+        self.log("Playback finished")
+
+    def compare_recording(self):
+        directory = self.choose_recording()
+        if not directory:
+            return
+        from path_recorder import compare
+        try:
+            result = compare(directory)
+        except (OSError, ValueError) as e:
+            self.log(f"Error comparing recording: {e}")
+            return
+        if result is None:
+            self.log("Recording needs commanded lines and position reports to compare")
+            return
+        self.log(f"Deviation over {result['samples']} reports: mean {result['mean']:.3f} mm, RMS {result['rms']:.3f} mm, max {result['max']:.3f} mm")
+
+    def export_recording(self):
+        directory = self.choose_recording()
+        if not directory:
+            return
+        csv_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV Files", "*.csv"), ("All Files", "*.*")])
+        if not csv_path:
+            return
+        from path_recorder import export_csv
+        try:
+            export_csv(directory, csv_path)
+            self.log(f"Recording exported to {csv_path}")
+        except (OSError, ValueError) as e:
+            self.log(f"Error exporting recording: {e}")
+
+    def toggle_live_position(self):
+        if self.live_var.get():
+            self.start_live_position()
+        else:
+            self.stop_live_position()
+
+    def start_live_position(self):
+        self.stop_live_position()
+        if not self.serial or not self.serial.is_open:
+            return
+        try:
+            rate = float(self.poll_rate_var.get())
+        except ValueError:
+            self.log("Invalid poll rate.")
+            return
+        self.poller = StatusPoller(self.serial, self.twin, rate, use_m114=self.poll_m114_var.get(), on_report=self.record_report)
+        self.poller.start()
+        self.log(f"Polling position at {rate:g} Hz")
+        self.root.after(FRAME_MS, lambda: self.update_live_position(self.poller))
+
+    def stop_live_position(self):
+        if self.poller is not None:
+            self.poller.stop()
+            self.poller = None
+            self.live_pose = None
+
+    def update_live_position(self, poller):
+        # Redraws the arm at the interpolated reported pose until the poller changes
+        if poller is not self.poller:
+            return
+        pose = self.twin.pose_at()
+        if pose is not None and (self.live_pose is None or max(abs(a - b) for a, b in zip(pose, self.live_pose)) > 0.01):
+            self.live_pose = pose
+            theta, z, r = pose
+            self.joints.update({'theta1': theta, 'd2': z - self.base_height, 'd3': r})
+            self.update_3d_plot()
+        self.root.after(FRAME_MS, lambda: self.update_live_position(poller))
+
+    def bind_jog(self, button, axis, direction):
+        # A click jogs one step; holding the button jogs until it is released
+        button.bind("<ButtonPress-1>", lambda event: self.jog_pressed(button, axis, direction))
+        button.bind("<ButtonRelease-1>", lambda event: self.jog_released(axis, direction))
+
+    def jog_pressed(self, button, axis, direction):
+        if str(button["state"]) == "disabled":
+            return
+        self.jog_button_down = True
+        self.jog_hold = self.root.after(HOLD_DELAY_MS, lambda: self.start_continuous_jog(axis, direction))
+
+    def jog_released(self, axis, direction):
+        if not self.jog_button_down:
+            return
+        self.jog_button_down = False
+        if self.jog is not None:
+            self.jog.stop()
+            self.jog = None
+            self.log("Jog stopped")
+        else:
+            self.root.after_cancel(self.jog_hold)
+            self.jog_axis(axis, direction)
+
+    def start_continuous_jog(self, axis, direction):
+        self.jog_button_down = False
+        if not self.serial or not self.serial.is_open:
+            self.log("Not connected. Please connect first.")
+            return
+        if self.running:
+            self.log("Cannot jog while G-code is running.")
+            return
+        try:
+            feedrate = float(self.jog_feedrate_var.get())
+        except ValueError:
+            self.log("Invalid jog feedrate.")
+            return
+        self.jog_button_down = True
+        self.jog = ContinuousJog(self.serial, axis, direction, feedrate, self.log, self.jog_queue.put, self.machine['jog_segment_seconds'], self.machine['jog_planner_depth'])
+        self.jog.start()
+        self.log(f"Jogging axis {axis} {'+' if direction > 0 else '-'} at {feedrate}, release to stop")
+
     def home_axes(self):
         if not self.serial or not self.serial.is_open:
             self.log("Not connected. Please connect first.")
@@ -433,35 +749,74 @@ class GCodeSenderApp:
         if command is None:
             command = self.command_var.get().strip()
             self.command_var.set("")
+            if command:
+                self.history.add(command)
         if not command:
             self.log("No command entered")
             return
 
-        if self.parse_command_for_position(command):
+        if command.upper() in REALTIME_COMMANDS:
+            self.log(f"Real-time command: {command}")
+            try:
+                if not self.serial.realtime(REALTIME_COMMANDS[command.upper()]):
+                    self.log("Controller does not support real-time commands")
+            except serial.SerialException as e:
+                self.log(f"Error sending command: {e}")
+            return
+        if self.running:
+            self.log("Only real-time commands (! ~ ? ^X) can be sent while G-code is running.")
+            return
+
+        if command.startswith('@'):
+            commands = self.macros.get(command[1:])
+            if commands is None:
+                self.log(f"Unknown macro: {command[1:]}")
+                return
+        else:
+            commands = [command]
+        self.submit_commands(commands)
+
+    def submit_commands(self, commands):
+        updated = False
+        for command in commands:
+            updated = self.parse_command_for_position(command) or updated
+        if updated:
             self.update_3d_plot()
 
+        if len(commands) == 1:
+            self.log(f"Sending command: {commands[0]}")
+        else:
+            self.log(f"Sending {len(commands)} lines")
+        self.console.submit(self.serial, commands)
+
+    def recall_command(self, command):
+        if command is not None:
+            self.command_var.set(command)
+            self.command_entry.icursor(tk.END)
+        return "break"
+
+    def paste_commands(self, event):
+        # A multi-line paste is sent as one pipelined batch instead of landing in the entry
         try:
-            self.log(f"Sending command: {command}")
-            self.serial.write((command + '\n').encode('utf-8'))
-            self.serial.flush()
-            start_time = time.time()
-            prompt_seen = False
-            while time.time() - start_time < 3600:
-                if self.serial.in_waiting > 0:
-                    raw_data = self.serial.readline()
-                    try:
-                        response = raw_data.decode('utf-8').strip()
-                        self.log(f"Received: {response}")
-                        if 'ready>' in response:
-                            prompt_seen = True
-                            break
-                    except UnicodeDecodeError:
-                        self.log(f"Decode error: {raw_data.hex()}")
-                time.sleep(0.01)
-            if not prompt_seen:
-                self.log("No prompt received after command")
-        except serial.SerialException as e:
-            self.log(f"Error sending command: {e}")
+            text = self.root.clipboard_get()
+        except tk.TclError:
+            return None
+        commands = [line for line in (strip(line) for line in text.splitlines()) if line]
+        if len(commands) < 2:
+            return None
+        if not self.serial or not self.serial.is_open:
+            self.log("Not connected. Please connect first.")
+        elif self.running:
+            self.log("Cannot send a batch while G-code is running.")
+        else:
+            self.submit_commands(commands)
+        return "break"
+
+    def run_selected_macro(self, event):
+        name = self.macro_var.get()
+        self.macro_var.set("")
+        if name:
+            self.send_manual_command("@" + name)
 
     def preview_trajectory(self):
         if not self.file_var.get():
@@ -469,12 +824,14 @@ class GCodeSenderApp:
             return
 
         self.positions = []
+        if self.trajectory_lod is not None:
+            self.trajectory_lod.clear()
         self.joints = {'theta1': 0.0, 'd2': 0.0, 'd3': 0.0}
         self.current_pos = {'X': 0.0, 'Y': 0.0, 'Z': self.base_height}
         try:
             with open(self.file_var.get(), 'r') as f:
                 for line_number, line in enumerate(f, 1):
-                    line = line.split(';', 1)[0].strip()
+                    line = strip(line)
                     if not line:
                         continue
                     if self.parse_command_for_position(line):
@@ -503,25 +860,172 @@ class GCodeSenderApp:
                 self.log(f"Error saving trajectory: {e}")
                 messagebox.showerror("Error", f"Failed to save trajectory: {e}")
 
+    def selected_job(self):
+        selection = self.job_list.curselection()
+        if not selection:
+            return None
+        return self.jobs.jobs[selection[0]]
+
+    def refresh_job_list(self):
+        selection = self.job_list.curselection()
+        self.job_list.delete(0, tk.END)
+        for job in self.jobs.jobs:
+            self.job_list.insert(tk.END, self.jobs.describe(job))
+        if selection and selection[0] < len(self.jobs.jobs):
+            self.job_list.selection_set(selection[0])
+
+    def add_job(self, translate):
+        file_path = filedialog.askopenfilename(filetypes=[("G-code Files", "*.gcode"), ("All Files", "*.*")])
+        if not file_path:
+            return
+        try:
+            priority = int(self.job_priority_var.get() or 0)
+            options = {key: float(var.get()) for key, var in self.job_option_vars.items() if var.get().strip()}
+        except ValueError:
+            messagebox.showerror("Error", "Invalid priority or job setting.")
+            return
+        try:
+            job = self.jobs.add(file_path, translate=translate, priority=priority, options=options)
+        except OSError as e:
+            self.log(f"Error saving job queue: {e}")
+            return
+        self.log(f"Queued job #{job['id']}: {file_path}")
+        self.refresh_job_list()
+
+    def remove_job(self):
+        job = self.selected_job()
+        if job is None:
+            return
+        if job is self.current_job:
+            self.log("Cannot remove the running job.")
+            return
+        self.scheduler.discard(job['id'])
+        self.jobs.remove(job['id'])
+        self.refresh_job_list()
+
+    def move_job(self, offset):
+        job = self.selected_job()
+        if job is None:
+            return
+        self.jobs.move(job['id'], offset)
+        self.refresh_job_list()
+        self.job_list.selection_clear(0, tk.END)
+        self.job_list.selection_set(self.jobs.jobs.index(job))
+
+    def retry_job(self):
+        job = self.selected_job()
+        if job is None or job is self.current_job:
+            return
+        self.scheduler.discard(job['id'])
+        self.jobs.update(job, status='queued', error=None)
+        self.refresh_job_list()
+
+    def toggle_job_queue(self):
+        self.queue_running = not self.queue_running
+        self.run_queue_button.config(text="Stop Queue" if self.queue_running else "Run Queue")
+        if self.queue_running:
+            self.log("Job queue started")
+        else:
+            self.log("Job queue stopped; the running job will finish")
+
+    def start_next_job(self):
+        # Called from the Tk loop whenever the queue runs and nothing is sending
+        job = self.jobs.next()
+        if job is None:
+            self.toggle_job_queue()
+            self.log("Job queue finished")
+            return
+        if not self.serial or not self.serial.is_open:
+            self.toggle_job_queue()
+            self.log("Not connected. Please connect first.")
+            return
+        future = self.scheduler.prepare(job, self.get_translate_options())
+        if not future.done():
+            return
+        self.scheduler.discard(job['id'])
+        try:
+            prepared = future.result()
+        except Exception as e:
+            self.log(f"Job #{job['id']} failed preparation: {e}")
+            self.jobs.update(job, status='failed', error=str(e))
+            self.refresh_job_list()
+            return
+        for warning in prepared['warnings']:
+            self.log(warning)
+        self.file_var.set(prepared['path'])
+        self.current_job = job
+        self.jobs.update(job, status='running', error=None)
+        self.log(f"Starting job #{job['id']}: {describe(prepared['metadata'])}")
+        self.start_sending(prepared['program'], prepared['metadata'])
+        if not self.running:
+            self.finish_job(False)
+            return
+        # Translate the following job while this one streams
+        following = self.jobs.next()
+        if following is not None:
+            self.scheduler.prepare(following, self.get_translate_options())
+        self.refresh_job_list()
+
+    def finish_job(self, completed):
+        job, self.current_job = self.current_job, None
+        if job is None:
+            return
+        if completed:
+            self.jobs.update(job, status='done')
+        elif self.queue_running:
+            # An unattended run stops at the first job that did not finish
+            self.jobs.update(job, status='failed', error="transmission did not complete")
+            self.toggle_job_queue()
+        else:
+            self.jobs.update(job, status='stopped')
+        self.log(f"Job #{job['id']} {job['status']}")
+        self.refresh_job_list()
+
+    def show_job_stats(self, file_path):
+        # Runs off the Tk thread; indexing a new file reads it once
+        try:
+            self.log(f"Job stats: {describe(index_file(file_path))}")
+        except (OSError, ValueError) as e:
+            self.log(f"Error reading file stats: {e}")
+
+    def toggle_timing(self):
+        # Takes effect at once; the totals restart with the next job
+        stats.enabled = self.timing_var.get()
+
     def log(self, message):
         self.queue.put(message)
 
     def check_queues(self):
-        while not self.queue.empty():
-            message = self.queue.get()
-            self.output_text.config(state="normal")
-            self.output_text.insert(tk.END, message + "\n")
-            self.output_text.see(tk.END)
-            self.output_text.config(state="disabled")
+        with stats.span('log'):
+            while not self.queue.empty():
+                message = self.queue.get()
+                self.output_text.config(state="normal")
+                self.output_text.insert(tk.END, message + "\n")
+                self.output_text.see(tk.END)
+                self.output_text.config(state="disabled")
 
         updated = False
+        while not self.jog_queue.empty():
+            updated = self.parse_command_for_position(self.jog_queue.get()) or updated
         while not self.plot_queue.empty():
             joints = self.plot_queue.get()
             self.joints.update(joints)
             updated = True
         if updated:
             self.log(f"Updating plot: θ1={self.joints['theta1']:.1f}°, d2={self.joints['d2']:.1f} mm, d3={self.joints['d3']:.1f} mm")
-            self.update_3d_plot()
+            with stats.span('redraw'):
+                self.update_3d_plot()
+        loader = self.visual_loader
+        if loader is not None and loader.ready.is_set():
+            self.visual_loader = None
+            self.init_3d_plot(loader)
+
+        while not self.connect_queue.empty():
+            self.finish_connect(self.connect_queue.get())
+        while not self.job_events.empty():
+            self.finish_job(self.job_events.get())
+        if self.queue_running and not self.running:
+            self.start_next_job()
 
         self.root.after(10, self.check_queues)
 
@@ -539,52 +1043,69 @@ class GCodeSenderApp:
             self.log("Already connected.")
             return
 
+        if self.connecting:
+            self.log("Already connecting.")
+            return
+
+        # The handshake and the baud probe can take many seconds, so the link
+        # is set up by connect_thread and handed back through connect_queue
+        self.connecting = True
+        self.connect_button.config(state="disabled")
+        options = dict(fallback_timeout=3600.0, resync=self.resync_var.get(), auto_baud=self.auto_baud_var.get(), pipeline_depth=self.machine['pipeline_depth'], resend_window=self.machine['resend_window'])
+        threading.Thread(target=self.connect_thread, args=(self.port_var.get(), baud_rate, self.protocol_var.get(), options), daemon=True).start()
+
+    def connect_thread(self, port, baud_rate, protocol, options):
+        link = None
         try:
-            self.serial = serial.Serial(self.port_var.get(), baud_rate, timeout=1)
-            self.log(f"Connected to {self.port_var.get()} at {baud_rate} baud")
-            time.sleep(2)
-            self.serial.flush()
-
-            start_time = time.time()
-            while time.time() - start_time < 5:
-                if self.serial.in_waiting > 0:
-                    raw_data = self.serial.readline()
-                    try:
-                        response = raw_data.decode('utf-8').strip()
-                        self.log(f"Arduino: {response}")
-                        if 'ready>' in response:
-                            break
-                    except UnicodeDecodeError:
-                        self.log(f"Initial noise: {raw_data.hex()}")
-                time.sleep(0.05)
+            link, warm = open_link(port, baud_rate, self.log, **options)
+            if warm:
+                self.log(f"Reusing open connection to {port} at {link.port.baudrate} baud")
             else:
-                self.log("No prompt received within 5 seconds")
-
-            self.connect_button.config(state="disabled")
-            self.start_button.config(state="normal")
-            self.stop_button.config(state="normal")
-            self.command_entry.config(state="normal")
-            self.send_button.config(state="normal")
-            self.theta1_plus_button.config(state="normal")
-            self.theta1_minus_button.config(state="normal")
-            self.d2_plus_button.config(state="normal")
-            self.d2_minus_button.config(state="normal")
-            self.d3_plus_button.config(state="normal")
-            self.d3_minus_button.config(state="normal")
-            self.home_button.config(state="normal")
-            self.log("Ready for commands, jogging, or file sending")
-        except serial.SerialException as e:
+                self.log(f"Connected to {port} at {baud_rate} baud")
+                link.handshake()
+                if options['auto_baud']:
+                    link.probe()
+            link.negotiate_realtime()
+            if protocol == "Binary":
+                link.negotiate_binary()
+            elif protocol == "Checksummed":
+                link.enable_line_numbers()
+        except Exception as e:
             self.log(f"Error opening serial port: {e}")
-            if self.serial and self.serial.is_open:
-                self.serial.close()
-                self.serial = None
+            if link is not None and link.is_open:
+                link.close()
+            link = None
+        self.connect_queue.put(link)
+
+    def finish_connect(self, link):
+        self.connecting = False
+        if link is None:
+            self.connect_button.config(state="normal")
+            return
+        self.serial = link
+        self.baud_var.set(str(link.port.baudrate))
+        self.start_button.config(state="normal")
+        self.stop_button.config(state="normal")
+        self.command_entry.config(state="normal")
+        self.send_button.config(state="normal")
+        self.theta1_plus_button.config(state="normal")
+        self.theta1_minus_button.config(state="normal")
+        self.d2_plus_button.config(state="normal")
+        self.d2_minus_button.config(state="normal")
+        self.d3_plus_button.config(state="normal")
+        self.d3_minus_button.config(state="normal")
+        self.home_button.config(state="normal")
+        if self.live_var.get():
+            self.start_live_position()
+        self.log("Ready for commands, jogging, or file sending")
 
     def disconnect_serial(self):
         self.running = False
         self.paused = False
+        self.stop_live_position()
         if self.serial and self.serial.is_open:
-            self.serial.close()
-            self.log("Serial connection closed")
+            release_link(self.serial)
+            self.log("Serial connection released")
             self.serial = None
             self.connect_button.config(state="normal")
             self.start_button.config(state="disabled")
@@ -599,7 +1120,9 @@ class GCodeSenderApp:
             self.d3_minus_button.config(state="disabled")
             self.home_button.config(state="disabled")
 
-    def start_sending(self):
+    def start_sending(self, program=None, metadata=None):
+        # program and metadata are the file already compiled and indexed by
+        # the job scheduler, if any
         if not self.serial or not self.serial.is_open:
             self.log("Not connected. Please connect first.")
             return
@@ -607,16 +1130,7 @@ class GCodeSenderApp:
             messagebox.showerror("Error", "Please select a G-code file.")
             return
 
-        try:
-            with open(self.file_var.get(), 'r') as f:
-                self.total_lines = sum(1 for line in f if line.split(';', 1)[0].strip())
-            self.progress["maximum"] = self.total_lines
-            self.progress["value"] = 0
-            self.log(f"File loaded: {self.total_lines} lines")
-        except Exception as e:
-            self.log(f"Error counting lines: {e}")
-            return
-
+        self.progress["value"] = 0
         self.start_button.config(state="disabled")
         self.pause_button.config(state="normal")
         self.theta1_plus_button.config(state="disabled")
@@ -630,6 +1144,16 @@ class GCodeSenderApp:
         self.paused = False
         self.log(f"Starting G-code transmission from {self.file_var.get()}")
 
+        from path_recorder import PathRecorder
+        try:
+            self.recorder = PathRecorder(self.file_var.get())
+            self.log(f"Recording executed path to {self.recorder.path}")
+        except OSError as e:
+            self.recorder = None
+            self.log(f"Error creating recording: {e}")
+        self.program = program
+        self.metadata = metadata
+        self.capture = Capture(self.capture_var.get(), self.log) if self.capture_var.get() != CAPTURES[0] else None
         threading.Thread(target=self.send_gcode_thread, daemon=True).start()
 
     def stop_sending(self):
@@ -651,44 +1175,99 @@ class GCodeSenderApp:
         self.d3_minus_button.config(state="disabled")
         self.home_button.config(state="disabled")
         self.log("Stopped by user.")
+        if self.queue_running:
+            self.toggle_job_queue()
+        self.stop_live_position()
         if self.serial and self.serial.is_open:
+            try:
+                self.serial.feed_hold()
+                self.serial.soft_reset()
+            except serial.SerialException as e:
+                self.log(f"Error stopping controller: {e}")
             self.serial.close()
             self.serial = None
             self.log("Serial connection closed")
 
     def toggle_pause(self):
         self.paused = not self.paused
+        if self.serial and self.serial.is_open:
+            try:
+                if self.paused:
+                    if not self.serial.feed_hold():
+                        self.log("No feed hold on this controller, pausing after the commands already sent")
+                else:
+                    self.serial.resume()
+            except serial.SerialException as e:
+                self.log(f"Error sending {'feed hold' if self.paused else 'resume'}: {e}")
         self.pause_button.config(text="Resume" if self.paused else "Pause")
         self.log("Paused" if self.paused else "Resumed")
 
     def send_gcode_thread(self):
+        completed = False
+        program, self.program = self.program, None
+        metadata, self.metadata = self.metadata, None
+        capture, self.capture = self.capture, None
+        # A queued job keeps the spans recorded while it was prepared
+        stats.begin(self.current_job['id'] if self.current_job else None)
+        if capture is not None:
+            capture.start()
+        line_number = 0
         try:
-            with open(self.file_var.get(), 'r') as f:
-                for line_number, line in enumerate(f, 1):
-                    if not self.running:
-                        self.log("Transmission stopped")
-                        break
-                    while self.paused and self.running:
-                        time.sleep(0.1)
+            if metadata is None:
+                # Indexing reads the whole file when it has no current sidecar,
+                # so it happens here rather than on the Tk thread
+                metadata = index_file(self.file_var.get())
+            # The send loop advances the bar by file line, comments included
+            self.total_lines = metadata['lines']
+            self.progress["maximum"] = self.total_lines
+            self.log(f"File loaded: {describe(metadata)}")
+            if program is None:
+                program = compile_file(self.file_var.get())
+            stream = self.serial.send_program(program, lambda: self.paused)
+            acknowledged = 0
+            if len(program):
+                self.track_command(program, 0)
+            try:
+                for index in stream:
                     if not self.running:
                         self.log("Transmission stopped")
                         break
-                    try:
-                        self.send_gcode_line(line, line_number)
-                        self.progress["value"] = line_number
-                        self.root.update_idletasks()
-                    except serial.SerialTimeoutException:
-                        self.log(f"Timeout on line {line_number}: {line.strip()}")
-                        break
-                    except Exception as e:
-                        self.log(f"Error on line {line_number}: {e}")
-                        break
-            self.log("G-code transmission complete")
+                    if index is None:
+                        continue
+                    acknowledged += 1
+                    line_number = program.line_numbers[index]
+                    self.progress["value"] = line_number
+                    if index + 1 < len(program):
+                        self.track_command(program, index + 1)
+                else:
+                    completed = acknowledged == len(program)
+                    if not completed:
+                        self.log(f"No prompt received for line {program.line_numbers[acknowledged]} - check Arduino")
+            finally:
+                stream.close()
+            if completed:
+                self.log("G-code transmission complete")
         except FileNotFoundError:
             self.log(f"Error: G-code file '{self.file_var.get()}' not found")
+        except serial.SerialException as e:
+            self.log(f"Serial error after line {line_number}: {e}")
         except Exception as e:
             self.log(f"Error reading file: {e}")
 
+        if capture is not None:
+            try:
+                self.log(f"Profile saved to {capture.stop(self.file_var.get())}")
+            except OSError as e:
+                self.log(f"Error saving profile: {e}")
+        if stats.enabled:
+            for line in stats.summary():
+                self.log(line)
+
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+            self.log(f"Recording saved to {recorder.path}")
+        self.job_events.put(completed)
         self.start_button.config(state="normal")
         self.stop_button.config(state="normal")
         self.pause_button.config(state="disabled")
@@ -705,48 +1284,34 @@ class GCodeSenderApp:
             self.d3_minus_button.config(state="normal")
             self.home_button.config(state="normal")
 
-    def send_gcode_line(self, line, line_number):
-        line = line.split(';', 1)[0].strip()
-        if not line:
-            return
-
-        try:
-            self.log(f"Sending line {line_number}: {line}")
-            if self.parse_command_for_position(line):
+    def track_command(self, program, index):
+        # Called as the controller starts on command index (the one before it
+        # was just acknowledged): the plot follows it and the recording takes
+        # it as the target being executed. The move was reduced to numbers
+        # when the program was compiled, so nothing is parsed here.
+        with stats.span('track'):
+            if self.apply_motion(*program.move(index)):
                 self.plot_queue.put(self.joints.copy())
-            self.serial.write((line + '\n').encode('utf-8'))
-            self.serial.flush()
-            start_time = time.time()
-            prompt_seen = False
-            while time.time() - start_time < 3600:
-                if self.serial.in_waiting > 0:
-                    raw_data = self.serial.readline()
-                    try:
-                        response = raw_data.decode('utf-8').strip()
-                        self.log(f"Received: {response}")
-                        if 'ready>' in response:
-                            prompt_seen = True
-                            break
-                    except UnicodeDecodeError:
-                        self.log(f"Decode error: {raw_data.hex()}")
-                time.sleep(0.01)
-            if not prompt_seen:
-                self.log(f"No prompt received for line {line_number} - check Arduino")
-        except serial.SerialException as e:
-            self.log(f"Error sending line {line_number}: {e}")
-            raise
+                if self.recorder is not None:
+                    self.recorder.commanded(program.line_numbers[index], self.current_pos['X'], self.current_pos['Y'], self.current_pos['Z'])
 
     def on_closing(self):
         self.running = False
         self.paused = False
+        self.stop_live_position()
         if self.serial and self.serial.is_open:
             self.serial.close()
             self.log("Serial connection closed")
+        close_pool()
+        self.scheduler.shutdown()
         self.save_settings()
-        plt.close(self.fig)
+        if self.fig is not None:
+            import matplotlib.pyplot as plt
+            plt.close(self.fig)
         self.root.destroy()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = GCodeSenderApp(root)
     root.mainloop()
\ No newline at end of file
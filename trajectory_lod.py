@@ -0,0 +1,116 @@
+import numpy as np
+
+
+# Multi-resolution store for preview trajectories. Points are kept once in a
+# growable (N, 3) buffer; each pyramid level is an index array into it,
+# decimated per layer so layer start and end points always survive. The view
+# asks for the finest level whose visible part fits in max_points.
+class TrajectoryLOD:
+    def __init__(self, max_points=4000, factor=4, layer_tolerance=1e-6):
+        self.max_points = max_points
+        self.factor = factor
+        self.layer_tolerance = layer_tolerance
+        self.clear()
+
+    def clear(self):
+        self._buf = np.empty((1024, 3))
+        self.count = 0
+        self.layer_starts = np.zeros(0, dtype=np.intp)
+        self.levels = []
+
+    @property
+    def points(self):
+        return self._buf[:self.count]
+
+    @property
+    def layer_count(self):
+        return len(self.layer_starts)
+
+    def set_points(self, points):
+        self.clear()
+        self.extend(points)
+
+    def extend(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        if not len(points):
+            return
+        needed = self.count + len(points)
+        if needed > len(self._buf):
+            buf = np.empty((max(needed, 2 * len(self._buf)), 3))
+            buf[:self.count] = self._buf[:self.count]
+            self._buf = buf
+        # The last existing layer may continue into the new points, so it is
+        # decimated again together with them; earlier layers are untouched.
+        start = int(self.layer_starts[-1]) if self.count else 0
+        self._buf[self.count:needed] = points
+        self.count = needed
+        self._rebuild_from(start)
+
+    def _rebuild_from(self, start):
+        pts = self._buf[start:self.count]
+        rises = np.flatnonzero(np.diff(pts[:, 2]) > self.layer_tolerance) + 1
+        new_starts = np.concatenate(([0], rises)) + start
+        self.layer_starts = np.concatenate((self.layer_starts[self.layer_starts < start], new_starts))
+
+        n = len(pts)
+        index = np.arange(n)
+        layer_of = np.searchsorted(new_starts - start, index, side='right') - 1
+        offset = index - (new_starts - start)[layer_of]
+        layer_end = np.zeros(n, dtype=bool)
+        layer_end[np.concatenate((rises - 1, [n - 1]))] = True
+
+        old_levels = self.levels
+        levels = []
+        stride = 1
+        while True:
+            level = len(levels)
+            if level < len(old_levels):
+                head = old_levels[level][old_levels[level] < start]
+            elif start:
+                # A new coarsest level also has to cover the earlier layers.
+                self.levels = []
+                return self._rebuild_from(0)
+            else:
+                head = np.zeros(0, dtype=np.intp)
+            keep = index[(offset % stride == 0) | layer_end] + start
+            levels.append(np.concatenate((head, keep)))
+            if len(levels[-1]) <= self.max_points or stride >= self.count:
+                break
+            stride *= self.factor
+        self.levels = levels
+
+    # Returns an (M, 3) array for plotting with NaN rows marking breaks.
+    # bounds is ((xmin, xmax), (ymin, ymax), (zmin, zmax)) of the current view,
+    # layers an inclusive (first, last) layer range.
+    def polyline(self, bounds=None, layers=None):
+        if not self.count:
+            return np.empty((0, 3))
+        chosen = None
+        for idx in reversed(self.levels):
+            visible = self._visible(idx, bounds, layers)
+            if chosen is not None and np.count_nonzero(visible) > self.max_points:
+                break
+            chosen = (idx, visible)
+        idx, visible = chosen
+        # Keep one neighbour on each side so segments leaving the view still
+        # reach the edge instead of stopping at the last inside point.
+        grown = visible.copy()
+        grown[1:] |= visible[:-1]
+        grown[:-1] |= visible[1:]
+        idx = idx[grown]
+        out = self._buf[idx]
+        gaps = np.flatnonzero(np.diff(np.flatnonzero(grown)) > 1) + 1
+        if len(gaps):
+            out = np.insert(out, gaps, np.nan, axis=0)
+        return out
+
+    def _visible(self, idx, bounds, layers):
+        visible = np.ones(len(idx), dtype=bool)
+        if bounds is not None:
+            pts = self._buf[idx]
+            for axis, (lo, hi) in enumerate(bounds):
+                visible &= (pts[:, axis] >= lo) & (pts[:, axis] <= hi)
+        if layers is not None:
+            layer_of = np.searchsorted(self.layer_starts, idx, side='right') - 1
+            visible &= (layer_of >= layers[0]) & (layer_of <= layers[1])
+        return visible
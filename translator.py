@@ -0,0 +1,352 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from gcode_lexer import lex, strip
+from gcode_metadata import DEFAULT_JOINT_SPEEDS, MetadataBuilder, write_metadata
+
+# numpy and the workspace_fit/travel_optimizer stages are imported where they
+# run, so the GUIs can import the translator without paying for them at start-up
+
+# translator_profiles.compile_profile builds these from a named profile
+DEFAULT_OPTIONS = {
+    'arcs': False,  # Split G2/G3 arcs into G1 chords; otherwise they are left out
+    'passthrough': False,  # Copy codes the translator does not handle to the output as written
+    'max_feedrate': 1000.0,  # Feed of moves before the first F word, and the cap
+    'feed_cap': True,  # Clamp F words to max_feedrate
+    'x_offset': 0.0,
+    'y_offset': 0.0,
+    'z_offset': 0.0,
+    'base_height': 0.0,
+    'rotation': 0.0,  # Degrees about the θ1 axis, applied after the X/Y offsets
+    'auto_place': False,  # Solve offsets and rotation from the part (workspace_fit)
+    'd2_max': None,  # None disables the workspace check
+    'd3_max': None,
+    'd3_min': 0.0,  # Inner radius the arm cannot retract past
+    'theta_center': 0.0,  # θ1 that auto placement turns the part towards
+    'fill_axes': False,  # Emit X, Y and Z on every move from the modal position
+    'joint_space': False,  # Emit absolute joint moves (JA) instead of Cartesian G00/G01
+    'optimize_travel': False,  # Reorder each layer's islands for the least joint travel
+    'joint_speeds': DEFAULT_JOINT_SPEEDS,  # θ1 deg/s, d2 and d3 mm/s, for travel scoring
+}
+
+# Below this radius θ1 is undefined and the previous angle is held
+MIN_RADIUS = 0.001
+
+# Longest chord an arc is split into, in mm
+ARC_SEGMENT = 1.0
+
+# Files smaller than this are translated in-process; pool start-up would cost more than it saves
+PARALLEL_MIN_BYTES = 1 << 20
+
+
+class TranslationCancelled(Exception):
+    pass
+
+
+def initial_state(options):
+    return {'X': 0.0, 'Y': 0.0, 'Z': 0.0, 'F': options['max_feedrate'], 'T': 0.0}
+
+
+def feed_limit(options):
+    return options['max_feedrate'] if options['feed_cap'] else float('inf')
+
+
+def placement(options):
+    # (x_offset, y_offset, cos, sin) of the X/Y transform
+    angle = math.radians(options['rotation'])
+    return options['x_offset'], options['y_offset'], math.cos(angle), math.sin(angle)
+
+
+def arc_points(cmd, words, state):
+    # G2 (clockwise) or G3 chord end points from the modal position, with Z
+    # interpolated along a helix. The centre comes from I/J offsets or from
+    # the radius R (negative for the long way round), as Marlin reads them.
+    sx, sy, sz = state['X'], state['Y'], state['Z']
+    ex, ey, ez = words.get('X', sx), words.get('Y', sy), words.get('Z', sz)
+    clockwise = cmd == 'G02'
+    if 'R' in words:
+        r = words['R']
+        dx, dy = (ex - sx) / 2, (ey - sy) / 2
+        d = math.hypot(dx, dy)
+        if d == 0:
+            return [(ex, ey, ez)]
+        h = math.sqrt(max(r * r - d * d, 0.0))
+        s = (-1 if clockwise != (r < 0) else 1) * h / d
+        cx, cy = sx + dx - s * dy, sy + dy + s * dx
+    else:
+        cx, cy = sx + words.get('I', 0.0), sy + words.get('J', 0.0)
+    radius = math.hypot(sx - cx, sy - cy)
+    start_angle = math.atan2(sy - cy, sx - cx)
+    sweep = math.atan2(ey - cy, ex - cx) - start_angle
+    if clockwise and sweep >= 0:
+        sweep -= 2 * math.pi
+    elif not clockwise and sweep <= 0:
+        sweep += 2 * math.pi
+    count = max(1, math.ceil(abs(sweep) * radius / ARC_SEGMENT))
+    points = []
+    for i in range(1, count):
+        angle = start_angle + sweep * i / count
+        points.append((cx + radius * math.cos(angle), cy + radius * math.sin(angle), sz + (ez - sz) * i / count))
+    points.append((ex, ey, ez))
+    return points
+
+
+def translate_lines(lines, state, options):
+    # Translates slicer lines starting from the modal state in effect before them.
+    # Returns (output_lines, warnings, end_state).
+    state = dict(state)
+    max_feedrate = feed_limit(options)
+    arcs = options['arcs']
+    passthrough = options['passthrough']
+    joint_space = options['joint_space']
+    fill_axes = options['fill_axes'] or joint_space
+    d2_max, d3_max, d3_min = options['d2_max'], options['d3_max'], options['d3_min']
+    x_offset, y_offset, cos_r, sin_r = placement(options)
+    rotate = options['rotation'] != 0.0
+    output_lines = []
+    warnings = []
+    joint_moves = []  # (output index, x, y, z, f) resolved in one vectorized pass
+
+    def move(cmd, x, y, z, f):
+        if not fill_axes:
+            if x is None and y is None and z is None:
+                return
+            if f is not None:
+                state['F'] = min(f, max_feedrate)
+            new_line = f"{cmd} "
+            if x is not None:
+                new_line += f"X{x:.3f} "
+                state['X'] = x
+            if y is not None:
+                new_line += f"Y{y:.3f} "
+                state['Y'] = y
+            if z is not None:
+                new_line += f"Z{z:.3f} "
+                state['Z'] = z
+            output_lines.append(new_line + f"F{state['F']}\n")
+            return
+        x = state['X'] if x is None else x
+        y = state['Y'] if y is None else y
+        z = state['Z'] if z is None else z
+        state.update({'X': x, 'Y': y, 'Z': z})
+        if f is not None:
+            state['F'] = min(f, max_feedrate)
+        x_trans = x - x_offset
+        y_trans = y - y_offset
+        if rotate:
+            x_trans, y_trans = x_trans * cos_r - y_trans * sin_r, x_trans * sin_r + y_trans * cos_r
+        z_trans = z + options['z_offset']
+        d2 = z_trans - options['base_height']
+        d3 = math.sqrt(x_trans**2 + y_trans**2)
+        if d2_max is None or (0 <= d2 <= d2_max and d3_min <= d3 <= d3_max):
+            if joint_space:
+                joint_moves.append((len(output_lines), x_trans, y_trans, z_trans, state['F']))
+                output_lines.append(None)
+                return
+            output_lines.append(f"{cmd} X{x_trans:.3f} Y{y_trans:.3f} Z{z_trans:.3f} F{state['F']}\n")
+        else:
+            warnings.append(f"Warning: Translated position (X={x_trans}, Y={y_trans}, Z={z_trans}) out of range (d2: [0, {d2_max}], d3: [{d3_min}, {d3_max}])")
+
+    for line in lines:
+        block = lex(line)
+        if block is None:
+            continue
+        cmd, words = block
+        if cmd in ('G00', 'G01'):
+            move(cmd, words.get('X'), words.get('Y'), words.get('Z'), words.get('F'))
+        elif cmd in ('G02', 'G03') and arcs:
+            f = words.get('F')
+            for x, y, z in arc_points(cmd, words, state):
+                move('G01', x, y, z, f)
+                f = None
+        elif cmd == 'G90':
+            output_lines.append("G90\n")
+        elif cmd == 'G28':
+            state.update({'X': 0.0, 'Y': 0.0, 'Z': 0.0, 'T': 0.0})
+            output_lines.append("G28\n")
+        elif passthrough:
+            output_lines.append(strip(line) + "\n")
+
+    if joint_moves:
+        state['T'] = fill_joint_moves(output_lines, joint_moves, state['T'], options)
+    return output_lines, warnings, state
+
+
+def inverse_kinematics(x, y, z, theta, options):
+    # Vectorized RPP inverse kinematics: θ1 = atan2(y, x), d2 = z - base, d3 = |xy|.
+    # theta is the angle held before the first point when it sits on the θ1 axis.
+    import numpy as np
+    d3 = np.hypot(x, y)
+    theta1 = np.degrees(np.arctan2(y, x))
+    defined = np.where(d3 > MIN_RADIUS, np.arange(len(d3)), -1)
+    last_defined = np.maximum.accumulate(defined)
+    theta1 = np.where(last_defined >= 0, theta1[np.maximum(last_defined, 0)], theta)
+    return theta1, z - options['base_height'], d3
+
+
+def fill_joint_moves(output_lines, joint_moves, theta, options):
+    import numpy as np
+    index, x, y, z, f = zip(*joint_moves)
+    theta1, d2, d3 = inverse_kinematics(np.array(x), np.array(y), np.array(z), theta, options)
+    for i, t, b, c, feed in zip(index, theta1.tolist(), d2.tolist(), d3.tolist(), f):
+        output_lines[i] = f"JA A{t:.3f} B{b:.3f} C{c:.3f} F{feed}\n"
+    return theta1[-1].item()
+
+
+def scan_modal_state(lines, options):
+    # Cheap pre-scan of a chunk: which modal values it leaves behind.
+    # Returns (homed, values): homed is True if a G28 resets X/Y/Z inside the
+    # chunk, values holds the last X/Y/Z after that reset and the last F. In
+    # joint-space mode it also holds the last defined θ1 (T).
+    joint_space = options['joint_space']
+    fill_axes = options['fill_axes'] or joint_space
+    x_offset, y_offset, cos_r, sin_r = placement(options)
+    homed = False
+    values = {}
+    for line in lines:
+        block = lex(line)
+        if block is None:
+            continue
+        code, words = block
+        if code in ('G00', 'G01') or (code in ('G02', 'G03') and options['arcs']):
+            x, y, z, f = words.get('X'), words.get('Y'), words.get('Z'), words.get('F')
+            if not fill_axes and x is None and y is None and z is None:
+                # Feed-only moves are dropped without touching F in this mode
+                continue
+            for axis, value in (('X', x), ('Y', y), ('Z', z), ('F', f)):
+                if value is not None:
+                    values[axis] = value
+            if joint_space and 'X' in values and 'Y' in values:
+                x_trans = values['X'] - x_offset
+                y_trans = values['Y'] - y_offset
+                x_trans, y_trans = x_trans * cos_r - y_trans * sin_r, x_trans * sin_r + y_trans * cos_r
+                if math.hypot(x_trans, y_trans) > MIN_RADIUS:
+                    values['T'] = math.degrees(math.atan2(y_trans, x_trans))
+        elif code == 'G28':
+            homed = True
+            for axis in ('X', 'Y', 'Z', 'T'):
+                values.pop(axis, None)
+    return homed, values
+
+
+def apply_modal_state(state, homed, values, options):
+    state = dict(state)
+    if homed:
+        state.update({'X': 0.0, 'Y': 0.0, 'Z': 0.0, 'T': 0.0})
+    for axis, value in values.items():
+        state[axis] = min(value, feed_limit(options)) if axis == 'F' else value
+    return state
+
+
+def read_chunk(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start).decode('utf-8', errors='replace').splitlines()
+
+
+def scan_chunk(path, start, end, options):
+    return scan_modal_state(read_chunk(path, start, end), options)
+
+
+def translate_chunk(path, start, end, state, options):
+    output_lines, warnings, _ = translate_lines(read_chunk(path, start, end), state, options)
+    return ''.join(output_lines), warnings
+
+
+def split_chunks(path, count):
+    # Fixed byte ranges, each moved forward to the next line start
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, count):
+            f.seek(max(size * i // count, bounds[-1]))
+            f.readline()
+            position = f.tell()
+            if position >= size:
+                break
+            if position > bounds[-1]:
+                bounds.append(position)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def watch_lines(lines, total_size, progress, cancel):
+    bytes_read = 0
+    for line_number, line in enumerate(lines, 1):
+        bytes_read += len(line)
+        if line_number % 1000 == 0:
+            if cancel is not None and cancel.is_set():
+                raise TranslationCancelled()
+            if progress is not None:
+                progress(bytes_read / total_size)
+        yield line
+
+
+def translate_file(input_path, output_path, options=None, workers=None, progress=None, cancel=None):
+    # Translates a Cura file into RPP G-code at output_path, with its stats in
+    # a gcode_metadata sidecar, and returns the placement notes and workspace
+    # warnings. Raises TranslationCancelled if cancel gets set.
+    options = dict(DEFAULT_OPTIONS, **(options or {}))
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(input_path)
+    notes = []
+    if options['auto_place']:
+        from workspace_fit import fit_part
+        options, notes = fit_part(input_path, options)
+    if options['optimize_travel']:
+        from travel_optimizer import optimize_file
+        # Reordered beside the output, then translated like any other input
+        ordered_path = output_path + ".ordered"
+        notes.append(optimize_file(input_path, ordered_path, options))
+        try:
+            return notes + translate_file(ordered_path, output_path, dict(options, auto_place=False, optimize_travel=False), workers, progress, cancel)
+        finally:
+            os.remove(ordered_path)
+
+    if workers == 1 or size < PARALLEL_MIN_BYTES:
+        with open(input_path, 'r') as f:
+            output_lines, warnings, _ = translate_lines(watch_lines(f, max(size, 1), progress, cancel), initial_state(options), options)
+        with open(output_path, 'w') as f:
+            f.write("G28\nG90\n")
+            f.writelines(output_lines)
+            f.write("M114\n")
+        metadata = MetadataBuilder(options['joint_speeds'], options['base_height'])
+        metadata.feed_lines(["G28\n", "G90\n"] + output_lines + ["M114\n"])
+        write_metadata(output_path, metadata.result())
+        return notes + warnings
+
+    # Several chunks per worker keeps the pool busy when chunks differ in density
+    chunks = split_chunks(input_path, workers * 4)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        scans = [pool.submit(scan_chunk, input_path, start, end, options) for start, end in chunks]
+        states = [initial_state(options)]
+        for future in scans:
+            homed, values = future.result()
+            states.append(apply_modal_state(states[-1], homed, values, options))
+
+        futures = [pool.submit(translate_chunk, input_path, start, end, states[i], options) for i, (start, end) in enumerate(chunks)]
+        pending = set(futures)
+        while pending:
+            if cancel is not None and cancel.is_set():
+                for future in pending:
+                    future.cancel()
+                raise TranslationCancelled()
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            if progress is not None:
+                progress((len(futures) - len(pending)) / len(futures))
+
+    warnings = []
+    metadata = MetadataBuilder(options['joint_speeds'], options['base_height'])
+    metadata.feed_lines(["G28\n", "G90\n"])
+    with open(output_path, 'w') as f:
+        f.write("G28\nG90\n")
+        for future in futures:
+            text, chunk_warnings = future.result()
+            f.write(text)
+            metadata.feed_lines(text.splitlines(True))
+            warnings.extend(chunk_warnings)
+        f.write("M114\n")
+    metadata.feed_lines(["M114\n"])
+    write_metadata(output_path, metadata.result())
+    return notes + warnings
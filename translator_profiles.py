@@ -0,0 +1,120 @@
+import os
+
+from translator import DEFAULT_OPTIONS
+
+# How each input dialect is read. G0/G1, G28 and G90 are always translated.
+#   arcs         split G2/G3 into G1 chords; without it they are left out
+#   passthrough  copy every other code to the output as written; without it
+#                heater, fan, progress and other slicer codes are left out
+DIALECTS = {
+    # Cura never emits arcs
+    'cura': {'arcs': False, 'passthrough': False},
+    # PrusaSlicer emits G2/G3 when arc fitting is on
+    'prusaslicer': {'arcs': True, 'passthrough': False},
+    # G-code written for the RPP keeps its own codes (M114, J1..J3, JA, ...)
+    'plain': {'arcs': True, 'passthrough': True},
+}
+
+# Translation stages in the order the translator applies them to a move:
+#   fill_axes    emit X, Y and Z on every move from the modal position
+#   auto_place   solve X/Y offsets and rotation that fit the part in the
+#                machine's annulus at the smallest radius (replaces x/y offsets)
+#   offset       shift by the profile's x/y/z offsets (needs full positions)
+#   feed_cap     clamp F to max_feedrate
+#   workspace    drop moves outside the machine's d2/d3 limits, with a warning
+#   optimize_travel  reorder each layer's islands for the least joint travel time
+#   joint_space  emit JA joint targets instead of Cartesian moves
+STAGES = ('fill_axes', 'auto_place', 'offset', 'optimize_travel', 'feed_cap', 'workspace', 'joint_space')
+
+# A profile names its input dialect, the machine it drives and the stages to
+# run. settings.json can add profiles or replace these under "profiles". The
+# GUIs translate for the cell's machine from machine_store, which takes the
+# place of the profile's own.
+DEFAULT_PROFILES = {
+    "Cura": {
+        'dialect': 'cura',
+        'machine': {'base_height': 0.0, 'd2_max': 1000.0, 'd3_max': 1000.0},
+        'stages': ['feed_cap'],
+        'settings': {'max_feedrate': 1000.0},
+    },
+    "Cura bench cell": {
+        'dialect': 'cura',
+        'machine': {'base_height': 0.0, 'd2_max': 1000.0, 'd3_max': 1000.0},
+        'stages': ['fill_axes', 'offset', 'feed_cap', 'workspace'],
+        # Shifts the part towards the base to reduce d3
+        'settings': {'max_feedrate': 1000.0, 'x_offset': 700.0, 'y_offset': 500.0, 'z_offset': 0.0},
+    },
+    "Cura auto-fit": {
+        'dialect': 'cura',
+        'machine': {'base_height': 0.0, 'd2_max': 1000.0, 'd3_max': 1000.0, 'd3_min': 0.0, 'theta_center': 0.0},
+        'stages': ['auto_place', 'offset', 'feed_cap', 'workspace'],
+        'settings': {'max_feedrate': 1000.0, 'z_offset': 0.0},
+    },
+    "PrusaSlicer": {
+        'dialect': 'prusaslicer',
+        'machine': {'base_height': 0.0, 'd2_max': 1000.0, 'd3_max': 1000.0},
+        'stages': ['fill_axes', 'feed_cap', 'workspace'],
+        'settings': {'max_feedrate': 1000.0},
+    },
+    "Plain G-code": {
+        'dialect': 'plain',
+        'machine': {'base_height': 0.0, 'd2_max': 1000.0, 'd3_max': 1000.0},
+        'stages': [],
+        'settings': {},
+    },
+}
+
+
+def compile_profile(profile, extra_stages=(), machine=None):
+    # Resolves a profile to the flat options translate_file runs in one pass.
+    # machine overrides the profile's machine fields, and its max_feedrate
+    # caps the profile's. Raises ValueError for an unknown dialect or stage.
+    stages = set(profile.get('stages', ())) | set(extra_stages)
+    unknown = stages.difference(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown translation stage: {', '.join(sorted(unknown))}")
+    dialect = profile.get('dialect', 'cura')
+    if dialect not in DIALECTS:
+        raise ValueError(f"Unknown G-code dialect: {dialect}")
+    machine = dict(profile.get('machine', {}), **(machine or {}))
+    settings = profile.get('settings', {})
+
+    options = dict(DEFAULT_OPTIONS)
+    options.update(DIALECTS[dialect])
+    options['base_height'] = machine.get('base_height', 0.0)
+    options['max_feedrate'] = min(settings.get('max_feedrate', DEFAULT_OPTIONS['max_feedrate']), machine.get('max_feedrate', float('inf')))
+    options['feed_cap'] = 'feed_cap' in stages
+    if 'offset' in stages:
+        for key in ('x_offset', 'y_offset', 'z_offset'):
+            options[key] = settings.get(key, 0.0)
+    if 'workspace' in stages or 'auto_place' in stages:
+        options['d2_max'] = machine.get('d2_max')
+        options['d3_max'] = machine.get('d3_max')
+        options['d3_min'] = machine.get('d3_min', 0.0)
+    options['theta_center'] = machine.get('theta_center', 0.0)
+    options['auto_place'] = 'auto_place' in stages
+    options['optimize_travel'] = 'optimize_travel' in stages
+    if 'joint_speeds' in machine:
+        options['joint_speeds'] = tuple(machine['joint_speeds'])
+    options['fill_axes'] = 'fill_axes' in stages or 'offset' in stages or 'auto_place' in stages
+    options['joint_space'] = 'joint_space' in stages
+    return options
+
+
+def translated_path(input_path):
+    # Translated output is written beside its source
+    root, _ = os.path.splitext(input_path)
+    return root + "_translated.gcode"
+
+
+def load_profiles(user_profiles, log):
+    # The built-in profiles plus those from settings.json that compile
+    profiles = dict(DEFAULT_PROFILES)
+    for name, profile in (user_profiles or {}).items():
+        try:
+            compile_profile(profile)
+        except (ValueError, AttributeError, TypeError) as e:
+            log(f"Ignoring translation profile {name}: {e}")
+            continue
+        profiles[name] = profile
+    return profiles
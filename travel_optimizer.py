@@ -0,0 +1,251 @@
+import math
+import numpy as np
+
+from gcode_lexer import lex
+from gcode_metadata import DEFAULT_JOINT_SPEEDS
+
+# Vertices of a closed loop tried as its entry point
+MAX_ENTRIES = 64
+# 2-opt is quadratic per pass; larger layers keep the nearest-neighbour order
+TWO_OPT_MAX_ISLANDS = 150
+TWO_OPT_PASSES = 10
+
+
+# One extrusion path between two travel moves. start is where the travel
+# into it ends, vertices every XY position it extrudes to (with the feed
+# in effect for that segment). A simple island holds only XY moves and lines
+# the translator drops, so it can be entered at any vertex of a closed loop
+# or run backwards; any other command pins it to its original entry.
+class Island:
+    def __init__(self, start, z, travel_feed):
+        self.start = start
+        self.z = z
+        self.travel_feed = travel_feed
+        self.raw = []  # As read, travel included, for layers that keep their order
+        self.lines = []
+        self.vertices = []
+        self.feeds = []
+        self.simple = True
+
+    @property
+    def closed(self):
+        return bool(self.vertices) and math.dist(self.vertices[-1], self.start) < 1e-6
+
+    def entries(self):
+        # (entry, exit, key) choices; key is a vertex index for a closed loop,
+        # 'reverse' for an open path run backwards, None for the original
+        if not self.simple or not self.vertices:
+            return [(self.start, self.vertices[-1] if self.vertices else self.start, None)]
+        if self.closed:
+            step = max(len(self.vertices) // MAX_ENTRIES, 1)
+            return [(self.vertices[i], self.vertices[i], i) for i in range(0, len(self.vertices), step)]
+        return [(self.start, self.vertices[-1], None), (self.vertices[-1], self.start, 'reverse')]
+
+    def emit(self, key):
+        travel = f"G0{feed_word(self.travel_feed)} X{{:.3f}} Y{{:.3f}} Z{self.z:.3f}\n"
+        if key is None:
+            return [travel.format(*self.start)] + self.lines
+        points = [self.start] + self.vertices
+        if key == 'reverse':
+            # Segment i runs from points[i] to points[i + 1]; backwards it keeps its feed
+            segments = [(points[i], self.feeds[i]) for i in range(len(self.vertices) - 1, -1, -1)]
+            return [travel.format(*self.vertices[-1])] + [f"G1{feed_word(feed)} X{x:.3f} Y{y:.3f}\n" for (x, y), feed in segments]
+        # Closed loop entered at vertex key: the segments after it, then those before
+        order = list(range(key + 1, len(self.vertices))) + list(range(key + 1))
+        return [travel.format(*self.vertices[key])] + [f"G1{feed_word(self.feeds[i])} X{self.vertices[i][0]:.3f} Y{self.vertices[i][1]:.3f}\n" for i in order]
+
+
+def feed_word(feed):
+    # Moves before the file's first F keep the translator's default feed
+    return "" if feed is None else f" F{feed:g}"
+
+
+class TravelCost:
+    # Joint-space travel time between Cura XY positions at one height. The
+    # joints move together, so a travel takes as long as its slowest joint.
+    def __init__(self, options):
+        self.x_offset, self.y_offset = options['x_offset'], options['y_offset']
+        angle = math.radians(options['rotation'])
+        self.cos_r, self.sin_r = math.cos(angle), math.sin(angle)
+        self.speeds = options.get('joint_speeds') or DEFAULT_JOINT_SPEEDS
+
+    def joints(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        x = points[:, 0] - self.x_offset
+        y = points[:, 1] - self.y_offset
+        x, y = x * self.cos_r - y * self.sin_r, x * self.sin_r + y * self.cos_r
+        return np.degrees(np.arctan2(y, x)), np.hypot(x, y)
+
+    def between(self, a, b):
+        # a and b are (theta, d3) arrays of equal length or broadcastable
+        return np.maximum(np.abs(a[0] - b[0]) / self.speeds[0], np.abs(a[1] - b[1]) / self.speeds[2])
+
+    def joint(self, point):
+        x, y = point[0] - self.x_offset, point[1] - self.y_offset
+        x, y = x * self.cos_r - y * self.sin_r, x * self.sin_r + y * self.cos_r
+        return math.degrees(math.atan2(y, x)), math.hypot(x, y)
+
+    def time(self, a, b):
+        # Scalar version for single pairs, where numpy call overhead dominates
+        (theta_a, r_a), (theta_b, r_b) = self.joint(a), self.joint(b)
+        return max(abs(theta_a - theta_b) / self.speeds[0], abs(r_a - r_b) / self.speeds[2])
+
+
+def split_layers(lines):
+    # Yields (header_lines, islands, movable) per layer. A layer that changes
+    # height or homes after its first travel is not movable and keeps its order.
+    x = y = z = 0.0
+    feed = None
+    header, islands, movable = [], [], True
+
+    def flush():
+        return header, islands, movable
+
+    for line in lines:
+        if line.startswith(';LAYER:'):
+            yield flush()
+            header, islands, movable = [line], [], True
+            continue
+        block = lex(line)
+        # Cura resets the extruder with G92 E0 all through a layer; a G92
+        # without X, Y or Z moves nothing and the translator drops it
+        if block is None or (block[0] == 'G92' and not ('X' in block[1] or 'Y' in block[1] or 'Z' in block[1])):
+            (islands[-1].lines if islands else header).append(line)
+            if islands:
+                islands[-1].raw.append(line)
+            continue
+        code, words = block
+        if code in ('G00', 'G01') and 'F' in words:
+            feed = words['F']
+        if code == 'G00' and ('X' in words or 'Y' in words):
+            if 'Z' in words and islands:
+                movable = False
+            x, y, z = words.get('X', x), words.get('Y', y), words.get('Z', z)
+            island = Island((x, y), z, feed)
+            island.raw.append(line)
+            islands.append(island)
+            continue
+        if not islands:
+            if code in ('G00', 'G01'):
+                x, y, z = words.get('X', x), words.get('Y', y), words.get('Z', z)
+            header.append(line)
+            continue
+        island = islands[-1]
+        island.lines.append(line)
+        island.raw.append(line)
+        if code in ('G00', 'G01') and 'Z' in words:
+            movable = False
+            z = words['Z']
+        if code == 'G01' and ('X' in words or 'Y' in words):
+            x, y = words.get('X', x), words.get('Y', y)
+            island.vertices.append((x, y))
+            island.feeds.append(feed)
+        elif code == 'G00' or (code == 'G01' and 'Z' in words) or code not in ('G00', 'G01'):
+            island.simple = False
+        if code in ('G28', 'G91', 'G92'):
+            movable = False
+    yield flush()
+
+
+def order_islands(islands, position, cost):
+    # Nearest neighbour over every island entry from position, then 2-opt
+    # on the visiting order. Returns [(island index, key, entry, exit)].
+    choices = [island.entries() for island in islands]
+    owner = np.array([i for i, entries in enumerate(choices) for _ in entries])
+    flat = [(i, entry, exit_, key) for i, entries in enumerate(choices) for entry, exit_, key in entries]
+    entry_joints = cost.joints([entry for _, entry, _, _ in flat])
+    remaining = np.ones(len(flat), dtype=bool)
+    tour = []
+    here = cost.joints([position])
+    while remaining.any():
+        times = np.where(remaining, cost.between(here, entry_joints), np.inf)
+        best = int(times.argmin())
+        i, entry, exit_, key = flat[best]
+        tour.append((i, key, entry, exit_))
+        remaining &= owner != i
+        here = cost.joints([exit_])
+
+    if len(tour) <= TWO_OPT_MAX_ISLANDS:
+        tour = two_opt(tour, islands, position, cost)
+    return tour
+
+
+def two_opt(tour, islands, position, cost):
+    # Reversing a run of the tour also reverses each island in it, which only
+    # closed loops and simple open paths allow
+    def reversible(item):
+        i, key, entry, exit_ = item
+        return entry == exit_ or islands[i].simple
+
+    def flipped(item):
+        i, key, entry, exit_ = item
+        if entry == exit_:
+            return item
+        return (i, None if key == 'reverse' else 'reverse', exit_, entry)
+
+    times = {}
+
+    def time(a, b):
+        key = (a, b)
+        if key not in times:
+            times[key] = times[(b, a)] = cost.time(a, b)
+        return times[key]
+
+    for _ in range(TWO_OPT_PASSES):
+        improved = False
+        for i in range(len(tour)):
+            if not reversible(tour[i]):
+                continue
+            before = position if i == 0 else tour[i - 1][3]
+            for j in range(i + 1, len(tour)):
+                if not reversible(tour[j]):
+                    break
+                old = time(before, tour[i][2])
+                new = time(before, tour[j][3])
+                if j + 1 < len(tour):
+                    old += time(tour[j][3], tour[j + 1][2])
+                    new += time(tour[i][2], tour[j + 1][2])
+                if new < old - 1e-9:
+                    tour[i:j + 1] = [flipped(item) for item in reversed(tour[i:j + 1])]
+                    improved = True
+        if not improved:
+            break
+    return tour
+
+
+def travel_time(tour_points, position, cost):
+    points = [position] + [p for pair in tour_points for p in pair]
+    starts = cost.joints(points[0:-1:2])
+    ends = cost.joints(points[1::2])
+    return float(cost.between(starts, ends).sum())
+
+
+def optimize_file(input_path, output_path, options):
+    # Writes input_path with each layer's islands reordered for the least
+    # joint travel time. Returns a note on the travel time saved.
+    cost = TravelCost(options)
+    before = after = 0.0
+    layers = reordered = 0
+    position = (0.0, 0.0)
+    with open(input_path, 'r') as f, open(output_path, 'w') as out:
+        for header, islands, movable in split_layers(f):
+            out.writelines(header)
+            if not islands:
+                continue
+            original = [(island.start, island.vertices[-1] if island.vertices else island.start) for island in islands]
+            before += travel_time(original, position, cost)
+            if not movable:
+                after += travel_time(original, position, cost)
+                for island in islands:
+                    out.writelines(island.raw)
+                position = original[-1][1]
+                continue
+            layers += 1
+            tour = order_islands(islands, position, cost)
+            after += travel_time([(entry, exit_) for _, _, entry, exit_ in tour], position, cost)
+            if [item[0] for item in tour] != list(range(len(islands))) or any(item[1] is not None for item in tour):
+                reordered += 1
+            for i, key, _, _ in tour:
+                out.writelines(islands[i].emit(key))
+            position = tour[-1][3]
+    return f"Travel optimization: joint travel {before:.1f} s -> {after:.1f} s (saved {before - after:.1f} s, {reordered} of {layers} layers reordered)"
@@ -0,0 +1,42 @@
+import importlib
+import threading
+import time
+
+# numpy, matplotlib and the modules built on them take seconds to import on
+# the shop-floor PCs. The GUIs open without them and load them here once the
+# window is up; code that needs one before then imports it directly, which
+# waits on the same import instead of loading it twice.
+VISUAL_MODULES = (
+    'numpy',
+    'matplotlib.figure',
+    'matplotlib.backends.backend_tkagg',
+    'mpl_toolkits.mplot3d',
+    'trajectory_lod',
+    'path_recorder',
+)
+
+
+# Imports modules on a background thread. ready is set when it is done;
+# error holds the exception if an import failed, seconds how long it took.
+class ModuleLoader:
+    def __init__(self, names=VISUAL_MODULES):
+        self.names = names
+        self.ready = threading.Event()
+        self.error = None
+        self.seconds = None
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.load, daemon=True)
+            self.thread.start()
+
+    def load(self):
+        started = time.perf_counter()
+        try:
+            for name in self.names:
+                importlib.import_module(name)
+        except Exception as e:  # ImportError, or a backend failing to initialise
+            self.error = e
+        self.seconds = time.perf_counter() - started
+        self.ready.set()
@@ -0,0 +1,171 @@
+import math
+import random
+import numpy as np
+
+from gcode_lexer import lex
+
+# Directions tried when the part has to clear the inner radius of the annulus
+FIT_DIRECTIONS = 72
+# Points checked against the inner radius; longer toolpaths are subsampled
+CLEARANCE_SAMPLES = 20000
+
+
+def part_points(path):
+    # (n, 3) array of every position the file moves to, in one pass. Axes a
+    # move leaves out are carried forward; positions before the first full
+    # X/Y and the G28 home are not part of the part.
+    rows = []
+    with open(path, 'r') as f:
+        for line in f:
+            block = lex(line)
+            if block is None or block.code not in ('G00', 'G01'):
+                continue
+            words = block.words
+            if 'X' in words or 'Y' in words or 'Z' in words:
+                rows.append((words.get('X', np.nan), words.get('Y', np.nan), words.get('Z', np.nan)))
+    if not rows:
+        return np.empty((0, 3))
+    points = np.array(rows)
+    # Forward fill each axis from the last move that set it
+    index = np.where(np.isnan(points), 0, np.arange(len(points))[:, None])
+    index = np.maximum.accumulate(index, axis=0)
+    points = points[index, np.arange(3)]
+    return points[~np.isnan(points[:, :2]).any(axis=1)]
+
+
+def convex_hull(points):
+    # Andrew's monotone chain over the XY plane; returns the hull vertices
+    points = np.unique(points[:, :2], axis=0)
+    if len(points) < 3:
+        return points
+
+    def half(ordered):
+        chain = []
+        for p in ordered:
+            while len(chain) >= 2:
+                (ax, ay), (bx, by) = chain[-2], chain[-1]
+                if (bx - ax) * (p[1] - ay) - (by - ay) * (p[0] - ax) > 0:
+                    break
+                chain.pop()
+            chain.append((p[0], p[1]))
+        return chain
+
+    ordered = points.tolist()
+    lower = half(ordered)
+    upper = half(reversed(ordered))
+    return np.array(lower[:-1] + upper[:-1])
+
+
+def circle_two(a, b):
+    centre = ((a[0] + b[0]) / 2, (a[1] + b[1]) / 2)
+    return centre, math.dist(a, b) / 2
+
+
+def circle_three(a, b, c):
+    d = 2 * (a[0] * (b[1] - c[1]) + b[0] * (c[1] - a[1]) + c[0] * (a[1] - b[1]))
+    if abs(d) < 1e-12:
+        # Collinear; the widest pair decides
+        return max((circle_two(p, q) for p, q in ((a, b), (a, c), (b, c))), key=lambda circle: circle[1])
+    a2, b2, c2 = a[0] ** 2 + a[1] ** 2, b[0] ** 2 + b[1] ** 2, c[0] ** 2 + c[1] ** 2
+    x = (a2 * (b[1] - c[1]) + b2 * (c[1] - a[1]) + c2 * (a[1] - b[1])) / d
+    y = (a2 * (c[0] - b[0]) + b2 * (a[0] - c[0]) + c2 * (b[0] - a[0])) / d
+    return (x, y), math.dist((x, y), a)
+
+
+def enclosing_circle(points):
+    # Smallest circle around the points (randomised incremental, expected linear)
+    points = [tuple(p) for p in points.tolist()]
+    random.Random(0).shuffle(points)
+    eps = 1e-9
+
+    def inside(circle, p):
+        return math.dist(circle[0], p) <= circle[1] + eps
+
+    circle = (points[0], 0.0)
+    for i, p in enumerate(points):
+        if inside(circle, p):
+            continue
+        circle = (p, 0.0)
+        for j, q in enumerate(points[:i]):
+            if inside(circle, q):
+                continue
+            circle = circle_two(p, q)
+            for r in points[:j]:
+                if not inside(circle, r):
+                    circle = circle_three(p, q, r)
+    return np.array(circle[0]), circle[1]
+
+
+def clearance(points, direction, radius):
+    # Smallest shift s >= 0 along direction that puts every point at least
+    # radius from the origin. A point is inside the circle for s between the
+    # roots of |p + s*u|^2 = radius^2; the answer is the first gap in the
+    # union of those intervals.
+    b = points @ direction
+    c = np.einsum('ij,ij->i', points, points)
+    disc = b * b - c + radius * radius
+    blocked = disc > 0
+    start = -b[blocked] - np.sqrt(disc[blocked])
+    end = -b[blocked] + np.sqrt(disc[blocked])
+    keep = end > 0
+    start, end = start[keep], end[keep]
+    if not len(start):
+        return 0.0
+    order = np.argsort(start)
+    start, end = start[order], end[order]
+    reach = np.maximum(np.maximum.accumulate(end), 0.0)
+    before = np.concatenate(([0.0], reach[:-1]))
+    gaps = np.nonzero(start > before)[0]
+    return float(before[gaps[0]] if len(gaps) else reach[-1])
+
+
+def fit_workspace(points, d3_min=0.0, theta_center=0.0):
+    # Placement of the XY points inside the annulus d3_min <= r with the
+    # smallest outer radius. The translator maps a point p to
+    # rotate(p - offset, rotation). Returns (x_offset, y_offset, rotation, r_min, r_max).
+    hull = convex_hull(points)
+    centre, radius = enclosing_circle(hull)
+    relative = points[:, :2] - centre
+    if d3_min <= 0:
+        # Centred on the θ1 axis; the annulus is symmetric so rotation is free
+        r = np.hypot(relative[:, 0], relative[:, 1])
+        return float(centre[0]), float(centre[1]), 0.0, float(r.min()), float(radius)
+
+    step = max(len(relative) // CLEARANCE_SAMPLES, 1)
+    sample = relative[::step]
+    hull_relative = hull - centre
+    best = None
+    for angle in np.linspace(0.0, 2 * np.pi, FIT_DIRECTIONS, endpoint=False):
+        direction = np.array([math.cos(angle), math.sin(angle)])
+        shift = clearance(sample, direction, d3_min)
+        r_max = float(np.hypot(*(hull_relative + shift * direction).T).max())
+        if best is None or r_max < best[0]:
+            best = (r_max, angle, shift, direction)
+    r_max, angle, shift, direction = best
+    placed = sample + shift * direction
+    offset = centre - shift * direction
+    # Turn the side the part was pushed to onto the arm's centre angle
+    rotation = (theta_center - math.degrees(angle) + 180.0) % 360.0 - 180.0
+    return float(offset[0]), float(offset[1]), rotation, float(np.hypot(*placed.T).min()), r_max
+
+
+def fit_part(path, options):
+    # Auto-placement stage: returns the options with offsets and rotation
+    # solved for the part in path, and notes on the fit for the log.
+    points = part_points(path)
+    if not len(points):
+        return options, ["Auto placement skipped: no moves in file"]
+    d3_min = options.get('d3_min') or 0.0
+    x_offset, y_offset, rotation, r_min, r_max = fit_workspace(points, d3_min, options.get('theta_center', 0.0))
+    options = dict(options, x_offset=x_offset, y_offset=y_offset, rotation=rotation, fill_axes=True)
+    notes = [f"Auto placement: offset X{x_offset:.3f} Y{y_offset:.3f}, rotation {rotation:.1f}°, radius {r_min:.1f} to {r_max:.1f} mm"]
+    if options['d3_max'] is not None and r_max > options['d3_max']:
+        notes.append(f"Warning: Part needs radius {r_max:.1f} mm, more than d3_max {options['d3_max']}")
+    z = points[:, 2]
+    z = z[~np.isnan(z)]
+    if len(z) and options['d2_max'] is not None:
+        d2_low = z.min() + options['z_offset'] - options['base_height']
+        d2_high = z.max() + options['z_offset'] - options['base_height']
+        if d2_low < 0 or d2_high > options['d2_max']:
+            notes.append(f"Warning: Part spans d2 {d2_low:.1f} to {d2_high:.1f} mm, outside [0, {options['d2_max']}]")
+    return options, notes